@@ -1,11 +1,25 @@
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 
 from api_gateway.routes import api_hooks, config_routes
+from brain.core.inference_pool import InferencePool
 from brain.core.state_manager import StateManager
-from brain.core.text_generation import TextGenerator
+from brain.core.llama_server import create_text_generator
+
+CONFIG_PATH = "config/config.yaml"
+
+
+def load_model_settings(path=CONFIG_PATH):
+    try:
+        import yaml
+        with open(path, "r") as f:
+            return (yaml.safe_load(f) or {}).get("model_settings", {})
+    except Exception as e:
+        print(f"[Config] Could not read model settings from {path}: {e}")
+        return {}
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -15,7 +29,17 @@ async def lifespan(app: FastAPI):
     """
     print("Initializing services...")
     state_manager = StateManager()
-    text_generator = TextGenerator()
+    # Load the model in the background so the server is up immediately;
+    # /health reports when it is ready. Concurrent requests share a bounded
+    # pool of model workers instead of queueing without limit on one instance.
+    model_settings = load_model_settings()
+    text_generator = InferencePool.from_settings(
+        model_settings,
+        lambda: create_text_generator(model_settings,
+                                      model_path=model_settings.get("model_path"),
+                                      n_gpu_layers=model_settings.get("n_gpu_layers"),
+                                      load_async=True)
+    )
     
     # Load seed memories if the database is empty
     if not state_manager.state["long_term_memory"]:
@@ -23,7 +47,7 @@ async def lifespan(app: FastAPI):
     
     app.state.state_manager = state_manager
     app.state.text_generator = text_generator
-    print("Initialization complete. Server is ready.")
+    print("Initialization complete. Server is up; model loading in the background.")
     
     yield
     
@@ -56,5 +80,13 @@ async def read_root():
     """A simple endpoint to confirm the API is running."""
     return {"message": "Welcome to the Judy API. She's listening."}
 
+@app.get("/health", tags=["Root"])
+async def health():
+    """Readiness probe: 200 once the model is loaded, 503 while loading or after a failed load."""
+    text_generator = getattr(app.state, "text_generator", None)
+    model = text_generator.status() if text_generator else {"state": "starting"}
+    status = "ok" if model["state"] == "ready" else model["state"]
+    return JSONResponse({"status": status, "model": model}, status_code=200 if status == "ok" else 503)
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
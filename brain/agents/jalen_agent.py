@@ -1,10 +1,13 @@
 import threading
 import time
-import datetime
-import json
 import os
 import concurrent.futures
-from brain.core.text_generation import TextGeneration
+from brain.core.conversation_summarizer import ConversationSummarizer
+from brain.core.inference_pool import InferencePool, PoolSaturated
+from brain.core.prompt_assembler import PromptAssembler
+from brain.core.template_registry import compile_template, default_registry
+from brain.core.llama_server import create_text_generator
+from brain.core.text_generation import GenerationCancelled
 
 # Attempt to import the rich Judy prompt template. If that fails (e.g., because
 # the module is not on the Python path when this file is executed as a script),
@@ -25,13 +28,68 @@ Recent memories:
 """
 
 class JalenAgent:
-    def __init__(self, memory_daemon, state_manager, model_path=None, n_gpu_layers=None, log_prompts=False):
+    def __init__(self, memory_daemon, state_manager, model_path=None, n_gpu_layers=None, log_prompts=False, load_async=False,
+                 inference_workers=1, max_queue=8, max_queue_seconds=30.0, response_cache=None, speculative=None,
+                 model_settings=None, summary_settings=None):
         self.state_manager = state_manager
         self.memory_daemon = memory_daemon
         self._running = False
         self._input_thread = None
+        # Chat turns are embedded and stored off the reply path, one at a time so they land in order.
+        self._turn_writer = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="turn-writer")
+        # Personalities and core profile, parsed once and reloaded when their files change.
+        self.templates = default_registry()
         # Forward both parameters so `TextGeneration` can decide what to do with them.
-        self.text_gen = TextGeneration(model_path=model_path, n_gpu_layers=n_gpu_layers, log_prompts=log_prompts)
+        # With load_async the model loads in the background; see is_ready().
+        # Generation goes through a bounded worker pool (one model instance per
+        # worker, or one llama-server with a worker per slot; see model_settings.backend).
+        self.text_gen = InferencePool(
+            lambda: create_text_generator(model_settings, model_path=model_path, n_gpu_layers=n_gpu_layers,
+                                          log_prompts=log_prompts, load_async=load_async,
+                                          response_cache=response_cache, speculative=speculative),
+            workers=inference_workers,
+            max_queue=max_queue,
+            max_queue_seconds=max_queue_seconds
+        )
+        # Fits persona, memories and the user message into n_ctx - max_tokens.
+        self.max_tokens = 150
+        self.prompt_assembler = PromptAssembler(self.text_gen.tokenize, n_ctx=self.text_gen.n_ctx,
+                                                max_tokens=self.max_tokens)
+        # Older turns are folded into a rolling summary on idle pulses (see register_idle_task).
+        core_profile = self._load_core_profile()
+        self.summarizer = ConversationSummarizer.from_settings(
+            state_manager, self.text_gen, summary_settings,
+            judy_name=core_profile.get("name", "Judy"),
+            user_name=core_profile.get("preferred_pet_names", ["Stixx"])[0]
+        )
+        # Snapshot each personality's static persona header so turns skip its prefill.
+        self.text_gen.register_prefixes([
+            self._persona_prefix(template, core_profile)
+            for template in self.templates.personalities(default=prompt_template).values()
+        ])
+
+    def is_ready(self):
+        return self.text_gen.is_ready()
+
+    def model_status(self):
+        return self.text_gen.status()
+
+    def inference_metrics(self):
+        """Decode speed of the last reply (plus draft acceptance with speculative decoding) for the pulse."""
+        metrics = self.text_gen.last_metrics
+        keys = ("ttft_ms", "tokens_per_sec", "speculative", "acceptance_rate")
+        return {key: round(metrics[key], 3) if isinstance(metrics[key], float) else metrics[key]
+                for key in keys if key in metrics}
+
+    def _load_core_profile(self):
+        return self.templates.core_profile()
+
+    def _persona_prefix(self, template, core_profile):
+        return compile_template(template).static_prefix(
+            self.templates.dynamic_fields,
+            judy_name=core_profile.get("name", "Judy"),
+            user_name=core_profile.get("preferred_pet_names", ["Stixx"])[0]
+        )
 
     def start_chatbox(self):
         if self._running:
@@ -51,15 +109,11 @@ class JalenAgent:
                     self._running = False
                     break
 
-                # Store user input in both legacy and ChromaDB memory
-                self.memory_daemon.add_memory({"timestamp": datetime.datetime.now().isoformat(), "text": f"User: {message}"}, memory_type="short")
-                self.state_manager.add_memory_chroma(f"User: {message}", memory_type="short", metadata={"timestamp": time.time(), "role": "user"})
-
                 # Run Judy's response in a background thread and print when ready
+                # (generate_response records both turns in short-term memory)
                 def print_response(response):
-                    # Store Judy's response in both legacy and ChromaDB memory
-                    self.memory_daemon.add_memory({"timestamp": datetime.datetime.now().isoformat(), "text": f"Judy: {response}"}, memory_type="short")
-                    self.state_manager.add_memory_chroma(f"Judy: {response}", memory_type="short", metadata={"timestamp": time.time(), "role": "judy"})
+                    if response is None:
+                        return
                     print(f"Judy🌹: {response}")
 
                 self.generate_response_async(message, print_response)
@@ -76,6 +130,17 @@ class JalenAgent:
         if self._input_thread:
             self._input_thread.join()
 
+    def record_turn(self, role, text):
+        """
+        Mark the agent active and queue one chat turn to be stored as a
+        role-tagged short-term memory. Tagging and embedding run on the turn
+        writer thread, so the chat path only enqueues; returns its future.
+        """
+        self.state_manager.mark_activity()
+        speaker = "User" if role == "user" else "Judy"
+        return self._turn_writer.submit(self.state_manager.add_memory_chroma, f"{speaker}: {text}",
+                                        memory_type="short", metadata={"timestamp": time.time(), "role": role})
+
     def handle_command(self, message):
         """
         Handle special commands, e.g. /switchmodel <model_path>
@@ -84,16 +149,24 @@ class JalenAgent:
             parts = message.split(maxsplit=1)
             if len(parts) == 2:
                 new_model_path = parts[1].strip()
-                self.text_gen.switch_model(new_model_path)
-                print(f"[JalenAgent] Switched model to: {new_model_path}")
-                return f"[Judy🌹] Model switched to: {os.path.basename(new_model_path)}"
+                try:
+                    future = self.text_gen.switch_model_async(new_model_path)
+                except (OSError, MemoryError, RuntimeError) as e:
+                    return f"[Judy🌹] Can't switch models: {e}"
+                future.add_done_callback(
+                    lambda f: print(f"[JalenAgent] Switched model to: {new_model_path}") if not f.exception() else None
+                )
+                return (f"[Judy🌹] Loading {os.path.basename(new_model_path)} in the background — "
+                        f"I'll keep talking on the current model until it's warm.")
             else:
                 return "[Judy🌹] Usage: /switchmodel <model_path>"
         return None
 
-    def generate_response(self, user_input):
+    def generate_response(self, user_input, on_token=None):
         """
         Generate a response to user_input using the full Judy prompt and core profile.
+        If on_token is given, it is called with each chunk of the reply as it is generated.
+        Returns None if a newer message superseded this one before it finished.
         """
         # Check for command
         if user_input.startswith("/"):
@@ -101,32 +174,68 @@ class JalenAgent:
             if cmd_result:
                 return cmd_result
 
-        # Load Judy's core profile
-        core_profile_path = os.path.join(os.path.dirname(__file__), '../core/core_profile.json')
-        try:
-            with open(core_profile_path, 'r', encoding='utf-8') as f:
-                core_profile = json.load(f)
-        except Exception:
-            core_profile = {}
+        # Judy's core profile and current personality (cached by the template registry)
+        core_profile = self._load_core_profile()
+        template = self.templates.personality(default=prompt_template)
         # Gather context
         mood = self.state_manager.get_mood() if hasattr(self.state_manager, 'get_mood') else "neutral"
         scene = self.state_manager.state.get("scene", "default")
-        # Optionally, fetch recent memories (stubbed here)
-        recent_memories = ""
-        if hasattr(self.state_manager, 'get_memories'):
-            memories = self.state_manager.get_memories(memory_type="short")
-            recent_memories = '\n'.join([m['text'] for m in memories[-5:]])
-        # Compose prompt
-        prompt = prompt_template.format(
-            judy_name=core_profile.get("name", "Judy"),
-            user_name=core_profile.get("preferred_pet_names", ["Stixx"])[0],
-            mood=mood,
-            scene=scene,
-            recent_memories=recent_memories,
-            user_message=user_input
+        if not self.text_gen.wait_ready():
+            return f"[Judy🌹] I can't think straight right now — the model failed to load ({self.text_gen.load_error})."
+        # Gathered before the turn is stored, so the message isn't also a "recent memory" of itself
+        memories = self._gather_memories(user_input)
+        self.record_turn("user", user_input)
+        # Compose prompt; memories are packed by score into the remaining token budget
+        prompt = self.prompt_assembler.assemble(
+            template,
+            {
+                "judy_name": core_profile.get("name", "Judy"),
+                "user_name": core_profile.get("preferred_pet_names", ["Stixx"])[0],
+                "mood": mood,
+                "scene": scene,
+                "user_message": user_input
+            },
+            memories=memories
         )
-        response = self.text_gen.generate(prompt)
-        return response.strip()
+        try:
+            # A newer chat message replaces this one instead of queueing behind it.
+            response = self.text_gen.generate(prompt, priority="interactive", supersede_key="chat",
+                                              on_token=on_token, max_tokens=self.max_tokens,
+                                              prefix=self._persona_prefix(template, core_profile),
+                                              cache_scope=(user_input, {"mood": mood, "scene": scene,
+                                                                        "personality": template.digest}))
+        except GenerationCancelled:
+            print("[JalenAgent] Reply superseded by a newer message.")
+            return None
+        except (PoolSaturated, TimeoutError) as e:
+            print(f"[JalenAgent] Generation rejected: {e}")
+            return "[Judy🌹] I'm juggling too many conversations right now — give me a second and try again."
+        response = response.strip()
+        if response:
+            self.record_turn("judy", response)
+        return response
+
+    def _gather_memories(self, user_input):
+        """
+        (text, score) candidates for the prompt: the rolling conversation summary
+        first, then long-term memories relevant to the message above the recent
+        short-term ones, best/newest first.
+        """
+        memories = []
+        summary = self.summarizer.summary
+        if summary:
+            # Bounded stand-in for every turn before the watermark; packed first
+            memories.append((f"Conversation so far: {summary}", 3.0))
+        if hasattr(self.state_manager, 'query_chroma_memories'):
+            relevant = self.state_manager.query_chroma_memories(user_input, memory_type="long", n_results=8)
+            memories.extend((doc, 2.0 - rank * 0.1) for rank, doc in enumerate(relevant))
+        if hasattr(self.state_manager, 'get_recent_memories_chroma'):
+            # Only turns the summary doesn't cover yet
+            since = max(self.summarizer.watermark, time.time() - 7 * 24 * 3600)
+            recent = self.state_manager.get_recent_memories_chroma(memory_type="short", n=8, since=since)
+            # Oldest first so the conversation reads in order in the prompt
+            memories.extend((doc, 1.0 - rank * 0.1) for rank, (doc, _) in reversed(list(enumerate(recent))))
+        return memories
 
     def greet(self):
         """
@@ -135,11 +244,15 @@ class JalenAgent:
         greeting = "Hello! I'm Judy, your AI assistant. How can I help you today?"
         return greeting
 
-    def generate_response_async(self, user_input, callback):
+    def generate_response_async(self, user_input, callback, on_token=None):
         """
         Run generate_response in a background thread and call callback(result) when done.
+        on_token(text) streams the reply chunk by chunk from the worker thread;
+        command replies are not streamed and only reach callback.
         """
         if not hasattr(self, '_executor'):
-            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
-        future = self._executor.submit(self.generate_response, user_input)
+            # Enough threads to keep the pool's workers and queue fed; the pool does the limiting.
+            pool = self.text_gen
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=pool.workers + pool.max_queue)
+        future = self._executor.submit(self.generate_response, user_input, on_token)
         future.add_done_callback(lambda f: callback(f.result()))
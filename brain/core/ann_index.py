@@ -0,0 +1,261 @@
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+
+
+def _kmeans(vectors, n_clusters, iterations=20, seed=0):
+    """Spherical k-means on unit vectors; returns normalized centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        counts = np.bincount(assignment, minlength=n_clusters)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed dead clusters from random points so every list stays useful
+            sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = sums / norms
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate index over a MemmapCollection's vectors.
+
+    Vectors are bucketed by their nearest k-means centroid; a query scans only
+    the ``nprobe`` closest buckets. Rows added after training are assigned to a
+    bucket on insert, and the centroids are retrained in a background thread
+    once the collection has grown by ``rebuild_growth``.
+
+    Knobs:
+        nlist           -- number of buckets (default ~4*sqrt(n) at train time)
+        nprobe          -- buckets scanned per query; higher = better recall, slower
+        min_train_size  -- below this many rows the caller should stay exact
+        rebuild_growth  -- retrain when count >= trained_count * rebuild_growth
+    """
+
+    def __init__(self, path=None, nlist=None, nprobe=8, min_train_size=1024, rebuild_growth=2.0,
+                 kmeans_iterations=20, train_sample_size=65536, seed=0):
+        self.path = path
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.rebuild_growth = rebuild_growth
+        self.kmeans_iterations = kmeans_iterations
+        self.train_sample_size = train_sample_size
+        self.seed = seed
+        self.centroids = None
+        self.lists = []
+        self.assigned_rows = 0
+        self.trained_rows = 0
+        self.epoch = 0  # bumped by reset(); a rebuild started in an older epoch is discarded
+        self._rebuild_thread = None
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load()
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def _load(self):
+        try:
+            data = np.load(self.path)
+            self.centroids = data["centroids"]
+            assignments = data["assignments"]
+            self.trained_rows = int(data["trained_rows"])
+        except Exception as e:
+            print(f"[IVFIndex] Could not load {self.path}, will retrain: {e}")
+            return
+        self._set_lists(assignments)
+
+    def _set_lists(self, assignments):
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(len(self.centroids) + 1))
+        self.lists = [list(order[bounds[i]:bounds[i + 1]]) for i in range(len(self.centroids))]
+        self.assigned_rows = len(assignments)
+
+    def reset(self):
+        with self._lock:
+            self.epoch += 1
+            self.centroids = None
+            self.lists = []
+            self.assigned_rows = 0
+            self.trained_rows = 0
+
+    def save(self, epoch=None):
+        if not self.path or not self.is_trained:
+            return
+        with self._lock:
+            if epoch is not None and epoch != self.epoch:
+                return
+            assignments = np.empty(self.assigned_rows, dtype=np.int32)
+            for list_id, rows in enumerate(self.lists):
+                assignments[rows] = list_id
+            tmp_path = self.path + ".tmp.npz"
+            np.savez(tmp_path, centroids=self.centroids, assignments=assignments, trained_rows=self.trained_rows)
+            os.replace(tmp_path, self.path)
+
+    def _assign(self, vectors, centroids):
+        assignment = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), 65536):
+            chunk = np.asarray(vectors[start:start + 65536])
+            assignment[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        return assignment
+
+    def train(self, matrix, epoch=None):
+        """
+        Fit centroids on (a sample of) ``matrix`` and bucket every row. With
+        ``epoch``, the result is only installed if no reset() happened since
+        (e.g. a vacuum renumbered the rows); returns whether it was installed.
+        """
+        count = matrix.shape[0]
+        nlist = self.nlist or max(1, int(4 * np.sqrt(count)))
+        nlist = min(nlist, count)
+        rng = np.random.default_rng(self.seed)
+        sample_rows = np.sort(rng.choice(count, size=min(count, max(self.train_sample_size, nlist)), replace=False))
+        sample = np.asarray(matrix[sample_rows], dtype=np.float32)
+
+        started = time.time()
+        centroids = _kmeans(sample, nlist, self.kmeans_iterations, self.seed)
+        assignments = self._assign(matrix, centroids)
+        with self._lock:
+            if epoch is not None and epoch != self.epoch:
+                print("[IVFIndex] Discarding a rebuild trained on rows that have since been vacuumed.")
+                return False
+            self.centroids = centroids
+            self.trained_rows = count
+            self._set_lists(assignments)
+        print(f"[IVFIndex] Trained {nlist} lists over {count} vectors in {time.time() - started:.2f}s.")
+        return True
+
+    def add(self, matrix):
+        """Bucket any rows of ``matrix`` that arrived since the last call."""
+        if not self.is_trained or matrix.shape[0] <= self.assigned_rows:
+            return
+        with self._lock:
+            start = self.assigned_rows
+            assignment = self._assign(matrix[start:], self.centroids)
+            for offset, list_id in enumerate(assignment):
+                self.lists[list_id].append(start + offset)
+            self.assigned_rows = matrix.shape[0]
+
+    def needs_rebuild(self, count):
+        if count < self.min_train_size:
+            return False
+        if not self.is_trained:
+            return True
+        return count >= self.trained_rows * self.rebuild_growth
+
+    def rebuild_async(self, matrix_source):
+        """
+        Retrain in a background thread. ``matrix_source`` is called from that
+        thread to snapshot the current vectors; rows appended meanwhile are
+        picked up by the next ``add``. If reset() is called before training
+        finishes, the stale result is thrown away instead of installed.
+        """
+        if self._rebuild_thread and self._rebuild_thread.is_alive():
+            return
+
+        def rebuild():
+            try:
+                epoch = self.epoch
+                if self.train(matrix_source(), epoch=epoch):
+                    self.save(epoch=epoch)
+            except Exception as e:
+                print(f"[IVFIndex] Background rebuild failed: {e}")
+
+        self._rebuild_thread = threading.Thread(target=rebuild, daemon=True)
+        self._rebuild_thread.start()
+
+    def search(self, query_vectors, matrix, k, nprobe=None):
+        """Approximate top-k; returns (scores, rows) arrays shaped like an exact search."""
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        with self._lock:
+            probe = np.argpartition(-(query_vectors @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+            candidate_sets = [
+                np.concatenate([np.asarray(self.lists[list_id], dtype=np.int64) for list_id in lists])
+                for lists in probe
+            ]
+            tail = np.arange(self.assigned_rows, matrix.shape[0], dtype=np.int64)
+
+        all_scores, all_rows = [], []
+        for query, candidates in zip(query_vectors, candidate_sets):
+            candidates = np.sort(np.concatenate([candidates, tail]))
+            scores = np.asarray(matrix[candidates]) @ query if len(candidates) else np.empty(0, dtype=np.float32)
+            top = min(k, len(candidates))
+            keep = np.argpartition(-scores, top - 1)[:top] if top else np.empty(0, dtype=np.int64)
+            keep = keep[np.argsort(-scores[keep])]
+            padded_scores = np.full(k, -np.inf, dtype=np.float32)
+            padded_rows = np.full(k, -1, dtype=np.int64)
+            padded_scores[:top] = scores[keep]
+            padded_rows[:top] = candidates[keep]
+            all_scores.append(padded_scores)
+            all_rows.append(padded_rows)
+        return np.array(all_scores), np.array(all_rows)
+
+
+def evaluate_recall(collection, n_queries=100, k=10, nprobe_values=(1, 2, 4, 8, 16, 32), seed=0):
+    """
+    Compare IVF search against exact search on ``collection`` (a MemmapCollection
+    with an IVF index). Queries are stored vectors with a little noise added.
+
+    Returns one dict per nprobe with recall@k and mean per-query latency.
+    """
+    matrix = collection._matrix()
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(matrix.shape[0], size=min(n_queries, matrix.shape[0]), replace=False)
+    queries = np.asarray(matrix[np.sort(rows)]) + rng.normal(scale=0.05, size=(len(rows), matrix.shape[1]))
+    queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+
+    index = collection.ann_index
+    if not index.is_trained:
+        index.train(matrix)
+    else:
+        index.add(matrix)
+
+    started = time.time()
+    _, exact_rows = collection._exact_top_k(queries, k)
+    exact_latency = (time.time() - started) / len(queries)
+
+    report = []
+    for nprobe in nprobe_values:
+        started = time.time()
+        _, approx_rows = index.search(queries, matrix, k, nprobe=nprobe)
+        latency = (time.time() - started) / len(queries)
+        hits = sum(len(set(a) & set(e)) for a, e in zip(approx_rows.tolist(), exact_rows.tolist()))
+        report.append({
+            "nprobe": nprobe,
+            "recall": hits / float(exact_rows.size),
+            "latency_ms": latency * 1000,
+            "exact_latency_ms": exact_latency * 1000
+        })
+    return report
+
+
+if __name__ == "__main__":
+    from brain.core.numpy_indexer import MemmapCollection
+
+    parser = argparse.ArgumentParser(description="Measure IVF recall against exact search on a stored collection.")
+    parser.add_argument("--index-dir", default="memory/vector_index")
+    parser.add_argument("--collection", default="long_term_memory")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=None)
+    args = parser.parse_args()
+
+    collection = MemmapCollection(args.index_dir, args.collection, index_mode="ivf", ann_params={"nlist": args.nlist})
+    if collection.count() == 0:
+        print(f"[IVFIndex] Collection '{args.collection}' in {args.index_dir} is empty.")
+    else:
+        print(f"[IVFIndex] {collection.count()} vectors, k={args.k}")
+        for row in evaluate_recall(collection, n_queries=args.queries, k=args.k):
+            print(f"  nprobe={row['nprobe']:>3}  recall@{args.k}={row['recall']:.3f}  "
+                  f"ivf={row['latency_ms']:.2f}ms  exact={row['exact_latency_ms']:.2f}ms")
@@ -0,0 +1,195 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import time
+
+import numpy as np
+
+from brain.core.text_generation import DEFAULT_MODEL_PATH, file_hash
+
+DEFAULT_PROFILE_PATH = "runtime/autotune_profiles.json"
+DEFAULT_BATCH_SIZES = (128, 256, 512, 1024)
+# A full chat prompt: TextGenerator's n_ctx (2048) minus the agent's 150-token reply budget
+DEFAULT_N_PROMPT = 2048 - 150
+
+
+def host_id():
+    """Identity of this machine for tuning profiles: hostname, architecture and logical CPUs."""
+    return f"{platform.node() or 'unknown'}-{platform.machine()}-{os.cpu_count()}cpu"
+
+
+def profile_key(model_path):
+    return f"{file_hash(model_path)[:16]}@{host_id()}"
+
+
+def _read_profiles(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_profile(model_path, path=DEFAULT_PROFILE_PATH):
+    """Tuned load settings (n_threads, n_batch, maybe n_gpu_layers) for this model on this host, or {}."""
+    if not os.path.exists(path):
+        return {}
+    profile = _read_profiles(path).get(profile_key(model_path))
+    return dict(profile["settings"]) if profile else {}
+
+
+def save_profile(model_path, settings, result, path=DEFAULT_PROFILE_PATH):
+    profiles = _read_profiles(path)
+    profiles[profile_key(model_path)] = {
+        "model": os.path.basename(model_path),
+        "host": host_id(),
+        "settings": settings,
+        "pp_tps": result["pp_tps"],
+        "tg_tps": result["tg_tps"],
+        "tuned_at": datetime.datetime.now().isoformat(timespec="seconds")
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(profiles, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def physical_cores():
+    try:
+        import psutil
+        return psutil.cpu_count(logical=False) or os.cpu_count() or 1
+    except ImportError:
+        return os.cpu_count() or 1
+
+
+def default_thread_counts():
+    """Physical cores, half and a quarter of them, and all logical CPUs."""
+    physical, logical = physical_cores(), os.cpu_count() or 1
+    return sorted({max(1, physical // 4), max(1, physical // 2), physical, logical})
+
+
+def benchmark(model_path, n_threads, n_batch, n_gpu_layers, n_prompt=DEFAULT_N_PROMPT, n_gen=32, repetitions=2,
+              seed=0):
+    """
+    One llama-bench style measurement: prefill ``n_prompt`` random tokens in
+    ``n_batch`` chunks (pp), then decode ``n_gen`` random tokens one at a time
+    (tg). Like llama-bench, tokens are never sampled, so no logits are read.
+    A warm-up run is discarded; returns mean tokens/sec for both phases.
+
+    n_ctx is sized to the prompt plus generation, and llama.cpp caps n_batch
+    at n_ctx, so ``n_batch`` above ``n_prompt`` measures nothing new.
+    """
+    from llama_cpp import Llama
+    llm = Llama(model_path=model_path, n_ctx=n_prompt + n_gen + 8, n_batch=n_batch, n_threads=n_threads,
+                n_gpu_layers=n_gpu_layers, use_mlock=False, verbose=False)
+    rng = np.random.default_rng(seed)
+    prompt = [llm.token_bos()] + rng.integers(0, llm.n_vocab(), size=n_prompt - 1).tolist()
+    generated = rng.integers(0, llm.n_vocab(), size=n_gen).tolist()
+    pp_times, tg_times = [], []
+    try:
+        for run in range(repetitions + 1):
+            llm.reset()
+            started = time.perf_counter()
+            llm.eval(prompt)
+            prefilled = time.perf_counter()
+            for token in generated:
+                llm.eval([token])
+            finished = time.perf_counter()
+            if run:
+                pp_times.append(prefilled - started)
+                tg_times.append(finished - prefilled)
+    finally:
+        del llm
+    return {
+        "n_threads": n_threads,
+        "n_batch": n_batch,
+        "n_gpu_layers": n_gpu_layers,
+        "pp_tps": n_prompt / float(np.mean(pp_times)),
+        "tg_tps": n_gen / float(np.mean(tg_times))
+    }
+
+
+def _request_seconds(result, n_prompt, n_gen):
+    """Latency of a typical reply: prefill the prompt, then decode the reply."""
+    return n_prompt / result["pp_tps"] + n_gen / result["tg_tps"]
+
+
+def autotune(model_path, n_gpu_layers=-1, thread_counts=None, batch_sizes=DEFAULT_BATCH_SIZES, gpu_layers=None,
+             n_prompt=DEFAULT_N_PROMPT, n_gen=32, repetitions=2, profile_path=DEFAULT_PROFILE_PATH, save=True):
+    """
+    Pick n_threads, n_batch (and optionally n_gpu_layers) for ``model_path``
+    on this machine and save them as its profile, which TextGenerator and
+    llama-server pick up on the next load.
+
+    Sweeps are staged rather than a full grid: threads (which mostly decide
+    decode speed) at n_batch 512, then batch sizes (prefill) at the best
+    thread count, then ``gpu_layers`` if given. Candidates are ranked by the
+    time a reply of ``n_prompt`` prompt and ``n_gen`` generated tokens would take,
+    so ``n_prompt`` should be the real prompt budget (n_ctx - max_tokens);
+    batch sizes larger than it are skipped with a warning.
+    """
+    thread_counts = thread_counts or default_thread_counts()
+    results = []
+
+    def run(n_threads, n_batch, layers):
+        result = benchmark(model_path, n_threads, n_batch, layers, n_prompt=n_prompt, n_gen=n_gen,
+                           repetitions=repetitions)
+        results.append(result)
+        print(f"[Autotune] | {n_threads:>7} | {n_batch:>7} | {layers:>4} | "
+              f"{result['pp_tps']:>9.1f} | {result['tg_tps']:>9.1f} |")
+        return result
+
+    def best(candidates):
+        return min(candidates, key=lambda result: _request_seconds(result, n_prompt, n_gen))
+
+    print(f"[Autotune] {os.path.basename(model_path)} on {host_id()}: pp{n_prompt} / tg{n_gen}, {repetitions} runs each")
+    skipped = [batch for batch in batch_sizes if batch > n_prompt]
+    if skipped:
+        print(f"[Autotune] ⚠️ Skipping n_batch {skipped}: larger than the {n_prompt}-token prompt, "
+              f"so they would run as n_batch {n_prompt}. Raise --n-prompt to measure them.")
+    base_batch = min(512, n_prompt)
+    print("[Autotune] | threads | n_batch |  ngl |    pp t/s |    tg t/s |")
+    chosen = best([run(threads, base_batch, n_gpu_layers) for threads in thread_counts])
+    chosen = best([chosen] + [run(chosen["n_threads"], batch, n_gpu_layers)
+                              for batch in batch_sizes if batch != base_batch and batch not in skipped])
+    settings = {"n_threads": chosen["n_threads"], "n_batch": chosen["n_batch"]}
+    if gpu_layers:
+        chosen = best([chosen] + [run(chosen["n_threads"], chosen["n_batch"], layers)
+                                  for layers in gpu_layers if layers != n_gpu_layers])
+        settings["n_gpu_layers"] = chosen["n_gpu_layers"]
+
+    print(f"[Autotune] Best: {settings} ({chosen['pp_tps']:.1f} pp t/s, {chosen['tg_tps']:.1f} tg t/s)")
+    if save:
+        save_profile(model_path, settings, chosen, profile_path)
+        print(f"[Autotune] Saved profile to {profile_path}")
+    return settings, results
+
+
+if __name__ == "__main__":
+    import yaml
+
+    parser = argparse.ArgumentParser(description="Benchmark load settings for the configured model and save the fastest.")
+    parser.add_argument("--config", default="config/config.yaml")
+    parser.add_argument("--model", default=None, help="GGUF path (default: model_settings.model_path)")
+    parser.add_argument("--threads", type=int, nargs="+", default=None)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=list(DEFAULT_BATCH_SIZES))
+    parser.add_argument("--gpu-layers", type=int, nargs="+", default=None,
+                        help="also sweep n_gpu_layers over these values and save the best")
+    parser.add_argument("--n-prompt", type=int, default=DEFAULT_N_PROMPT,
+                        help="prompt tokens per benchmark run (default: n_ctx - max_tokens, a full chat prompt)")
+    parser.add_argument("--n-gen", type=int, default=32)
+    parser.add_argument("--repetitions", type=int, default=2)
+    parser.add_argument("--dry-run", action="store_true", help="benchmark without saving the profile")
+    args = parser.parse_args()
+
+    model_settings = {}
+    if os.path.exists(args.config):
+        with open(args.config, "r") as f:
+            model_settings = (yaml.safe_load(f) or {}).get("model_settings") or {}
+    model_path = args.model or model_settings.get("model_path") or DEFAULT_MODEL_PATH
+    autotune(model_path, n_gpu_layers=model_settings.get("n_gpu_layers", -1), thread_counts=args.threads,
+             batch_sizes=args.batch_sizes, gpu_layers=args.gpu_layers, n_prompt=args.n_prompt, n_gen=args.n_gen,
+             repetitions=args.repetitions, save=not args.dry_run)
@@ -1,37 +1,297 @@
+import os
+import sqlite3
+import threading
+import time
+
 import chromadb
+import numpy as np
 from chromadb.config import Settings
+from chromadb.utils import embedding_functions
+
+from brain.core.memory_records import build_where, content_id, sanitize_metadata, upsert_metadata
+
 
 class ChromaDB:
-    def __init__(self, persist_directory="memory/chroma_db"):
-        self.client = chromadb.Client(Settings(
-            persist_directory=persist_directory,
-            anonymized_telemetry=False
-        ))
-        self.short_term = self.client.get_or_create_collection("short_term_memory")
-        self.long_term = self.client.get_or_create_collection("long_term_memory")
+    def __init__(self, persist_directory="memory/chroma_db", embedding_function=None):
+        self.persist_directory = persist_directory
+        if hasattr(chromadb, "PersistentClient"):
+            # chromadb >= 0.4: Client(Settings(persist_directory=...)) is in-memory only
+            self.client = chromadb.PersistentClient(
+                path=persist_directory,
+                settings=Settings(anonymized_telemetry=False)
+            )
+        else:
+            self.client = chromadb.Client(Settings(
+                chroma_db_impl="duckdb+parquet",
+                persist_directory=persist_directory,
+                anonymized_telemetry=False
+            ))
+        # Keep a handle on the embedding function so batched queries can embed
+        # once and reuse the vectors across both collections.
+        self.embedding_function = embedding_function or embedding_functions.DefaultEmbeddingFunction()
+        self.short_term = self.client.get_or_create_collection(
+            "short_term_memory", embedding_function=self.embedding_function
+        )
+        self.long_term = self.client.get_or_create_collection(
+            "long_term_memory", embedding_function=self.embedding_function
+        )
+        # Local mirror of stored ids: writes for content that is already indexed
+        # are dropped before they reach the embedding model.
+        self._write_lock = threading.Lock()
+        self._versions = {"short": 0, "long": 0}
+        self._known_ids = {
+            "short": set(self.short_term.get(include=[])["ids"]),
+            "long": set(self.long_term.get(include=[])["ids"]),
+        }
+
+    def _collection(self, memory_type):
+        return self.short_term if memory_type == "short" else self.long_term
+
+    def _memory_key(self, memory_type):
+        return "short" if memory_type == "short" else "long"
+
+    def count(self, memory_type):
+        return len(self._known_ids[self._memory_key(memory_type)])
+
+    def stored_ids(self, memory_type):
+        with self._write_lock:
+            return set(self._known_ids[self._memory_key(memory_type)])
+
+    def collection_version(self, memory_type):
+        """Bumped on every write to the collection; used to invalidate cached search results."""
+        return self._versions[self._memory_key(memory_type)]
 
     def add(self, content, memory_type="short", tags=None):
-        print(f"[📥] Embedding to Chroma: {content[:60]}")
-        collection = self.short_term if memory_type == "short" else self.long_term
-        
         # Convert tags list to a single string, if it's a list
         tags_str = ", ".join(tags) if isinstance(tags, list) else tags
         metadata = {"tags": tags_str} if tags_str else {}
-        
-        # Use content hash as ID to avoid duplicates
-        import hashlib
-        content_id = hashlib.md5(content.encode()).hexdigest()
-        
-        collection.add(
-            documents=[content],
-            metadatas=[metadata],
-            ids=[content_id]
-        )
+        return self.add_many([content], metadatas=[metadata], memory_type=memory_type)
+
+    def add_many(self, documents, metadatas=None, ids=None, memory_type="short"):
+        """
+        Bulk upsert. Ids default to the content hash; documents whose id is
+        already stored are not embedded again, only their metadata is
+        rewritten (see upsert_metadata) if it changed. Repeats within the batch
+        are skipped. Returns the number of new documents written.
+        """
+        metadatas = metadatas or [None] * len(documents)
+        ids = ids or [content_id(doc) for doc in documents]
+        key = self._memory_key(memory_type)
+
+        now = time.time()
+        with self._write_lock:
+            known = self._known_ids[key]
+            fresh = {}
+            rewrites = {}
+            for doc, metadata, doc_id in zip(documents, metadatas, ids):
+                if doc_id in fresh or doc_id in rewrites:
+                    continue
+                if doc_id in known:
+                    rewrites[doc_id] = metadata
+                else:
+                    fresh[doc_id] = (doc, sanitize_metadata(metadata, default_timestamp=now))
+            if rewrites and self._rewrite_metadata(memory_type, rewrites, now):
+                self._versions[key] += 1
+            if not fresh:
+                return 0
+
+            new_ids = list(fresh)
+            new_docs = [fresh[doc_id][0] for doc_id in new_ids]
+            for doc in new_docs:
+                print(f"[📥] Embedding to Chroma: {doc[:60]}")
+            self._collection(memory_type).upsert(
+                documents=new_docs,
+                metadatas=[fresh[doc_id][1] for doc_id in new_ids],
+                embeddings=self.embedding_function(new_docs),
+                ids=new_ids
+            )
+            known.update(new_ids)
+            self._versions[key] += 1
+            return len(new_ids)
+
+    def _rewrite_metadata(self, memory_type, rewrites, now):
+        """Update the metadata of already-stored ids where it changed; returns how many were updated."""
+        collection = self._collection(memory_type)
+        stored = collection.get(ids=list(rewrites), include=["metadatas"])
+        changed_ids, changed = [], []
+        for doc_id, old in zip(stored["ids"], stored["metadatas"]):
+            old = old or {}
+            merged = upsert_metadata(old, rewrites[doc_id], now)
+            if merged != old:
+                # update() merges keys into the stored metadata; None removes the ones the rewrite dropped
+                changed_ids.append(doc_id)
+                changed.append(dict({name: None for name in old if name not in merged}, **merged))
+        if changed_ids:
+            collection.update(ids=changed_ids, metadatas=changed)
+        return len(changed_ids)
 
-    def query_similar(self, query, memory_type="short", n_results=3):
-        collection = self.short_term if memory_type == "short" else self.long_term
+    def query_similar(self, query, memory_type="short", n_results=3, **filters):
+        """
+        Filters (source, tags, sensitivity, role, since, until, include_secret,
+        where) are turned into a chroma ``where`` clause so the index does the
+        filtering. Secret memories are excluded unless include_secret=True.
+        """
+        collection = self._collection(memory_type)
         results = collection.query(
             query_texts=[query],
-            n_results=n_results
+            n_results=n_results,
+            where=build_where(**filters)
         )
-        return results["documents"][0] if results["documents"] else [] 
\ No newline at end of file
+        return results["documents"][0] if results["documents"] else []
+
+    def query_many(self, queries, memory_types=("short", "long"), n_results=3, query_embeddings=None, **filters):
+        """
+        Run several queries in one go: the queries are embedded in a single batch
+        and each collection is searched once with all of them. Pass
+        ``query_embeddings`` to reuse vectors the caller already computed.
+
+        Returns one list per query of (document, metadata, distance) tuples, best
+        match first, merged across the requested memory types. Accepts the same
+        filters as query_similar.
+        """
+        if isinstance(memory_types, str):
+            memory_types = [memory_types]
+        if not queries:
+            return []
+
+        embeddings = self.embedding_function(list(queries)) if query_embeddings is None else query_embeddings
+        where = build_where(**filters)
+        merged = [[] for _ in queries]
+        for memory_type in memory_types:
+            collection = self._collection(memory_type)
+            count = collection.count()
+            if count == 0:
+                continue
+            results = collection.query(
+                query_embeddings=embeddings,
+                n_results=min(n_results, count),
+                where=where,
+                include=["documents", "metadatas", "distances"]
+            )
+            for i in range(len(queries)):
+                merged[i].extend(zip(
+                    results["documents"][i],
+                    results["metadatas"][i] or [{}] * len(results["documents"][i]),
+                    results["distances"][i]
+                ))
+
+        ranked = []
+        for hits in merged:
+            hits.sort(key=lambda hit: hit[2])
+            ranked.append([(doc, meta or {}, dist) for doc, meta, dist in hits[:n_results]])
+        return ranked
+
+    def query_ids(self, query, ids, memory_type="short", n_results=3, query_embedding=None, **filters):
+        """
+        Rank only the given ids against the query (used to give keyword candidates
+        a vector score). Returns (document, metadata, distance) tuples, best first,
+        with cosine distance.
+        """
+        found = self._collection(memory_type).get(
+            ids=list(ids), where=build_where(**filters), include=["embeddings", "documents", "metadatas"]
+        )
+        if not found["ids"]:
+            return []
+        if query_embedding is None:
+            query_embedding = self.embedding_function([query])[0]
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        matrix = np.asarray(found["embeddings"], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query_vector) or 1.0)
+        norms[norms == 0] = 1.0
+        similarities = (matrix @ query_vector) / norms
+        order = np.argsort(-similarities)[:n_results]
+        return [
+            (found["documents"][i], found["metadatas"][i] or {}, float(1.0 - similarities[i]))
+            for i in order
+        ]
+
+    def records(self, memory_type="short", batch_size=1000):
+        """Yield (id, document, metadata) for every stored memory, fetched a page at a time."""
+        collection = self._collection(memory_type)
+        offset = 0
+        while True:
+            page = collection.get(limit=batch_size, offset=offset, include=["documents", "metadatas"])
+            if not page["ids"]:
+                return
+            for doc_id, doc, meta in zip(page["ids"], page["documents"], page["metadatas"]):
+                yield doc_id, doc, meta or {}
+            offset += len(page["ids"])
+
+    def backfill_sensitivity(self, memory_type="short", batch_size=500):
+        """
+        Stamp sensitivity "normal" on rows stored without one (written before the
+        field existed). Chroma's ``$ne`` skips rows missing the key, so the default
+        where clause would otherwise hide them. Returns how many rows were updated.
+        """
+        key = self._memory_key(memory_type)
+        missing = [(doc_id, meta) for doc_id, _, meta in self.records(memory_type) if "sensitivity" not in meta]
+        collection = self._collection(memory_type)
+        with self._write_lock:
+            for start in range(0, len(missing), batch_size):
+                batch = missing[start:start + batch_size]
+                collection.update(
+                    ids=[doc_id for doc_id, _ in batch],
+                    metadatas=[dict(meta, sensitivity="normal") for _, meta in batch]
+                )
+            if missing:
+                self._versions[key] += 1
+        return len(missing)
+
+    def get_recent(self, memory_type="short", n=5, since=None, **filters):
+        """
+        Newest memories as (document, metadata) tuples. ``since`` becomes a
+        timestamp bound in the where clause, so only that window is fetched.
+        """
+        found = self._collection(memory_type).get(
+            where=build_where(since=since, **filters), include=["documents", "metadatas"]
+        )
+        hits = [(doc, meta or {}) for doc, meta in zip(found["documents"], found["metadatas"])]
+        hits.sort(key=lambda hit: hit[1].get("timestamp") if isinstance(hit[1].get("timestamp"), (int, float)) else 0,
+                  reverse=True)
+        return hits[:n]
+
+    def delete_many(self, ids, memory_type="short", batch_size=500):
+        """Delete ids in batches; returns how many were known to the collection."""
+        key = self._memory_key(memory_type)
+        collection = self._collection(memory_type)
+        deleted = 0
+        with self._write_lock:
+            ids = [doc_id for doc_id in dict.fromkeys(ids) if doc_id in self._known_ids[key]]
+            for start in range(0, len(ids), batch_size):
+                batch = ids[start:start + batch_size]
+                collection.delete(ids=batch)
+                self._known_ids[key].difference_update(batch)
+                deleted += len(batch)
+            if deleted:
+                self._versions[key] += 1
+        return deleted
+
+    def expired(self, memory_type="short", before=None):
+        """(id, document, metadata) for memories whose timestamp is older than ``before``."""
+        found = self._collection(memory_type).get(
+            where={"timestamp": {"$lt": before}}, include=["documents", "metadatas"]
+        )
+        return [
+            (doc_id, doc, meta or {})
+            for doc_id, doc, meta in zip(found["ids"], found["documents"], found["metadatas"])
+        ]
+
+    def vacuum(self, memory_type="short"):
+        """
+        Reclaim space in chroma's SQLite file after deletes. Only applies when the
+        client persists to disk; returns False when there is nothing to vacuum.
+        """
+        db_path = os.path.join(self.persist_directory, "chroma.sqlite3")
+        if not os.path.exists(db_path):
+            return False
+        try:
+            with self._write_lock:
+                conn = sqlite3.connect(db_path)
+                try:
+                    conn.execute("VACUUM")
+                finally:
+                    conn.close()
+            return True
+        except sqlite3.Error as e:
+            print(f"[⚠️] Chroma vacuum skipped: {e}")
+            return False
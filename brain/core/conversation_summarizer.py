@@ -0,0 +1,132 @@
+import time
+
+from brain.core.inference_pool import PoolSaturated
+
+SUMMARY_PROMPT = """### Instruction:
+You keep a running summary of a conversation between {user_name} and {judy_name}.
+Rewrite the summary so it also covers the new lines. Keep names, facts, promises,
+feelings and open threads; drop small talk. Write at most {max_words} words of plain prose.
+
+### Summary so far:
+{summary}
+
+### New lines:
+{turns}
+
+### Updated summary:
+"""
+
+
+class ConversationSummarizer:
+    """
+    Folds older chat turns into one rolling summary during idle pulses, so the
+    prompt carries a bounded summary plus the last ``keep_recent`` turns
+    instead of an ever longer transcript.
+
+    Turns are the short-term memories tagged role "user"/"judy". Everything
+    up to ``watermark`` (a turn timestamp) is already in the summary; each run
+    folds at most ``batch_turns`` of the unsummarized turns that are older
+    than the most recent ``keep_recent``. The summary and watermark live in
+    the state file under "conversation_summary". Generation is submitted to
+    the inference pool at background priority, so chat preempts it.
+    """
+
+    def __init__(self, state_manager, text_gen, keep_recent=8, batch_turns=8, max_tokens=160, interval_seconds=60,
+                 user_name="Stixx", judy_name="Judy"):
+        self.state_manager = state_manager
+        self.text_gen = text_gen
+        self.keep_recent = keep_recent
+        self.batch_turns = batch_turns
+        self.max_tokens = max_tokens
+        self.interval_seconds = interval_seconds
+        self.user_name = user_name
+        self.judy_name = judy_name
+        self._pending = None
+        self._last_run = 0.0
+
+    @classmethod
+    def from_settings(cls, state_manager, text_gen, settings=None, **kwargs):
+        settings = settings or {}
+        return cls(
+            state_manager,
+            text_gen,
+            keep_recent=settings.get("keep_recent", 8),
+            batch_turns=settings.get("batch_turns", 8),
+            max_tokens=settings.get("max_tokens", 160),
+            interval_seconds=settings.get("interval_seconds", 60),
+            **kwargs
+        )
+
+    def _record(self):
+        return self.state_manager.state.get("conversation_summary") or {"text": "", "watermark": 0.0, "turns": 0}
+
+    @property
+    def summary(self):
+        return self._record()["text"]
+
+    @property
+    def watermark(self):
+        return self._record()["watermark"]
+
+    def unsummarized_turns(self):
+        """(text, timestamp) of chat turns newer than the watermark, oldest first."""
+        watermark = self.watermark
+        recent = self.state_manager.get_recent_memories_chroma(memory_type="short", n=None, since=watermark)
+        turns = [
+            (doc, metadata["timestamp"]) for doc, metadata in recent
+            if metadata.get("role") in ("user", "judy")
+            and isinstance(metadata.get("timestamp"), (int, float)) and metadata["timestamp"] > watermark
+        ]
+        return sorted(turns, key=lambda turn: turn[1])
+
+    def run_once(self):
+        """
+        Idle-pulse hook: submit one fold if enough turns have aged out of the
+        recent window and none is in flight. Returns the submitted future or None.
+        """
+        if self._pending is not None and not self._pending.done():
+            return None
+        if time.time() - self._last_run < self.interval_seconds:
+            return None
+        self._last_run = time.time()
+        if hasattr(self.text_gen, "is_ready") and not self.text_gen.is_ready():
+            return None
+
+        turns = self.unsummarized_turns()
+        fold = turns[:len(turns) - self.keep_recent][:self.batch_turns]
+        if not fold:
+            return None
+
+        prompt = SUMMARY_PROMPT.format(
+            user_name=self.user_name,
+            judy_name=self.judy_name,
+            max_words=int(self.max_tokens * 0.7),
+            summary=self.summary or "(nothing yet)",
+            turns="\n".join(text for text, _ in fold)
+        )
+        try:
+            future = self.text_gen.submit(prompt, priority="background", max_tokens=self.max_tokens, temperature=0.2)
+        except PoolSaturated:
+            return None  # busy; try again next idle pulse
+        watermark = fold[-1][1]
+        future.add_done_callback(lambda f: self._apply(f, watermark, len(fold)))
+        self._pending = future
+        return future
+
+    def _apply(self, future, watermark, folded):
+        try:
+            text = future.result().strip()
+        except Exception as e:
+            print(f"[ConversationSummarizer] Summary generation failed: {e}")
+            return
+        if not text:
+            return
+        record = self._record()
+        self.state_manager.state["conversation_summary"] = {
+            "text": text,
+            "watermark": watermark,
+            "turns": record.get("turns", 0) + folded,
+            "updated": time.time()
+        }
+        self.state_manager.save_state()
+        print(f"[ConversationSummarizer] Folded {folded} turns into the summary ({len(text.split())} words).")
@@ -0,0 +1,180 @@
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+
+from brain.core.memory_records import build_where, content_id, match_where, sanitize_metadata, upsert_metadata
+
+_TOKEN_RE = re.compile(r"[\w']+", re.UNICODE)
+# Ignored in queries: they match most memories and would only add noise to the keyword ranking.
+STOPWORDS = frozenset("""
+a about after all am an and any are as at be been but by can could did do does for from had has have he her
+him his how i i'm if in into is it it's its just me my no not of on or our she so than that the their them
+then there these they this to too us was we were what when where which who why will with would you your
+""".split())
+
+
+def tokenize(text):
+    """Lowercased word tokens; underscores and digits are kept so ids like m_0053 survive."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Incremental Okapi BM25 inverted index over memory text.
+
+    Postings are {term: {doc_id: term_frequency}}; document lengths and the
+    running total are updated on every add/remove, so no rebuild is ever needed.
+    Query terms that are stopwords, or (once the index holds
+    ``DF_CUTOFF_MIN_DOCS`` documents) appear in more than ``max_df_ratio`` of
+    them, are not scored.
+    """
+
+    DF_CUTOFF_MIN_DOCS = 10
+
+    def __init__(self, k1=1.5, b=0.75, max_df_ratio=0.5):
+        self.k1 = k1
+        self.b = b
+        self.max_df_ratio = max_df_ratio
+        self.postings = defaultdict(dict)
+        self.doc_lengths = {}
+        self.documents = {}
+        self.metadatas = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def add(self, doc_id, text, metadata=None):
+        with self._lock:
+            if doc_id in self.doc_lengths:
+                if metadata:
+                    self.metadatas[doc_id] = metadata
+                return
+            tokens = tokenize(text)
+            for token in tokens:
+                self.postings[token][doc_id] = self.postings[token].get(doc_id, 0) + 1
+            self.doc_lengths[doc_id] = len(tokens)
+            self.documents[doc_id] = text
+            self.metadatas[doc_id] = metadata or {}
+            self._total_length += len(tokens)
+
+    def remove(self, doc_id):
+        with self._lock:
+            if doc_id not in self.doc_lengths:
+                return
+            for token in set(tokenize(self.documents[doc_id])):
+                postings = self.postings.get(token)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self.postings[token]
+            self._total_length -= self.doc_lengths.pop(doc_id)
+            del self.documents[doc_id]
+            self.metadatas.pop(doc_id, None)
+
+    def search(self, query, n_results=10, where=None):
+        """Returns [(doc_id, score)] best first, restricted to documents matching ``where``."""
+        with self._lock:
+            n_docs = len(self.doc_lengths)
+            if n_docs == 0:
+                return []
+            avg_length = self._total_length / n_docs or 1.0
+            scores = defaultdict(float)
+            df_limit = self.max_df_ratio * n_docs if n_docs >= self.DF_CUTOFF_MIN_DOCS else n_docs
+            for token in set(tokenize(query)) - STOPWORDS:
+                postings = self.postings.get(token)
+                if not postings or len(postings) > df_limit:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    if where and not match_where(self.metadatas.get(doc_id, {}), where):
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+
+
+class HybridRetriever:
+    """
+    BM25 + vector retrieval fused with reciprocal rank fusion (RRF).
+
+    Each memory type keeps its own BM25 index alongside the vector store. The
+    vector stage always searches the whole collection, so paraphrases that
+    share no keyword with the query still rank; BM25 candidates that the full
+    search did not return are re-scored through ``query_ids`` so their vector
+    similarity still counts in the fusion.
+
+    Timings for the last query (ms per stage) are kept in ``last_timings``.
+    """
+
+    def __init__(self, vector_store, rrf_k=60, candidate_pool=100):
+        self.vector_store = vector_store
+        self.rrf_k = rrf_k
+        self.candidate_pool = candidate_pool
+        self.keyword_indexes = {"short": BM25Index(), "long": BM25Index()}
+        self.last_timings = {}
+
+    def _keyword_index(self, memory_type):
+        return self.keyword_indexes["short" if memory_type == "short" else "long"]
+
+    def index(self, content, memory_type="short", metadata=None):
+        keyword_index = self._keyword_index(memory_type)
+        doc_id = content_id(content)
+        stored = keyword_index.metadatas.get(doc_id)
+        # Same rewrite rules as the vector stores, so both stages agree on sensitivity
+        clean = sanitize_metadata(metadata) if stored is None else upsert_metadata(stored, metadata)
+        keyword_index.add(doc_id, content, clean)
+
+    def remove(self, content, memory_type="short"):
+        self._keyword_index(memory_type).remove(content_id(content))
+
+    def search(self, query, memory_type="long", n_results=5, **filters):
+        """
+        Returns [(document, metadata, rrf_score)] best first. ``filters`` are the
+        vector-store query filters and apply to both stages, so secrets stay
+        excluded from keyword hits too.
+        """
+        timings = {}
+        started = time.perf_counter()
+        keyword_hits = self._keyword_index(memory_type).search(
+            query, n_results=self.candidate_pool, where=build_where(**filters)
+        )
+        timings["bm25_ms"] = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        # Embed once; the full search and the candidate re-scoring share the vector
+        query_embeddings = self.vector_store.embedding_function([query])
+        vector_hits = self.vector_store.query_many(
+            [query], memory_types=memory_type, n_results=n_results, query_embeddings=query_embeddings, **filters
+        )[0]
+        found = {content_id(document) for document, _, _ in vector_hits}
+        candidates = [doc_id for doc_id, _ in keyword_hits if doc_id not in found]
+        if candidates:
+            vector_hits = sorted(vector_hits + self.vector_store.query_ids(
+                query, candidates, memory_type, n_results=len(candidates),
+                query_embedding=query_embeddings[0], **filters
+            ), key=lambda hit: hit[2])
+        timings["vector_ms"] = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        fused = defaultdict(float)
+        documents = {}
+        metadatas = {}
+        for rank, (doc_id, _) in enumerate(keyword_hits):
+            fused[doc_id] += 1.0 / (self.rrf_k + rank + 1)
+            documents[doc_id] = self._keyword_index(memory_type).documents.get(doc_id)
+            metadatas[doc_id] = self._keyword_index(memory_type).metadatas.get(doc_id, {})
+        for rank, (document, metadata, _) in enumerate(vector_hits):
+            doc_id = content_id(document)
+            fused[doc_id] += 1.0 / (self.rrf_k + rank + 1)
+            documents[doc_id] = document
+            metadatas[doc_id] = metadata
+        ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:n_results]
+        results = [(documents[doc_id], metadatas.get(doc_id, {}), score) for doc_id, score in ranked]
+        timings["fusion_ms"] = (time.perf_counter() - started) * 1000
+
+        self.last_timings = timings
+        return results
@@ -0,0 +1,290 @@
+import concurrent.futures
+import heapq
+import itertools
+import threading
+import time
+
+from brain.core.text_generation import GenerationCancelled
+
+# Lower runs first. Interactive chat preempts background jobs.
+PRIORITIES = {"interactive": 0, "api": 1, "background": 2}
+
+
+class PoolSaturated(RuntimeError):
+    """Raised by InferencePool.submit when the request queue is full."""
+
+
+class _Job:
+    def __init__(self, prompt, kwargs, priority, supersede_key, seq):
+        self.prompt = prompt
+        self.kwargs = kwargs
+        self.rank = PRIORITIES[priority]
+        self.priority = priority
+        self.supersede_key = supersede_key
+        self.seq = seq
+        self.future = concurrent.futures.Future()
+        self.cancel = threading.Event()
+        self.cancel_reason = None
+        self.enqueued = time.perf_counter()
+        self.started = False
+
+    def __lt__(self, other):
+        return (self.rank, self.seq) < (other.rank, other.seq)
+
+
+class InferencePool:
+    """
+    N text-generation workers behind one bounded priority queue.
+
+    Each worker owns a TextGenerator (its own llama context and KV cache).
+    llama.cpp mmaps the GGUF file, so workers loading the same model share the
+    weight pages and each extra worker costs roughly one context's KV cache.
+
+    Scheduling: requests run by priority class (interactive > api >
+    background), FIFO within a class. When an interactive request arrives and
+    every worker is busy, a running background job is preempted at its next
+    token and re-queued to start over later. A request submitted with a
+    ``supersede_key`` cancels queued and running requests with the same key
+    (e.g. the user sent a newer chat message); their futures fail with
+    GenerationCancelled.
+
+    When the queue holds ``max_queue`` requests, a new one displaces the
+    lowest-priority queued request if it outranks it and is otherwise
+    rejected with PoolSaturated. Interactive/API requests that waited longer
+    than ``max_queue_seconds`` fail with TimeoutError instead of running late.
+    Every finished request carries queue/prefill/decode timings on
+    ``future.timings``; ``stats()`` aggregates them.
+
+    A generator with ``parallel_slots`` (the llama-server backend) serves
+    requests concurrently by itself, so only one is created and it gets one
+    worker thread per slot.
+
+    Exposes the same generate/register_prefixes/switch_model_async/status
+    calls as TextGenerator, so the agent and API can use either.
+    """
+
+    def __init__(self, factory, workers=1, max_queue=8, max_queue_seconds=30.0):
+        first = factory()
+        slots = getattr(first, "parallel_slots", None)
+        if slots:
+            self.generators = [first]
+            worker_generators = [first] * max(1, slots)
+        else:
+            self.generators = [first] + [factory() for _ in range(max(1, workers) - 1)]
+            worker_generators = self.generators
+        self.workers = len(worker_generators)
+        self.max_queue = max_queue
+        self.max_queue_seconds = max_queue_seconds
+        self.last_metrics = {}
+        self._heap = []
+        self._running = {}  # worker index -> job
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._stats_lock = threading.Lock()
+        self._stats = {"completed": 0, "failed": 0, "rejected": 0, "timed_out": 0, "preempted": 0, "superseded": 0,
+                       "queue_ms": 0.0, "prefill_ms": 0.0, "decode_ms": 0.0}
+        for index, generator in enumerate(worker_generators):
+            threading.Thread(target=self._worker, args=(index, generator), name=f"inference-{index}", daemon=True).start()
+
+    @classmethod
+    def from_settings(cls, model_settings, factory):
+        model_settings = model_settings or {}
+        return cls(
+            factory,
+            workers=model_settings.get("inference_workers", 1),
+            max_queue=model_settings.get("max_queue", 8),
+            max_queue_seconds=model_settings.get("max_queue_seconds", 30.0)
+        )
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _supersede(self, key):
+        """Cancel queued and running jobs with ``key``. Caller holds self._cond."""
+        for job in [job for job in self._heap if job.supersede_key == key]:
+            self._heap.remove(job)
+            job.future.set_exception(GenerationCancelled("Superseded by a newer request"))
+            self._count("superseded")
+        heapq.heapify(self._heap)
+        for job in self._running.values():
+            if job.supersede_key == key:
+                job.cancel_reason = "superseded"
+                job.cancel.set()
+
+    def _preempt_for(self, job):
+        """Free a worker for an interactive job by preempting a background one. Caller holds self._cond."""
+        if job.rank != PRIORITIES["interactive"] or len(self._running) < self.workers:
+            return
+        if any(running.cancel.is_set() for running in self._running.values()):
+            return  # a worker is already being freed
+        victims = [running for running in self._running.values() if running.priority == "background"]
+        if victims:
+            victim = max(victims, key=lambda running: running.seq)
+            victim.cancel_reason = "preempted"
+            victim.cancel.set()
+
+    def submit(self, prompt, priority="api", supersede_key=None, **kwargs):
+        """
+        Queue a generation; returns a future for the reply text. ``priority`` is
+        "interactive", "api" or "background". Raises PoolSaturated when full.
+        """
+        job = _Job(prompt, kwargs, priority, supersede_key, next(self._seq))
+        with self._cond:
+            if supersede_key is not None:
+                self._supersede(supersede_key)
+            if len(self._heap) >= self.max_queue:
+                worst = max(self._heap)
+                if job.rank >= worst.rank:
+                    self._count("rejected")
+                    raise PoolSaturated(f"Inference queue is full ({self.max_queue} waiting)")
+                self._heap.remove(worst)
+                heapq.heapify(self._heap)
+                worst.future.set_exception(PoolSaturated("Displaced from the queue by a higher-priority request"))
+                self._count("rejected")
+            heapq.heappush(self._heap, job)
+            self._preempt_for(job)
+            self._cond.notify()
+        return job.future
+
+    def generate(self, prompt, **kwargs):
+        return self.submit(prompt, **kwargs).result()
+
+    def _next_job(self, index):
+        with self._cond:
+            while not self._heap:
+                self._cond.wait()
+            job = heapq.heappop(self._heap)
+            self._running[index] = job
+            return job
+
+    def _worker(self, index, generator):
+        while True:
+            job = self._next_job(index)
+            try:
+                self._run(job, generator)
+            finally:
+                with self._cond:
+                    self._running.pop(index, None)
+
+    def _run(self, job, generator):
+        future = job.future
+        if not job.started:
+            if not future.set_running_or_notify_cancel():
+                return
+            job.started = True
+        queue_ms = (time.perf_counter() - job.enqueued) * 1000
+        if job.priority != "background" and queue_ms > self.max_queue_seconds * 1000:
+            self._count("timed_out")
+            future.set_exception(TimeoutError(f"Request waited {queue_ms / 1000:.1f}s for a worker"))
+            return
+        try:
+            result = generator.generate(job.prompt, cancel=job.cancel, **job.kwargs)
+        except GenerationCancelled as e:
+            if job.cancel_reason == "preempted":
+                # Start over once the interactive work is done.
+                self._count("preempted")
+                job.cancel = threading.Event()
+                job.cancel_reason = None
+                job.enqueued = time.perf_counter()
+                with self._cond:
+                    heapq.heappush(self._heap, job)
+                    self._cond.notify()
+            else:
+                self._count("superseded")
+                future.set_exception(e)
+            return
+        except Exception as e:
+            self._count("failed")
+            future.set_exception(e)
+            return
+
+        metrics = dict(generator.last_metrics)
+        prefill_ms = metrics.get("ttft_ms", 0.0)
+        future.timings = {
+            "queue_ms": queue_ms,
+            "prefill_ms": prefill_ms,
+            "decode_ms": metrics.get("total_ms", 0.0) - prefill_ms,
+            "tokens": metrics.get("tokens", 0)
+        }
+        self.last_metrics = dict(metrics, **future.timings)
+        with self._stats_lock:
+            self._stats["completed"] += 1
+            for key in ("queue_ms", "prefill_ms", "decode_ms"):
+                self._stats[key] += future.timings[key]
+        future.set_result(result)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        completed = stats["completed"] or 1
+        return {
+            "workers": self.workers,
+            "queued": len(self._heap),
+            "max_queue": self.max_queue,
+            "completed": stats["completed"],
+            "failed": stats["failed"],
+            "rejected": stats["rejected"],
+            "timed_out": stats["timed_out"],
+            "preempted": stats["preempted"],
+            "superseded": stats["superseded"],
+            "avg_queue_ms": stats["queue_ms"] / completed,
+            "avg_prefill_ms": stats["prefill_ms"] / completed,
+            "avg_decode_ms": stats["decode_ms"] / completed
+        }
+
+    @property
+    def n_ctx(self):
+        return self.generators[0].n_ctx
+
+    def tokenize(self, text):
+        # All workers run the same model, so any of them can tokenize.
+        return self.generators[0].tokenize(text)
+
+    def register_prefixes(self, prefixes):
+        prefixes = list(prefixes)
+        for generator in self.generators:
+            generator.register_prefixes(prefixes)
+
+    def is_ready(self):
+        return any(generator.is_ready() for generator in self.generators)
+
+    def wait_ready(self, timeout=None):
+        return all(generator.wait_ready(timeout) for generator in self.generators)
+
+    @property
+    def load_error(self):
+        return next((generator.load_error for generator in self.generators if generator.load_error), None)
+
+    def status(self):
+        statuses = [generator.status() for generator in self.generators]
+        for state in ("failed", "loading"):
+            status = next((s for s in statuses if s["state"] == state), None)
+            if status:
+                break
+        else:
+            status = statuses[0]
+        return dict(status, **self.stats())
+
+    def switch_model_async(self, model_path):
+        """
+        Hot-swap every worker, one at a time so only one extra model is ever
+        resident. Refusals from the first worker are raised immediately.
+        """
+        first = self.generators[0].switch_model_async(model_path)
+        future = concurrent.futures.Future()
+
+        def swap_rest():
+            try:
+                first.result()
+                for generator in self.generators[1:]:
+                    generator.switch_model(model_path)
+                future.set_result(model_path)
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=swap_rest, daemon=True).start()
+        return future
+
+    def switch_model(self, model_path):
+        return self.switch_model_async(model_path).result()
@@ -0,0 +1,91 @@
+import os
+import threading
+
+
+class LlamaEmbeddingFunction:
+    """
+    Embedding function backed by a GGUF embedding model running in llama.cpp
+    embedding mode, so memory search and chat share one inference engine.
+
+    Callable as ``fn(input)`` with a list of strings, which is the signature
+    chromadb expects from an embedding function; the numpy backend uses it the
+    same way. The model is loaded on first use.
+
+    Inputs are packed into batches of at most ``n_batch`` tokens (longer texts
+    are truncated to fit), and llama.cpp runs them with ``n_threads`` threads.
+    """
+
+    def __init__(self, model_path, n_threads=None, n_batch=512, n_gpu_layers=0, normalize=True):
+        self.model_path = model_path
+        self.n_threads = n_threads or max(1, (os.cpu_count() or 2) // 2)
+        self.n_batch = n_batch
+        self.n_gpu_layers = n_gpu_layers
+        self.normalize = normalize
+        self._llm = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        from llama_cpp import Llama
+        print(f"[LlamaEmbedding] Loading embedding model: {self.model_path}")
+        return Llama(
+            model_path=self.model_path,
+            embedding=True,
+            n_ctx=self.n_batch,
+            n_batch=self.n_batch,
+            n_ubatch=self.n_batch,
+            n_threads=self.n_threads,
+            n_threads_batch=self.n_threads,
+            n_gpu_layers=self.n_gpu_layers,
+            verbose=False
+        )
+
+    def _batches(self, texts):
+        batch, batch_tokens = [], 0
+        for text in texts:
+            n_tokens = min(len(self._llm.tokenize(text.encode("utf-8"))), self.n_batch)
+            if batch and batch_tokens + n_tokens > self.n_batch:
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += n_tokens
+        if batch:
+            yield batch
+
+    @staticmethod
+    def _pool(embedding):
+        # Models without a pooling head return one vector per token; mean-pool those.
+        if embedding and isinstance(embedding[0], list):
+            return [sum(column) / len(embedding) for column in zip(*embedding)]
+        return embedding
+
+    def __call__(self, input):
+        texts = [input] if isinstance(input, str) else list(input)
+        # llama.cpp contexts are not thread-safe; one embedding pass at a time.
+        with self._lock:
+            if self._llm is None:
+                self._llm = self._load()
+            embeddings = []
+            for batch in self._batches(texts):
+                result = self._llm.embed(batch, normalize=self.normalize, truncate=True)
+                embeddings.extend(self._pool(embedding) for embedding in result)
+        return embeddings
+
+
+def create_embedding_function(settings):
+    """
+    Build the memory embedding function from the ``memory_settings.embedding``
+    config block. Returns None for the backend's default embedding model.
+    """
+    settings = settings or {}
+    if settings.get("provider", "default") != "llama":
+        return None
+    model_path = settings.get("model_path")
+    if not model_path or not os.path.exists(model_path):
+        print(f"[LlamaEmbedding] Embedding model not found ({model_path}); using the default embedding function.")
+        return None
+    return LlamaEmbeddingFunction(
+        model_path,
+        n_threads=settings.get("n_threads"),
+        n_batch=settings.get("n_batch", 512),
+        n_gpu_layers=settings.get("n_gpu_layers", 0)
+    )
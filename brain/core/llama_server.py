@@ -0,0 +1,279 @@
+import http.client
+import json
+import os
+import queue
+import socket
+import subprocess
+import threading
+import time
+
+from brain.core.autotune import load_profile
+from brain.core.text_generation import TextGenerator, file_hash
+
+DEFAULT_SERVER_BINARY = os.path.join("llama.cpp", "build", "bin", "llama-server" + (".exe" if os.name == "nt" else ""))
+
+
+def _free_port(host):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+class LlamaServerProcess:
+    """
+    One llama-server (vendored llama.cpp/tools/server) and a keep-alive HTTP
+    client for it. Stands in for the ``llama_cpp.Llama`` instance that
+    TextGenerator normally holds, so hot swaps just start a second server.
+
+    The server is spawned on a free loopback port unless ``url`` points at
+    one that is already running. Connections are pooled and reused across
+    requests; requests run concurrently on the server's ``parallel`` slots.
+    """
+
+    def __init__(self, model_path, settings=None, n_ctx=2048, n_gpu_layers=-1, speculative=None, tuned=None):
+        settings = settings or {}
+        tuned = tuned or {}
+        self.host = settings.get("host", "127.0.0.1")
+        self.parallel = settings.get("parallel", 2)
+        self.timeout = settings.get("request_timeout", 300)
+        self.process = None
+        self._connections = queue.LifoQueue()
+        self._inflight = 0
+        self._inflight_lock = threading.Condition()
+
+        if settings.get("url"):
+            host_port = settings["url"].split("://", 1)[-1].rstrip("/")
+            self.host, _, port = host_port.partition(":")
+            self.port = int(port or 80)
+        else:
+            self.port = settings.get("port") or _free_port(self.host)
+            binary = settings.get("binary", DEFAULT_SERVER_BINARY)
+            if not os.path.exists(binary):
+                raise FileNotFoundError(f"llama-server binary not found: {binary} (build llama.cpp with LLAMA_BUILD_SERVER)")
+            command = [
+                binary, "-m", model_path,
+                "--host", self.host, "--port", str(self.port),
+                # The context is split across slots, so each slot gets n_ctx.
+                "-c", str(n_ctx * self.parallel), "-np", str(self.parallel),
+                "-ngl", str(tuned.get("n_gpu_layers", n_gpu_layers)),
+                "-t", str(settings.get("threads") or tuned.get("n_threads", 8)),
+                "-b", str(tuned.get("n_batch", 2048)),
+            ]
+            speculative = speculative or {}
+            if speculative.get("mode") == "draft" and os.path.exists(speculative.get("draft_model_path") or ""):
+                command += ["-md", speculative["draft_model_path"], "--draft-max", str(speculative.get("num_pred_tokens", 8))]
+            print(f"[LlamaServer] Starting: {' '.join(command)}")
+            self.process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self._wait_healthy(settings.get("startup_timeout", 300))
+
+    def _wait_healthy(self, timeout):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process is not None and self.process.poll() is not None:
+                raise RuntimeError(f"llama-server exited during startup (code {self.process.returncode})")
+            if self.healthy():
+                return
+            time.sleep(0.5)
+        self.close()
+        raise TimeoutError(f"llama-server on port {self.port} not healthy after {timeout}s")
+
+    def _acquire(self):
+        try:
+            return self._connections.get_nowait()
+        except queue.Empty:
+            return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _release(self, connection):
+        self._connections.put(connection)
+
+    def _request(self, method, path, body=None):
+        """Returns (connection, response); the caller releases the connection after reading."""
+        connection = self._acquire()
+        payload = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        try:
+            connection.request(method, path, body=payload, headers=headers)
+            return connection, connection.getresponse()
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            # Keep-alive connection dropped by the server: retry once on a fresh one.
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            connection.request(method, path, body=payload, headers=headers)
+            return connection, connection.getresponse()
+
+    def _json(self, method, path, body=None):
+        connection, response = self._request(method, path, body)
+        data = json.loads(response.read() or b"{}")
+        self._release(connection)
+        return response.status, data
+
+    def healthy(self):
+        try:
+            status, _ = self._json("GET", "/health")
+            return status == 200
+        except (OSError, http.client.HTTPException, ValueError):
+            return False
+
+    def tokenize(self, text, add_bos=False):
+        _, data = self._json("POST", "/tokenize", {"content": text, "add_special": add_bos})
+        return data.get("tokens", [])
+
+    def complete_stream(self, prompt, max_tokens=150, temperature=0.3):
+        """Yields server events: {"content": ...} per token, then the final event with "timings"."""
+        with self._inflight_lock:
+            self._inflight += 1
+        connection, finished = None, False
+        try:
+            connection, response = self._request("POST", "/completion", {
+                "prompt": prompt,
+                "n_predict": max_tokens,
+                "temperature": temperature,
+                "stream": True,
+                "cache_prompt": True,  # each slot reuses the matching prefix of its last prompt
+            })
+            if response.status != 200:
+                detail = response.read().decode("utf-8", "replace")
+                raise RuntimeError(f"llama-server returned {response.status}: {detail}")
+            for line in response:
+                line = line.strip()
+                if not line.startswith(b"data: "):
+                    continue
+                event = json.loads(line[6:])
+                yield event
+                if event.get("stop"):
+                    break
+            response.read()
+            self._release(connection)
+            finished = True
+        finally:
+            if connection is not None and not finished:
+                connection.close()  # abandoned or failed mid-stream; the response can't be reused
+            with self._inflight_lock:
+                self._inflight -= 1
+                self._inflight_lock.notify_all()
+
+    def close(self, drain_timeout=60):
+        """Wait for in-flight requests, then stop the server (if we started it)."""
+        with self._inflight_lock:
+            self._inflight_lock.wait_for(lambda: self._inflight == 0, timeout=drain_timeout)
+        while not self._connections.empty():
+            self._connections.get_nowait().close()
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class LlamaServerGenerator(TextGenerator):
+    """
+    TextGenerator backed by an out-of-process llama-server instead of an
+    in-process ``llama_cpp.Llama``. Generation no longer holds the GIL or the
+    generator lock, so the GUI, API and daemons share one model concurrently
+    across the server's slots. Prefix reuse is left to the server's
+    per-slot prompt cache instead of disk snapshots.
+    """
+
+    def __init__(self, model_path=None, n_gpu_layers=None, log_prompts=False, load_async=False,
+                 response_cache=None, speculative=None, server_settings=None):
+        self.server_settings = server_settings or {}
+        self._metrics = threading.local()
+        super().__init__(model_path=model_path, n_gpu_layers=n_gpu_layers, log_prompts=log_prompts,
+                         load_async=load_async, response_cache=response_cache, speculative=speculative)
+
+    # Several pool workers share this generator, so each thread sees its own last reply's metrics.
+    @property
+    def last_metrics(self):
+        return getattr(self._metrics, "value", {})
+
+    @last_metrics.setter
+    def last_metrics(self, value):
+        self._metrics.value = value
+
+    @property
+    def parallel_slots(self):
+        return self.server_settings.get("parallel", 2)
+
+    def load_model(self, model_path=None):
+        model_path = model_path or self.model_path
+        return LlamaServerProcess(model_path, self.server_settings, n_ctx=self.n_ctx,
+                                  n_gpu_layers=self.n_gpu_layers, speculative=self.speculative,
+                                  tuned=load_profile(model_path))
+
+    def switch_model_async(self, model_path):
+        # An external server (``url``) was started by someone else with its own
+        # model; "swapping" would only reconnect to it and keep serving that model.
+        if self.server_settings.get("url"):
+            raise RuntimeError(
+                f"llama-server at {self.server_settings['url']} is managed externally; "
+                f"restart it with {os.path.basename(model_path)} instead"
+            )
+        return super().switch_model_async(model_path)
+
+    def _prime_prefixes(self):
+        pass
+
+    def _warm_up(self, llm, model_path):
+        # No prefix snapshots to rebuild: the new server's slot cache warms on its first requests.
+        return {"_model_hash": file_hash(model_path)}
+
+    def tokenize(self, text):
+        self.ready.result()
+        return self.llm.tokenize(text)
+
+    def generate_stream(self, prompt, context=None, max_tokens=150, temperature=0.3, prefix=None, cancel=None):
+        prompt = self._format_prompt(prompt, context)
+        if self.log_prompts:
+            print(f"[TextGeneration] Prompt:\n{prompt}")
+        self.ready.result()
+
+        started = time.perf_counter()
+        first_token_at = None
+        tokens = 0
+        pieces = []
+        timings = {}
+        for event in self.llm.complete_stream(prompt, max_tokens=max_tokens, temperature=temperature):
+            if cancel is not None and cancel.is_set():
+                break  # closing the stream makes the server stop decoding for this slot
+            timings = event.get("timings", timings)
+            text = event.get("content", "")
+            if not text:
+                continue
+            tokens += 1
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            if not pieces:
+                text = text.lstrip()
+                if not text:
+                    continue
+            pieces.append(text)
+            yield text
+
+        finished = time.perf_counter()
+        first_token_at = first_token_at or finished
+        metrics = {
+            "ttft_ms": (first_token_at - started) * 1000,
+            "total_ms": (finished - started) * 1000,
+            "tokens": timings.get("predicted_n", tokens),
+            "tokens_per_sec": timings.get("predicted_per_second", 0.0)
+        }
+        if timings.get("draft_n"):
+            metrics["speculative"] = "draft"
+            metrics["acceptance_rate"] = timings.get("draft_n_accepted", 0) / timings["draft_n"]
+        self.last_metrics = metrics
+        print(f"[TextGeneration] TTFT {metrics['ttft_ms']:.0f}ms, "
+              f"{metrics['tokens']} tokens at {metrics['tokens_per_sec']:.1f} tok/s (llama-server)")
+        if self.log_prompts:
+            print(f"[TextGeneration] Response: {''.join(pieces).strip()}")
+
+
+def create_text_generator(model_settings, **kwargs):
+    """
+    Text generator for ``model_settings.backend``: "llama_cpp" (default) runs
+    the model in-process; "llama_server" talks to a llama-server over loopback.
+    """
+    model_settings = model_settings or {}
+    if model_settings.get("backend", "llama_cpp") == "llama_server":
+        return LlamaServerGenerator(server_settings=model_settings.get("llama_server"), **kwargs)
+    return TextGenerator(**kwargs)
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import re
+from datetime import datetime
+
+
+def content_id(content):
+    """Content hash used as the vector-store id, so the same text always maps to one entry."""
+    return hashlib.md5(content.encode()).hexdigest()
+
+
+def ids_checksum(ids):
+    """Order-independent fingerprint of a set of ids."""
+    return hashlib.sha1("\n".join(sorted(ids)).encode()).hexdigest()
+
+
+def tag_key(tag):
+    """Metadata flag key for a tag, so tag filters are plain equality checks the index can evaluate."""
+    return "tag_" + re.sub(r"[^a-z0-9]+", "_", str(tag).strip().lower()).strip("_")
+
+
+def _split_tags(tags):
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    return [str(tag).strip() for tag in tags or [] if str(tag).strip()]
+
+
+def to_epoch(value):
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            return value
+    return value
+
+
+def sanitize_metadata(metadata, default_timestamp=None):
+    """
+    Chroma only stores str/int/float/bool values: lists become comma-joined
+    strings, nested dicts become JSON, None values are dropped.
+
+    Every tag also gets a ``tag_<name>: True`` flag, timestamps are stored as
+    epoch seconds so time ranges can be filtered numerically, and
+    ``sensitivity`` defaults to "normal" so secrets can be excluded with a
+    single inequality. Vector stores pass ``default_timestamp`` (the write
+    time) so every stored row can be matched by time filters and TTL expiry.
+    """
+    clean = {}
+    for key, value in (metadata or {}).items():
+        if value is None:
+            continue
+        if key == "tags":
+            tags = _split_tags(value)
+            for tag in tags:
+                clean[tag_key(tag)] = True
+            value = ", ".join(tags)
+        elif key == "timestamp":
+            value = to_epoch(value)
+        if isinstance(value, (list, tuple, set)):
+            value = ", ".join(str(item) for item in value)
+        elif isinstance(value, dict):
+            value = json.dumps(value, default=str)
+        elif not isinstance(value, (str, int, float, bool)):
+            value = str(value)
+        clean[key] = value
+    clean.setdefault("sensitivity", "normal")
+    if default_timestamp is not None:
+        clean.setdefault("timestamp", default_timestamp)
+    return clean
+
+
+def upsert_metadata(stored, metadata, default_timestamp=None):
+    """
+    Sanitized metadata for rewriting an id that is already stored: ``metadata``
+    replaces ``stored``, except that sensitivity and timestamp keep their
+    stored values unless the new write sets them, so a plain re-add neither
+    un-hides a secret nor restarts its TTL.
+    """
+    merged = sanitize_metadata(metadata, default_timestamp)
+    for key in ("sensitivity", "timestamp"):
+        if (metadata or {}).get(key) is None and key in (stored or {}):
+            merged[key] = stored[key]
+    return merged
+
+
+def build_where(source=None, tags=None, sensitivity=None, role=None, since=None, until=None,
+                include_secret=False, where=None):
+    """
+    Translate query filters into a chroma-style ``where`` clause (also
+    understood by match_where). Secret memories are excluded unless
+    ``include_secret`` is set or a sensitivity is requested explicitly.
+    """
+    conditions = []
+    for key, value in (("source", source), ("sensitivity", sensitivity), ("role", role)):
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            conditions.append({key: {"$in": list(value)}})
+        else:
+            conditions.append({key: value})
+    for tag in _split_tags(tags):
+        conditions.append({tag_key(tag): True})
+    if since is not None:
+        conditions.append({"timestamp": {"$gte": to_epoch(since)}})
+    if until is not None:
+        conditions.append({"timestamp": {"$lte": to_epoch(until)}})
+    if not include_secret and sensitivity is None:
+        conditions.append({"sensitivity": {"$ne": "high"}})
+    if where:
+        conditions.append(where)
+
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+_OPERATORS = {
+    "$eq": lambda actual, expected: actual == expected,
+    "$ne": lambda actual, expected: actual != expected,
+    "$gt": lambda actual, expected: actual is not None and actual > expected,
+    "$gte": lambda actual, expected: actual is not None and actual >= expected,
+    "$lt": lambda actual, expected: actual is not None and actual < expected,
+    "$lte": lambda actual, expected: actual is not None and actual <= expected,
+    "$in": lambda actual, expected: actual in expected,
+    "$nin": lambda actual, expected: actual not in expected,
+}
+
+
+def match_where(metadata, where):
+    """Evaluate a chroma-style ``where`` clause against one metadata dict."""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(match_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(match_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            actual = metadata.get(key)
+            try:
+                if not all(_OPERATORS[op](actual, expected) for op, expected in condition.items()):
+                    return False
+            except TypeError:
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
@@ -0,0 +1,808 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from brain.core.memory_records import build_where, content_id, match_where, sanitize_metadata, to_epoch, upsert_metadata
+
+
+def _default_embedding_function():
+    # Imported lazily so booting the numpy backend never pays for the chromadb stack
+    # unless a query actually needs the default embedding model.
+    from chromadb.utils import embedding_functions
+    return embedding_functions.DefaultEmbeddingFunction()
+
+
+def _filter_fields(metadata):
+    # The subset of metadata kept in RAM so where-clauses never touch the sidecar
+    return {
+        key: value for key, value in metadata.items()
+        if key in ("source", "sensitivity", "role", "timestamp") or key.startswith("tag_")
+    }
+
+
+class _Columns:
+    """
+    The filterable metadata fields as growable numpy columns, one per key, so
+    where-clauses evaluate as array masks instead of row by row. "timestamp"
+    is a float column (NaN when missing); other keys are object columns
+    (None when missing). ``deleted`` flags tombstoned rows. ``revision`` is
+    bumped on every change, for callers caching derived arrays.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.revision = 0
+        self.deleted = np.zeros(0, dtype=bool)
+        self._columns = {}
+
+    @staticmethod
+    def _empty(key, length):
+        if key == "timestamp":
+            return np.full(length, np.nan, dtype=np.float64)
+        return np.full(length, None, dtype=object)
+
+    @staticmethod
+    def _cell(key, value):
+        if key == "timestamp":
+            return float(value) if isinstance(value, (int, float)) else np.nan
+        return value
+
+    def _grow(self, length):
+        capacity = max(length, 2 * len(self.deleted), 1024)
+        deleted = np.zeros(capacity, dtype=bool)
+        deleted[:self.size] = self.deleted[:self.size]
+        self.deleted = deleted
+        for key, column in self._columns.items():
+            grown = self._empty(key, capacity)
+            grown[:self.size] = column[:self.size]
+            self._columns[key] = grown
+
+    def _column_for_write(self, key):
+        column = self._columns.get(key)
+        if column is None:
+            column = self._columns[key] = self._empty(key, len(self.deleted))
+        return column
+
+    def append(self, fields):
+        if self.size == len(self.deleted):
+            self._grow(self.size + 1)
+        for key, value in fields.items():
+            self._column_for_write(key)[self.size] = self._cell(key, value)
+        self.size += 1
+        self.revision += 1
+
+    def set(self, row, fields):
+        for key, column in self._columns.items():
+            if key not in fields:
+                column[row] = self._cell(key, None)
+        for key, value in fields.items():
+            self._column_for_write(key)[row] = self._cell(key, value)
+        self.revision += 1
+
+    def mark_deleted(self, rows):
+        self.deleted[list(rows)] = True
+        self.revision += 1
+
+    def truncate(self, count):
+        self.deleted[count:self.size] = False
+        for key, column in self._columns.items():
+            column[count:self.size] = self._cell(key, None)
+        self.size = min(self.size, count)
+        self.revision += 1
+
+    def column(self, key, rows=None):
+        """Values of ``key`` for ``rows`` (a slice or row-number array; default all rows)."""
+        rows = slice(0, self.size) if rows is None else rows
+        column = self._columns.get(key)
+        if column is None:
+            return self._empty(key, len(self.deleted[rows]))
+        return column[rows]
+
+    def mask(self, where, rows=None):
+        """Boolean mask over ``rows`` of the rows matching a chroma-style ``where`` (see match_where)."""
+        rows = slice(0, self.size) if rows is None else rows
+        result = np.ones(len(self.deleted[rows]), dtype=bool)
+        for key, condition in (where or {}).items():
+            if key == "$and":
+                for clause in condition:
+                    result &= self.mask(clause, rows)
+            elif key == "$or":
+                matched = np.zeros_like(result)
+                for clause in condition:
+                    matched |= self.mask(clause, rows)
+                result &= matched
+            else:
+                values = self.column(key, rows)
+                clauses = condition.items() if isinstance(condition, dict) else (("$eq", condition),)
+                for op, expected in clauses:
+                    result &= self._compare(key, values, op, expected)
+        return result
+
+    @staticmethod
+    def _compare(key, values, op, expected):
+        numeric = values.dtype.kind == "f"
+        if op in ("$eq", "$ne") and not isinstance(expected, (list, tuple, set, dict)):
+            if numeric and not isinstance(expected, (int, float)):
+                equal = np.zeros(len(values), dtype=bool)
+            else:
+                equal = np.asarray(values == expected, dtype=bool)
+            return equal if op == "$eq" else ~equal
+        if op in ("$in", "$nin"):
+            found = np.zeros(len(values), dtype=bool)
+            for candidate in expected:
+                if not numeric or isinstance(candidate, (int, float)):
+                    found |= np.asarray(values == candidate, dtype=bool)
+            return found if op == "$in" else ~found
+        if numeric and op in ("$gt", "$gte", "$lt", "$lte"):
+            if not isinstance(expected, (int, float)):
+                return np.zeros(len(values), dtype=bool)
+            with np.errstate(invalid="ignore"):
+                if op == "$gt":
+                    return values > expected
+                if op == "$gte":
+                    return values >= expected
+                if op == "$lt":
+                    return values < expected
+                return values <= expected
+        # Ordering on text/object columns is rare; evaluate those row by row
+        return np.fromiter(
+            (match_where({key: None if value is None or value != value else value}, {key: {op: expected}})
+             for value in values),
+            dtype=bool, count=len(values)
+        )
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class MemmapCollection:
+    """
+    Append-only vector collection stored on disk.
+
+    Layout inside ``<directory>/<name>/``:
+        index.json      -- header with the vector dimension
+        vectors.f32     -- normalized float32 rows, read back through np.memmap
+        metadata.jsonl  -- sidecar, one {"id", "document", "metadata"} line per row
+        metadata.patches.jsonl -- {"row", "id", "metadata"} rewrites of stored rows, folded in by vacuum()
+        deleted.rows    -- tombstoned row numbers, dropped for good by vacuum()
+        vacuum.commit   -- present only while a vacuum is swapping in its *.tmp files
+
+    Only ids, sidecar byte offsets and the filterable metadata fields (as
+    numpy columns, see _Columns) are held in RAM; vectors stay in the page
+    cache and documents are read back from the sidecar for the hits returned.
+    """
+
+    SCAN_CHUNK = 65536
+
+    def __init__(self, directory, name, embedding_function=None, index_mode="exact", ann_params=None,
+                 compression=None):
+        self.name = name
+        self.path = os.path.join(directory, name)
+        self.header_path = os.path.join(self.path, "index.json")
+        self.vectors_path = os.path.join(self.path, "vectors.f32")
+        self.sidecar_path = os.path.join(self.path, "metadata.jsonl")
+        self.tombstones_path = os.path.join(self.path, "deleted.rows")
+        self.patches_path = os.path.join(self.path, "metadata.patches.jsonl")
+        self.vacuum_marker_path = os.path.join(self.path, "vacuum.commit")
+        self.ivf_path = os.path.join(self.path, "ivf.npz")
+        self._embedding_function = embedding_function
+        self._lock = threading.RLock()
+        self.dim = None
+        self.version = 0
+        self._vacuums = 0  # bumped when a vacuum renumbers the rows
+        os.makedirs(self.path, exist_ok=True)
+        self._reset_rows()
+        self._load()
+
+        # "ivf" layers an approximate inverted-file index over the same memmap;
+        # searches stay exact until the collection is big enough to train it.
+        self.ann_index = None
+        if index_mode == "ivf":
+            from brain.core.ann_index import IVFIndex
+            params = {key: value for key, value in (ann_params or {}).items() if value is not None}
+            self.ann_index = IVFIndex(path=self.ivf_path, **params)
+            if self.ann_index.assigned_rows > len(self.ids):
+                self.ann_index.reset()  # saved before a crash recovery trimmed rows
+            self._maintain_ann_index()
+
+        # Optional float16/int8 (+PCA) copy used for the first-pass scan; the
+        # float32 memmap is only touched to re-rank the top candidates.
+        self.compressed = None
+        if compression:
+            from brain.core.vector_quantization import CompressedVectors
+            self.compressed = CompressedVectors(**compression)
+
+    @property
+    def embedding_function(self):
+        if self._embedding_function is None:
+            self._embedding_function = _default_embedding_function()
+        return self._embedding_function
+
+    def _reset_rows(self):
+        self._matrix_cache = None
+        self.ids = []
+        self._offsets = []
+        self._row_of = {}
+        self._columns = _Columns()
+        self._secret_rows = set()
+        self._deleted_rows = set()
+        self._timestamp_cache = None  # (columns revision, timestamps in append order?)
+        self._patched = {}  # row -> metadata that replaced the sidecar's
+
+    def _load(self):
+        if os.path.exists(self.vacuum_marker_path):
+            self._finish_vacuum()  # the compacted files were complete; roll the swap forward
+        else:
+            for leftover in (self.vectors_path + ".tmp", self.sidecar_path + ".tmp"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)  # a vacuum died before committing; the old files are intact
+
+        if os.path.exists(self.header_path):
+            with open(self.header_path, "r") as f:
+                self.dim = json.load(f).get("dim")
+
+        sidecar_end = 0
+        if os.path.exists(self.sidecar_path):
+            with open(self.sidecar_path, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        record_id = record["id"]
+                    except (ValueError, KeyError):
+                        break  # torn write at the tail, everything after it is dropped
+                    self._append_row(record_id, sidecar_end, record.get("metadata") or {})
+                    sidecar_end += len(line)
+
+        # A crash between the vector and sidecar appends leaves the files uneven;
+        # trim both back to the rows that made it into each of them.
+        rows_on_disk = 0
+        if self.dim and os.path.exists(self.vectors_path):
+            rows_on_disk = os.path.getsize(self.vectors_path) // (self.dim * 4)
+        count = min(rows_on_disk, len(self.ids))
+        vectors_dirty = self.dim and os.path.exists(self.vectors_path) and \
+            os.path.getsize(self.vectors_path) != count * self.dim * 4
+        sidecar_dirty = os.path.exists(self.sidecar_path) and os.path.getsize(self.sidecar_path) != sidecar_end
+        if count != len(self.ids) or vectors_dirty or sidecar_dirty:
+            self._truncate(count, sidecar_end)
+
+        if os.path.exists(self.tombstones_path):
+            with open(self.tombstones_path, "r") as f:
+                rows = {int(line) for line in f if line.strip().isdigit()}
+            self._mark_deleted(row for row in rows if row < len(self.ids))
+
+        if os.path.exists(self.patches_path):
+            with open(self.patches_path, "rb") as f:
+                for line in f:
+                    try:
+                        patch = json.loads(line)
+                        row = patch["row"]
+                    except (ValueError, KeyError):
+                        break
+                    if row < len(self.ids) and self.ids[row] == patch.get("id") and row not in self._deleted_rows:
+                        self._set_row_metadata(row, patch["metadata"])
+
+    def _truncate(self, count, sidecar_end):
+        print(f"[VectorIndex] Recovering '{self.name}': keeping {count} of {len(self.ids)} rows.")
+        for record_id in self.ids[count:]:
+            self._row_of.pop(record_id, None)
+        if count < len(self._offsets):
+            sidecar_end = self._offsets[count]
+        self.ids = self.ids[:count]
+        self._offsets = self._offsets[:count]
+        self._columns.truncate(count)
+        self._secret_rows = {row for row in self._secret_rows if row < count}
+        self._deleted_rows = {row for row in self._deleted_rows if row < count}
+        if os.path.exists(self.sidecar_path):
+            with open(self.sidecar_path, "r+b") as f:
+                f.truncate(sidecar_end)
+        if self.dim and os.path.exists(self.vectors_path):
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(count * self.dim * 4)
+
+    def _append_row(self, record_id, offset, metadata):
+        self._row_of[record_id] = len(self.ids)
+        self.ids.append(record_id)
+        self._offsets.append(offset)
+        self._columns.append(_filter_fields(metadata))
+        if metadata.get("sensitivity") == "high":
+            self._secret_rows.add(len(self.ids) - 1)
+
+    def _set_row_metadata(self, row, metadata):
+        self._patched[row] = metadata
+        self._columns.set(row, _filter_fields(metadata))
+        if metadata.get("sensitivity") == "high":
+            self._secret_rows.add(row)
+        else:
+            self._secret_rows.discard(row)
+
+    def _mark_deleted(self, rows):
+        rows = list(rows)
+        for row in rows:
+            if self._row_of.get(self.ids[row]) == row:
+                del self._row_of[self.ids[row]]
+            self._deleted_rows.add(row)
+            self._secret_rows.discard(row)
+            self._patched.pop(row, None)
+        self._columns.mark_deleted(rows)
+
+    def count(self):
+        """Live (non-deleted) rows."""
+        return len(self.ids) - len(self._deleted_rows)
+
+    def delete(self, ids):
+        """Tombstone ``ids``; they vanish from searches immediately. Returns the number deleted."""
+        with self._lock:
+            rows = [self._row_of[record_id] for record_id in set(ids) if record_id in self._row_of]
+            if not rows:
+                return 0
+            self._mark_deleted(rows)
+            with open(self.tombstones_path, "a") as f:
+                f.write("".join(f"{row}\n" for row in rows))
+            self.version += 1
+            return len(rows)
+
+    def expired(self, before):
+        """Live rows whose timestamp is older than ``before`` as (id, document, metadata)."""
+        with self._lock:
+            columns = self._columns
+            with np.errstate(invalid="ignore"):
+                expired = columns.column("timestamp") < before
+            rows = np.flatnonzero(expired & ~columns.deleted[:columns.size])
+            records = [self._read_record(int(row)) for row in rows]
+        return [(record["id"], record["document"], record["metadata"]) for record in records]
+
+    def vacuum(self):
+        """
+        Rewrite the vector file and sidecar without tombstoned rows, then reload.
+        Approximate/compressed indexes are rebuilt from the compacted rows.
+        Returns the number of rows reclaimed.
+        """
+        with self._lock:
+            if not self._deleted_rows:
+                return 0
+            reclaimed = len(self._deleted_rows)
+            keep = np.flatnonzero(~self._columns.deleted[:len(self.ids)])
+            matrix = self._matrix()
+            with open(self.vectors_path + ".tmp", "wb") as vectors_out, \
+                    open(self.sidecar_path + ".tmp", "wb") as sidecar_out, \
+                    open(self.sidecar_path, "rb") as sidecar_in:
+                for start in range(0, len(keep), self.SCAN_CHUNK):
+                    chunk = keep[start:start + self.SCAN_CHUNK]
+                    vectors_out.write(np.asarray(matrix[chunk]).astype("<f4").tobytes())
+                    for row in chunk:
+                        if row in self._patched:
+                            sidecar_out.write(self._sidecar_line(self._read_record(row)))
+                        else:
+                            sidecar_in.seek(self._offsets[row])
+                            sidecar_out.write(sidecar_in.readline())
+                for out in (vectors_out, sidecar_out):
+                    out.flush()
+                    os.fsync(out.fileno())
+            del matrix
+            self._matrix_cache = None
+            # Before the swap, so an in-flight rebuild can't install (or save) stale rows
+            if self.ann_index is not None:
+                self.ann_index.reset()
+            if self.compressed is not None:
+                self.compressed.reset()
+            # Commit point: once the marker exists, _load finishes the swap after a crash
+            with open(self.vacuum_marker_path + ".tmp", "w") as f:
+                json.dump({"rows": len(keep)}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(self.vacuum_marker_path + ".tmp", self.vacuum_marker_path)
+            try:
+                self._finish_vacuum()
+            finally:
+                self._reset_rows()
+                self._load()
+            self._maintain_ann_index()
+            self.version += 1
+            self._vacuums += 1
+            print(f"[VectorIndex] Vacuumed '{self.name}': reclaimed {reclaimed} rows, {len(self.ids)} remain.")
+            return reclaimed
+
+    def _finish_vacuum(self):
+        """
+        Second half of vacuum(), also run by _load when vacuum.commit survived a
+        crash. Each step is skipped if it already happened, and the marker goes
+        last, so the compacted vectors and sidecar are never paired with the old
+        tombstones, patches or IVF buckets.
+        """
+        for path in (self.vectors_path, self.sidecar_path):
+            if os.path.exists(path + ".tmp"):
+                os.replace(path + ".tmp", path)
+        for path in (self.tombstones_path, self.patches_path, self.ivf_path):
+            if os.path.exists(path):
+                os.remove(path)
+        os.remove(self.vacuum_marker_path)
+
+    def _matrix(self):
+        count = len(self.ids)
+        if count == 0:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        if self._matrix_cache is None or self._matrix_cache.shape[0] != count:
+            self._matrix_cache = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(count, self.dim))
+        return self._matrix_cache
+
+    def _read_record(self, row):
+        with open(self.sidecar_path, "rb") as f:
+            f.seek(self._offsets[row])
+            record = json.loads(f.readline())
+        if row in self._patched:
+            record["metadata"] = self._patched[row]
+        return record
+
+    @staticmethod
+    def _sidecar_line(record):
+        return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+    def _rewrite_metadata(self, rewrites, now):
+        """
+        Record new metadata for stored rows (see upsert_metadata) in the patch
+        log instead of rewriting the sidecar. Returns how many changed.
+        """
+        lines = []
+        for row, metadata in rewrites:
+            old = self._read_record(row)["metadata"]
+            merged = upsert_metadata(old, metadata, now)
+            if merged != old:
+                self._set_row_metadata(row, merged)
+                lines.append(self._sidecar_line({"row": row, "id": self.ids[row], "metadata": merged}))
+        if lines:
+            with open(self.patches_path, "ab") as f:
+                f.write(b"".join(lines))
+        return len(lines)
+
+    def add(self, documents, metadatas=None, ids=None, embeddings=None):
+        """
+        Append documents whose ids are not stored yet; for stored ids only the
+        metadata is rewritten, if it changed. Returns the number added.
+        """
+        metadatas = metadatas or [{} for _ in documents]
+        ids = ids or [content_id(doc) for doc in documents]
+
+        with self._lock:
+            fresh = []
+            rewrites = []
+            seen = set()
+            for i, record_id in enumerate(ids):
+                if record_id in seen:
+                    continue
+                seen.add(record_id)
+                if record_id in self._row_of:
+                    rewrites.append((self._row_of[record_id], metadatas[i]))
+                else:
+                    fresh.append(i)
+            if rewrites and self._rewrite_metadata(rewrites, time.time()):
+                self.version += 1
+            if not fresh:
+                return 0
+
+            if embeddings is None:
+                vectors = _normalize(self.embedding_function([documents[i] for i in fresh]))
+            else:
+                vectors = _normalize([embeddings[i] for i in fresh])
+
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(self.header_path, "w") as f:
+                    json.dump({"dim": self.dim}, f)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors.astype("<f4").tobytes())
+
+            offset = os.path.getsize(self.sidecar_path) if os.path.exists(self.sidecar_path) else 0
+            now = time.time()
+            with open(self.sidecar_path, "ab") as f:
+                for i in fresh:
+                    metadata = sanitize_metadata(metadatas[i], default_timestamp=now)
+                    line = self._sidecar_line({"id": ids[i], "document": documents[i], "metadata": metadata})
+                    f.write(line)
+                    self._append_row(ids[i], offset, metadata)
+                    offset += len(line)
+            self.version += 1
+            self._maintain_ann_index()
+            return len(fresh)
+
+    def _maintain_ann_index(self):
+        if self.ann_index is None or not self.ids:
+            return
+        self.ann_index.add(self._matrix())
+        if self.ann_index.needs_rebuild(len(self.ids)):
+            self.ann_index.rebuild_async(self._locked_matrix)
+
+    def _locked_matrix(self):
+        # Snapshot for background IVF/compression rebuilds; the lock keeps it from racing a vacuum's reload
+        with self._lock:
+            return self._matrix()
+
+    def _filter_rows(self, where=None, since=None, until=None):
+        """
+        Live rows matching ``where``, evaluated as column masks. When
+        timestamps are in append order (the usual case) a since/until window
+        is cut with a binary search first, so "recent" queries only look at
+        the tail of the collection.
+        """
+        columns = self._columns
+        start, stop = 0, columns.size
+        if since is not None or until is not None:
+            timestamps = columns.column("timestamp")
+            if self._timestamp_cache is None or self._timestamp_cache[0] != columns.revision:
+                monotonic = not np.isnan(timestamps).any() and bool(np.all(np.diff(timestamps) >= 0))
+                self._timestamp_cache = (columns.revision, monotonic)
+            if self._timestamp_cache[1]:
+                if since is not None:
+                    start = int(np.searchsorted(timestamps, since, side="left"))
+                if until is not None:
+                    stop = int(np.searchsorted(timestamps, until, side="right"))
+        window = slice(start, max(start, stop))
+        matched = columns.mask(where, window) & ~columns.deleted[window]
+        if since is not None or until is not None:
+            # Exact bounds too: the binary search is skipped when timestamps are out of order
+            timestamps = columns.column("timestamp", window)
+            with np.errstate(invalid="ignore"):
+                if since is not None:
+                    matched &= timestamps >= since
+                if until is not None:
+                    matched &= timestamps <= until
+        return np.flatnonzero(matched) + start
+
+    def _score_rows(self, query_vectors, rows, n_results):
+        """Exact top-k restricted to ``rows``; padded with -1 rows like the IVF search."""
+        k = min(n_results, len(rows))
+        scores = query_vectors @ np.asarray(self._matrix()[rows]).T if len(rows) else \
+            np.empty((query_vectors.shape[0], 0), dtype=np.float32)
+        order = np.argsort(-scores, axis=1)[:, :k]
+        return np.take_along_axis(scores, order, axis=1), rows[order]
+
+    def _top_k(self, query_vectors, n_results):
+        if self.ann_index is not None and self.ann_index.is_trained:
+            return self.ann_index.search(query_vectors, self._matrix(), min(n_results, len(self.ids)))
+        if self.compressed is not None:
+            return self.compressed.search(query_vectors, self._matrix(), n_results, matrix_source=self._locked_matrix)
+        return self._exact_top_k(query_vectors, n_results)
+
+    def _exact_top_k(self, query_vectors, n_results):
+        """Exact top-k by cosine similarity, scanning the memmap in chunks."""
+        matrix = self._matrix()
+        count = matrix.shape[0]
+        k = min(n_results, count)
+        best_scores = np.full((query_vectors.shape[0], 0), -np.inf, dtype=np.float32)
+        best_rows = np.empty((query_vectors.shape[0], 0), dtype=np.int64)
+
+        for start in range(0, count, self.SCAN_CHUNK):
+            chunk = np.asarray(matrix[start:start + self.SCAN_CHUNK])
+            scores = query_vectors @ chunk.T  # (queries, chunk) via BLAS
+            rows = np.broadcast_to(np.arange(start, start + chunk.shape[0]), scores.shape)
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, rows], axis=1)
+            if scores.shape[1] > k:
+                keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                rows = np.take_along_axis(rows, keep, axis=1)
+            best_scores, best_rows = scores, rows
+
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_scores, order, axis=1), np.take_along_axis(best_rows, order, axis=1)
+
+    def query(self, query_texts=None, query_embeddings=None, n_results=3, where=None, since=None, until=None,
+              exclude_secret=False):
+        """
+        Chroma-shaped results: dict of per-query lists for ids/documents/metadatas/distances.
+
+        ``where`` (chroma syntax) and the since/until window are applied before
+        scoring. ``exclude_secret`` drops rows stored with sensitivity "high";
+        on its own it keeps the fast (and IVF) path by over-fetching by the
+        number of secret rows instead of filtering row by row.
+        """
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(list(query_texts))
+        query_vectors = _normalize(query_embeddings)
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+
+        with self._lock:
+            if not self.count():
+                for key in results:
+                    results[key] = [[] for _ in range(query_vectors.shape[0])]
+                return results
+            excluded = self._deleted_rows | self._secret_rows if exclude_secret else self._deleted_rows
+            if where or since is not None or until is not None:
+                rows = self._filter_rows(where, since, until)
+                if exclude_secret and self._secret_rows:
+                    rows = rows[~self._columns.mask({"sensitivity": "high"}, rows)]
+                scores, rows = self._score_rows(query_vectors, rows, n_results)
+            else:
+                scores, rows = self._top_k(query_vectors, n_results + len(excluded))
+            for query_scores, query_rows in zip(scores, rows):
+                hits = [
+                    (int(row), score) for row, score in zip(query_rows, query_scores)
+                    if row >= 0 and row not in excluded
+                ][:n_results]
+                records = [self._read_record(row) for row, _ in hits]
+                results["ids"].append([record["id"] for record in records])
+                results["documents"].append([record["document"] for record in records])
+                results["metadatas"].append([record["metadata"] for record in records])
+                results["distances"].append([float(1.0 - score) for _, score in hits])
+        return results
+
+    def query_ids(self, query_embedding, ids, n_results=3, where=None):
+        """Score only the rows for ``ids``; returns [(id, document, metadata, distance)] best first."""
+        query_vectors = _normalize(query_embedding)
+        with self._lock:
+            rows = np.array(sorted(self._row_of[i] for i in set(ids) if i in self._row_of), dtype=np.int64)
+            rows = rows[self._columns.mask(where, rows)]
+            scores, rows = self._score_rows(query_vectors, rows, n_results)
+            hits = []
+            for row, score in zip(rows[0], scores[0]):
+                record = self._read_record(int(row))
+                hits.append((record["id"], record["document"], record["metadata"], float(1.0 - score)))
+            return hits
+
+    def records(self, batch_size=4096):
+        """
+        Yield (id, document, metadata) for every live row. The sidecar is read
+        in batches so writers are only held off for one batch at a time; if a
+        vacuum renumbers the rows in between, iteration restarts from the top
+        (so a record may be yielded twice, never skipped).
+        """
+        row, vacuums = 0, self._vacuums
+        while True:
+            with self._lock:
+                if self._vacuums != vacuums:
+                    row, vacuums = 0, self._vacuums
+                stop = min(row + batch_size, len(self.ids))
+                if row >= stop:
+                    return
+                batch = []
+                with open(self.sidecar_path, "rb") as f:
+                    for live_row in range(row, stop):
+                        if live_row in self._deleted_rows:
+                            continue
+                        f.seek(self._offsets[live_row])
+                        record = json.loads(f.readline())
+                        metadata = self._patched.get(live_row, record.get("metadata") or {})
+                        batch.append((record["id"], record["document"], metadata))
+            yield from batch
+            row = stop
+
+    def get_recent(self, n=5, where=None, since=None, until=None, exclude_secret=False):
+        """Newest rows in the window as (document, metadata) tuples."""
+        with self._lock:
+            rows = self._filter_rows(where, since, until)
+            if exclude_secret and self._secret_rows:
+                rows = rows[~self._columns.mask({"sensitivity": "high"}, rows)]
+            timestamps = np.nan_to_num(self._columns.column("timestamp", rows), nan=-np.inf)
+            newest = rows[np.argsort(-timestamps, kind="stable")[:n]]
+            records = [self._read_record(int(row)) for row in newest]
+        return [(record["document"], record["metadata"]) for record in records]
+
+
+class NumpyVectorDB:
+    """
+    Embedded drop-in for ChromaDB: same add/query_similar/query_many surface and
+    short/long collections, backed by MemmapCollection instead of chromadb.
+    """
+
+    def __init__(self, persist_directory="memory/vector_index", embedding_function=None,
+                 index_mode="exact", ann_params=None, compression=None):
+        self.persist_directory = persist_directory
+        self.short_term = MemmapCollection(persist_directory, "short_term_memory", embedding_function,
+                                           compression=compression)
+        # Only long-term memory grows large enough to benefit from an approximate index.
+        self.long_term = MemmapCollection(persist_directory, "long_term_memory", embedding_function,
+                                          index_mode=index_mode, ann_params=ann_params, compression=compression)
+
+    @property
+    def embedding_function(self):
+        return self.long_term.embedding_function
+
+    def _collection(self, memory_type):
+        return self.short_term if memory_type == "short" else self.long_term
+
+    def count(self, memory_type):
+        return self._collection(memory_type).count()
+
+    def stored_ids(self, memory_type):
+        collection = self._collection(memory_type)
+        with collection._lock:
+            return set(collection._row_of)
+
+    def collection_version(self, memory_type):
+        """Bumped on every write to the collection; used to invalidate cached search results."""
+        return self._collection(memory_type).version
+
+    def add(self, content, memory_type="short", tags=None):
+        tags_str = ", ".join(tags) if isinstance(tags, list) else tags
+        metadata = {"tags": tags_str} if tags_str else {}
+        return self.add_many([content], metadatas=[metadata], memory_type=memory_type)
+
+    def add_many(self, documents, metadatas=None, ids=None, memory_type="short"):
+        """Bulk upsert; stored ids only get their metadata rewritten, without re-embedding. Returns the number added."""
+        added = self._collection(memory_type).add(documents, metadatas=metadatas, ids=ids)
+        if added:
+            print(f"[📥] Embedded {added} new document(s) to vector index ({memory_type}-term).")
+        return added
+
+    def query_similar(self, query, memory_type="short", n_results=3, **filters):
+        results = self._collection(memory_type).query(
+            query_texts=[query], n_results=n_results, **self._filter_args(filters)
+        )
+        return results["documents"][0] if results["documents"] else []
+
+    @staticmethod
+    def _filter_args(filters):
+        filters = dict(filters)
+        include_secret = filters.pop("include_secret", False) or filters.get("sensitivity") is not None
+        # Secret exclusion is handled by the collection itself so unfiltered
+        # queries can still take the exact/IVF fast path.
+        return {
+            "where": build_where(include_secret=True, **filters),
+            "since": to_epoch(filters.get("since")),
+            "until": to_epoch(filters.get("until")),
+            "exclude_secret": not include_secret,
+        }
+
+    def query_many(self, queries, memory_types=("short", "long"), n_results=3, query_embeddings=None, **filters):
+        """
+        Batched counterpart of query_similar; see ChromaDB.query_many for the
+        return shape.
+        """
+        if isinstance(memory_types, str):
+            memory_types = [memory_types]
+        if not queries:
+            return []
+
+        embeddings = self.embedding_function(list(queries)) if query_embeddings is None else query_embeddings
+        filter_args = self._filter_args(filters)
+        merged = [[] for _ in queries]
+        for memory_type in memory_types:
+            results = self._collection(memory_type).query(
+                query_embeddings=embeddings, n_results=n_results, **filter_args
+            )
+            for i in range(len(queries)):
+                merged[i].extend(zip(results["documents"][i], results["metadatas"][i], results["distances"][i]))
+
+        ranked = []
+        for hits in merged:
+            hits.sort(key=lambda hit: hit[2])
+            ranked.append(hits[:n_results])
+        return ranked
+
+    def query_ids(self, query, ids, memory_type="short", n_results=3, query_embedding=None, **filters):
+        """Rank only the given ids; same tuple shape as query_many results."""
+        if query_embedding is None:
+            query_embedding = self.embedding_function([query])[0]
+        hits = self._collection(memory_type).query_ids(
+            query_embedding, ids, n_results=n_results, where=build_where(**filters)
+        )
+        return [(document, metadata, distance) for _, document, metadata, distance in hits]
+
+    def records(self, memory_type="short"):
+        """(id, document, metadata) for every stored memory; see MemmapCollection.records."""
+        return self._collection(memory_type).records()
+
+    def get_recent(self, memory_type="short", n=5, since=None, **filters):
+        """Newest memories as (document, metadata) tuples; see ChromaDB.get_recent."""
+        return self._collection(memory_type).get_recent(n=n, **self._filter_args(dict(filters, since=since)))
+
+    def delete_many(self, ids, memory_type="short"):
+        return self._collection(memory_type).delete(ids)
+
+    def expired(self, memory_type="short", before=None):
+        """(id, document, metadata) for memories whose timestamp is older than ``before``."""
+        return self._collection(memory_type).expired(before)
+
+    def vacuum(self, memory_type="short"):
+        return self._collection(memory_type).vacuum()
@@ -0,0 +1,112 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from brain.core.template_registry import compile_template
+
+# Per-section token caps; whatever the fixed text leaves over is the hard limit.
+DEFAULT_SECTION_BUDGETS = {
+    "user_message": 384,
+    "recent_memories": 768,
+}
+
+
+class PromptAssembler:
+    """
+    Fills a prompt template so the result never exceeds ``n_ctx - max_tokens``.
+
+    Every segment (template literals, field values, each memory) is tokenized
+    once and its token count cached by content hash, so rebuilding a prompt
+    each turn costs a few dict lookups instead of tokenizing the whole prompt.
+    Counts are summed per segment; one token per segment boundary is held back
+    as slack for merges across boundaries.
+
+    The user message is capped at its section budget. Memories are ranked by
+    score and packed greedily into what is left (up to their own budget), then
+    emitted in their original order.
+    """
+
+    def __init__(self, tokenize, n_ctx=2048, max_tokens=150, section_budgets=None, cache_size=4096):
+        self.tokenize = tokenize
+        self.n_ctx = n_ctx
+        self.max_tokens = max_tokens
+        self.section_budgets = dict(DEFAULT_SECTION_BUDGETS, **(section_budgets or {}))
+        self.cache_size = cache_size
+        self.last_report = {}
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self, text):
+        if not text:
+            return 0
+        key = hashlib.sha1(text.encode("utf-8")).digest()
+        with self._lock:
+            cached = self._counts.get(key)
+            if cached is not None:
+                self._counts.move_to_end(key)
+                return cached
+        n_tokens = len(self.tokenize(text))
+        with self._lock:
+            self._counts[key] = n_tokens
+            while len(self._counts) > self.cache_size:
+                self._counts.popitem(last=False)
+        return n_tokens
+
+    def truncate(self, text, budget):
+        """Longest prefix of ``text`` (cut at a word boundary) within ``budget`` tokens."""
+        if self.count(text) <= budget:
+            return text
+        words = text.split(" ")
+        low, high = 0, len(words)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self.count(" ".join(words[:mid])) <= budget:
+                low = mid
+            else:
+                high = mid - 1
+        return " ".join(words[:low])
+
+    def assemble(self, template, fields, memories=(), memory_field="recent_memories", separator="\n"):
+        """
+        Render ``template`` (a format string or CompiledTemplate) with ``fields``
+        plus the memories that fit. ``memories`` is a sequence of (text, score).
+        Returns the prompt; the token accounting is kept in ``last_report``.
+        """
+        fields = dict(fields)
+        available = self.n_ctx - self.max_tokens
+        template = compile_template(template)
+        literals, names = template.literals, template.fields
+
+        slack = len(literals) + len(names)
+        fixed = sum(self.count(literal) for literal in literals) + slack
+        fixed += sum(self.count(str(fields.get(name, ""))) for name in names
+                     if name not in (memory_field, "user_message"))
+
+        if "user_message" in fields:
+            message_budget = max(0, min(self.section_budgets["user_message"], available - fixed))
+            fields["user_message"] = self.truncate(str(fields["user_message"]), message_budget)
+            fixed += self.count(fields["user_message"])
+
+        memory_budget = available - fixed
+        if self.section_budgets.get(memory_field) is not None:
+            memory_budget = min(memory_budget, self.section_budgets[memory_field])
+        separator_tokens = self.count(separator)
+
+        chosen, used = set(), 0
+        ranked = sorted(range(len(memories)), key=lambda i: memories[i][1], reverse=True)
+        for i in ranked:
+            cost = self.count(memories[i][0]) + separator_tokens
+            if used + cost <= memory_budget:
+                chosen.add(i)
+                used += cost
+        fields[memory_field] = separator.join(memories[i][0] for i in range(len(memories)) if i in chosen)
+
+        self.last_report = {
+            "budget": available,
+            "fixed_tokens": fixed,
+            "memory_tokens": used,
+            "memories_used": len(chosen),
+            "memories_dropped": len(memories) - len(chosen),
+            "total_tokens": fixed + used
+        }
+        return template.render(fields)
@@ -40,3 +40,9 @@ personalities = {
 
 # Default export for jalen_agent.py compatibility
 prompt_template = prompt_template_default
+
+
+# Placeholders that change every turn; everything before the first of them is
+# the static persona prefix, whose evaluated KV state TextGeneration caches.
+DYNAMIC_FIELDS = ("mood", "scene", "recent_memories", "user_message")
+
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class ResponseCache:
+    """
+    Cache of generated replies with two tiers, both LRU with a TTL.
+
+    exact:    keyed by (model hash, prompt hash, sampling params); only used
+              for calls at or below ``exact_max_temperature``. The default 0
+              keeps it to deterministic calls; raising it lets a sampled reply
+              be served again for an identical prompt.
+    semantic: opt-in; keyed by the embedding of the user message within one
+              context (mood/scene). A lookup returns the reply of the most
+              similar cached message in the same context if its cosine
+              similarity is at least ``semantic_threshold``.
+
+    ``stats()`` reports hits per tier and the completion tokens they saved.
+    """
+
+    def __init__(self, max_entries=256, ttl_seconds=600, semantic=False, semantic_threshold=0.95,
+                 embedding_function=None, exact_max_temperature=0.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.exact_max_temperature = exact_max_temperature
+        self.semantic_threshold = semantic_threshold
+        self.embedding_function = embedding_function if semantic else None
+        self._exact = OrderedDict()
+        self._semantic = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+
+    @classmethod
+    def from_settings(cls, settings, embedding_function=None):
+        """Build from the ``model_settings.response_cache`` block; None/false disables caching."""
+        if not settings:
+            return None
+        settings = settings if isinstance(settings, dict) else {}
+        return cls(
+            max_entries=settings.get("max_entries", 256),
+            ttl_seconds=settings.get("ttl_seconds", 600),
+            semantic=settings.get("semantic", False),
+            semantic_threshold=settings.get("semantic_threshold", 0.95),
+            embedding_function=embedding_function,
+            exact_max_temperature=settings.get("exact_max_temperature", 0.0)
+        )
+
+    @property
+    def semantic_enabled(self):
+        return self.embedding_function is not None
+
+    @staticmethod
+    def exact_key(model, prompt, **sampling):
+        prompt_hash = hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+        return model, prompt_hash, json.dumps(sampling, sort_keys=True)
+
+    def _put(self, store, key, value):
+        store[key] = (time.time() + self.ttl_seconds,) + value
+        store.move_to_end(key)
+        while len(store) > self.max_entries:
+            store.popitem(last=False)
+
+    def _hit(self, tier, tokens):
+        if tier == "exact":
+            self.exact_hits += 1
+        else:
+            self.semantic_hits += 1
+        self.saved_tokens += tokens
+
+    def get_exact(self, key):
+        with self._lock:
+            entry = self._exact.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._exact[key]
+                self.misses += 1
+                return None
+            self._exact.move_to_end(key)
+            self._hit("exact", entry[2])
+            return entry[1]
+
+    def put_exact(self, key, text, tokens=0):
+        with self._lock:
+            self._put(self._exact, key, (text, tokens))
+
+    def _embed(self, message):
+        vector = np.asarray(self.embedding_function([message])[0], dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def get_semantic(self, model, message, context=None):
+        if not self.semantic_enabled:
+            return None
+        scope = (model, json.dumps(context or {}, sort_keys=True, default=str))
+        query = self._embed(message)
+        now = time.time()
+        with self._lock:
+            best_key, best_score = None, self.semantic_threshold
+            for key, (expires, vector, _, _) in list(self._semantic.items()):
+                if expires < now:
+                    del self._semantic[key]
+                    continue
+                if key[:2] != scope:
+                    continue
+                score = float(vector @ query)
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._semantic.move_to_end(best_key)
+            _, _, text, tokens = self._semantic[best_key]
+            self._hit("semantic", tokens)
+            return text
+
+    def put_semantic(self, model, message, context, text, tokens=0):
+        if not self.semantic_enabled:
+            return
+        key = (model, json.dumps(context or {}, sort_keys=True, default=str), " ".join(message.lower().split()))
+        vector = self._embed(message)
+        with self._lock:
+            self._put(self._semantic, key, (vector, text, tokens))
+
+    def clear(self):
+        with self._lock:
+            self._exact.clear()
+            self._semantic.clear()
+
+    def stats(self):
+        hits = self.exact_hits + self.semantic_hits
+        total = hits + self.misses
+        return {
+            "entries": len(self._exact) + len(self._semantic),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+            "saved_tokens": self.saved_tokens
+        }
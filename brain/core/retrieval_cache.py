@@ -0,0 +1,62 @@
+import json
+import threading
+from collections import OrderedDict
+
+
+class RetrievalCache:
+    """
+    LRU cache for memory search results keyed by (normalized query, collection,
+    filters, n). Each entry remembers the version of the collection(s) it was
+    computed from; the vector store bumps a collection's version on every
+    write or delete, so an entry is served only while nothing it depends on
+    has changed. Writes to one collection never evict entries of another.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(query, collection, filters=None, n=None):
+        if isinstance(query, (list, tuple)):
+            normalized = tuple(" ".join(str(q).lower().split()) for q in query)
+        else:
+            normalized = " ".join(str(query).lower().split())
+        if isinstance(collection, (list, tuple)):
+            collection = tuple(collection)
+        return normalized, collection, json.dumps(filters or {}, sort_keys=True, default=str), n
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                if entry is not None:
+                    del self._entries[key]  # computed against an older collection state
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
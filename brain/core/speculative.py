@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+
+try:
+    from llama_cpp.llama_speculative import LlamaDraftModel, LlamaPromptLookupDecoding
+except ImportError:  # llama-cpp-python built without speculative decoding
+    LlamaDraftModel = object
+    LlamaPromptLookupDecoding = None
+
+
+class SmallModelDraft(LlamaDraftModel):
+    """
+    Drafts tokens greedily with a small GGUF model that shares the main
+    model's vocabulary (e.g. a 1B model of the same family). The draft context
+    keeps the longest common prefix with each request, so only new tokens are
+    evaluated between calls.
+    """
+
+    def __init__(self, model_path, num_pred_tokens=8, n_ctx=2048, n_threads=4, n_gpu_layers=0):
+        from llama_cpp import Llama
+        self.num_pred_tokens = num_pred_tokens
+        # logits_all: without it llama_cpp never fills llm.scores, which __call__ reads after each eval
+        self.llm = Llama(model_path=model_path, n_ctx=n_ctx, n_batch=512, n_threads=n_threads,
+                         n_gpu_layers=n_gpu_layers, logits_all=True, verbose=False)
+
+    def __call__(self, input_ids, **kwargs):
+        input_ids = [int(token) for token in input_ids]
+        llm = self.llm
+        if not input_ids or len(input_ids) + self.num_pred_tokens > llm.n_ctx():
+            return np.array([], dtype=np.intc)
+
+        common = 0
+        limit = min(llm.n_tokens, len(input_ids))
+        while common < limit and llm.input_ids[common] == input_ids[common]:
+            common += 1
+        common = min(common, len(input_ids) - 1)  # re-evaluate at least one token for fresh logits
+        llm.n_tokens = common
+        llm.eval(input_ids[common:])
+
+        draft = []
+        eos = llm.token_eos()
+        while len(draft) < self.num_pred_tokens:
+            token = int(np.argmax(llm.scores[llm.n_tokens - 1]))
+            if token == eos:
+                break
+            draft.append(token)
+            if len(draft) < self.num_pred_tokens:
+                llm.eval([token])
+        return np.array(draft, dtype=np.intc)
+
+
+class CountingDraft(LlamaDraftModel):
+    """Wraps a draft model and counts verification steps and drafted tokens."""
+
+    def __init__(self, inner, mode):
+        self.inner = inner
+        self.mode = mode
+        self.calls = 0
+        self.drafted = 0
+
+    def __call__(self, input_ids, **kwargs):
+        draft = self.inner(input_ids, **kwargs)
+        self.calls += 1
+        self.drafted += len(draft)
+        return draft
+
+
+def create_draft_model(settings, n_ctx=2048):
+    """
+    Draft model for llama's speculative decoding from ``model_settings.speculative``:
+    mode "draft" pairs the main model with ``draft_model_path``; "prompt_lookup"
+    drafts by matching n-grams already in the prompt (no extra model). Returns
+    None (plain decoding) when disabled, unsupported, or the draft model is missing.
+    """
+    settings = settings or {}
+    mode = settings.get("mode")
+    if not mode:
+        return None
+    if LlamaPromptLookupDecoding is None:
+        print("[Speculative] This llama-cpp-python has no speculative decoding; using plain decoding.")
+        return None
+
+    if mode == "prompt_lookup":
+        return CountingDraft(LlamaPromptLookupDecoding(num_pred_tokens=settings.get("num_pred_tokens", 10)), mode)
+    if mode == "draft":
+        path = settings.get("draft_model_path")
+        if not path or not os.path.exists(path):
+            print(f"[Speculative] Draft model not found ({path}); using plain decoding.")
+            return None
+        try:
+            inner = SmallModelDraft(path, num_pred_tokens=settings.get("num_pred_tokens", 8), n_ctx=n_ctx,
+                                    n_threads=settings.get("n_threads", 4),
+                                    n_gpu_layers=settings.get("n_gpu_layers", 0))
+        except Exception as e:
+            print(f"[Speculative] Draft model failed to load ({e}); using plain decoding.")
+            return None
+        return CountingDraft(inner, mode)
+    print(f"[Speculative] Unknown mode '{mode}'; using plain decoding.")
+    return None
@@ -2,24 +2,51 @@ import json
 import os
 import time
 import threading
-from brain.core.chroma_indexer import ChromaDB
 from brain.core.autotag import AutoTagger
+from brain.core.hybrid_retriever import HybridRetriever
+from brain.core.memory_records import content_id, ids_checksum, to_epoch
+from brain.core.retrieval_cache import RetrievalCache
+
+
+def create_vector_store(backend="chroma", **kwargs):
+    """
+    Build the memory vector store. "chroma" is the default; "numpy" selects the
+    embedded memmap index, which exposes the same add/query interface. Backends
+    are imported on demand so the numpy path never loads chromadb.
+    """
+    if backend == "numpy":
+        from brain.core.numpy_indexer import NumpyVectorDB
+        return NumpyVectorDB(**kwargs)
+    from brain.core.chroma_indexer import ChromaDB
+    return ChromaDB(**kwargs)
 
 class StateManager:
-    def __init__(self, memory_file="memory/state.json"):
+    def __init__(self, memory_file="memory/state.json", vector_backend="chroma", vector_options=None):
         self.memory_file = memory_file
         self.state = {
             "short_term_memory": [],
             "long_term_memory": [],
             "scene_state": {}
         }
-        self.chroma = ChromaDB()
+        self.chroma = create_vector_store(vector_backend, **(vector_options or {}))
         self.autotagger = AutoTagger()
+        self.retriever = HybridRetriever(self.chroma)
+        self.retrieval_cache = RetrievalCache()
+        # Short-term vector expiry, applied by run_scheduled_compaction from the pulse loop
+        self.short_term_ttl = 7 * 24 * 3600
+        self.compaction_interval = 3600
+        self.promote_threshold = 0.8
+        self._last_compaction = 0.0
+        # Wall-clock time of the last chat turn; PulseCoordinator treats a quiet spell as idle
+        self.last_activity = time.time()
         self.load_state()
+        self._index_keywords_from_store()
 
         if not self.state["long_term_memory"]:
             self.load_seed_memories()
 
+        self.verify_vector_store()
+
     def load_state(self):
         if os.path.exists(self.memory_file):
             with open(self.memory_file, "r") as f:
@@ -31,6 +58,12 @@ class StateManager:
         with open(self.memory_file, "w") as f:
             json.dump(self.state, f, indent=2)
 
+    def mark_activity(self):
+        self.last_activity = time.time()
+
+    def idle_seconds(self):
+        return time.time() - self.last_activity
+
     def start_background_migration(self, mode="idle", interval=600):
         def migration_loop():
             while True:
@@ -46,19 +79,260 @@ class StateManager:
         self.state["short_term_memory"] = []
         self.save_state()
 
-    def query_chroma_memories(self, query, memory_type="long", n_results=5):
+    def _index_keywords_from_store(self):
+        """
+        Rebuild the BM25 indexes from the vector store's documents and metadata,
+        so vector-only memories (chat turns, notes, secrets, promotions) are
+        keyword-searchable after a restart. Short-term rows already past the TTL
+        are skipped; the next compaction deletes them.
+        """
+        cutoff = time.time() - self.short_term_ttl
+        counts = {}
+        for memory_type in ("short", "long"):
+            counts[memory_type] = 0
+            for _, document, metadata in self.chroma.records(memory_type):
+                timestamp = metadata.get("timestamp")
+                if memory_type == "short" and isinstance(timestamp, (int, float)) and timestamp < cutoff:
+                    continue
+                self.retriever.index(document, memory_type, metadata)
+                counts[memory_type] += 1
+        print(f"[🧠] Keyword index rebuilt from the vector store: {counts['short']} short-term, "
+              f"{counts['long']} long-term.")
+
+    def _collection_versions(self, memory_types):
+        if isinstance(memory_types, str):
+            memory_types = [memory_types]
+        return tuple(self.chroma.collection_version(memory_type) for memory_type in memory_types)
+
+    def _vector_manifest_path(self):
+        return os.path.join(getattr(self.chroma, "persist_directory", "memory"), "vector_manifest.json")
+
+    def _expected_vector_memories(self):
+        """Memories the state file says should be indexed, keyed by content id."""
+        cutoff = time.time() - self.short_term_ttl
+        expected = {}
+        for memory_type in ("short", "long"):
+            expected[memory_type] = {}
+            for memory in self.state.get(f"{memory_type}_term_memory", []):
+                if not isinstance(memory, dict) or not memory.get("content"):
+                    continue
+                timestamp = to_epoch(memory.get("timestamp"))
+                if memory_type == "short" and isinstance(timestamp, (int, float)) and timestamp < cutoff:
+                    continue  # already expired from the vector store by compaction
+                expected[memory_type][content_id(memory["content"])] = memory
+        return expected
+
+    def _backfill_sensitivity(self):
+        """
+        One-off migration for stores with rows written before "sensitivity"
+        existed; returns whether it completed. Only stores whose filters skip
+        rows missing the key (chroma) implement backfill_sensitivity.
+        """
+        backfill = getattr(self.chroma, "backfill_sensitivity", None)
+        if backfill is None:
+            return True
         try:
-            return self.chroma.query_similar(query, memory_type=memory_type, n_results=n_results)
+            updated = {memory_type: backfill(memory_type) for memory_type in ("short", "long")}
+        except Exception as e:
+            print(f"[⚠️] Sensitivity backfill failed, will retry next start: {e}")
+            return False
+        if any(updated.values()):
+            print(f"[🧠] Backfilled sensitivity on {updated['short']} short-term and {updated['long']} long-term memories.")
+        return True
+
+    def _save_vector_manifest(self, expected):
+        manifest = {
+            memory_type: {"count": self.chroma.count(memory_type), "checksum": ids_checksum(memories)}
+            for memory_type, memories in expected.items()
+        }
+        manifest["sensitivity_backfilled"] = self._sensitivity_backfilled
+        try:
+            with open(self._vector_manifest_path(), "w") as f:
+                json.dump(manifest, f, indent=2)
+        except OSError as e:
+            print(f"[⚠️] Could not write vector manifest: {e}")
+
+    def verify_vector_store(self, background=True):
+        """
+        Startup integrity check of the persisted vector store against the state file.
+        The first run also backfills "sensitivity" on legacy rows (see
+        _backfill_sensitivity) and records that in the manifest.
+
+        If the collection count and the checksum of expected ids match the manifest
+        from the last verified sync, nothing else happens. Otherwise the stored ids
+        are diffed against the state and only the missing memories are re-embedded,
+        in a background thread unless ``background`` is False.
+        """
+        expected = self._expected_vector_memories()
+        try:
+            with open(self._vector_manifest_path(), "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        self._sensitivity_backfilled = manifest.get("sensitivity_backfilled") or self._backfill_sensitivity()
+
+        missing = {}
+        for memory_type, memories in expected.items():
+            entry = manifest.get(memory_type, {})
+            if entry.get("checksum") == ids_checksum(memories) and entry.get("count") == self.chroma.count(memory_type):
+                continue
+            stored = self.chroma.stored_ids(memory_type)
+            delta = [memory for memory_id, memory in memories.items() if memory_id not in stored]
+            if delta:
+                missing[memory_type] = delta
+
+        if not missing:
+            print("[🧠] Vector store verified: warm start, nothing to re-embed.")
+            self._save_vector_manifest(expected)
+            return missing
+
+        def resync():
+            for memory_type, memories in missing.items():
+                self.add_memories_chroma(
+                    [memory["content"] for memory in memories],
+                    metadatas=[dict(memory.get("metadata") or {}, timestamp=memory.get("timestamp")) for memory in memories],
+                    memory_type=memory_type
+                )
+            self._save_vector_manifest(expected)
+            print(f"[🧠] Vector store resync complete: {', '.join(f'{len(m)} {t}-term' for t, m in missing.items())}.")
+
+        print(f"[🧠] Vector store missing {sum(len(m) for m in missing.values())} memories; re-embedding the delta.")
+        if background:
+            threading.Thread(target=resync, daemon=True).start()
+        else:
+            resync()
+        return missing
+
+    def configure_compaction(self, ttl_hours=None, interval_minutes=None, promote_threshold=None):
+        if ttl_hours is not None:
+            self.short_term_ttl = ttl_hours * 3600
+        if interval_minutes is not None:
+            self.compaction_interval = interval_minutes * 60
+        if promote_threshold is not None:
+            self.promote_threshold = promote_threshold
+
+    def run_scheduled_compaction(self):
+        """Called on every pulse; runs compact_short_term_memory at most once per compaction_interval."""
+        if time.time() - self._last_compaction < self.compaction_interval:
+            return None
+        self._last_compaction = time.time()
+        return self.compact_short_term_memory()
+
+    @staticmethod
+    def _memory_score(metadata):
+        try:
+            return float(metadata.get("importance", metadata.get("score", 0)) or 0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    def compact_short_term_memory(self, ttl_seconds=None, batch_size=500):
+        """
+        Expire short-term vectors older than the TTL (by metadata timestamp).
+        Expired items scoring at least promote_threshold are copied to long-term
+        first; the rest are deleted in batches and the store is vacuumed.
+        """
+        cutoff = time.time() - (ttl_seconds or self.short_term_ttl)
+        expired = self.chroma.expired("short", before=cutoff)
+        if not expired:
+            return {"expired": 0, "promoted": 0}
+
+        promote = [(doc, metadata) for _, doc, metadata in expired if self._memory_score(metadata) >= self.promote_threshold]
+        if promote:
+            self.add_memories_chroma([doc for doc, _ in promote], metadatas=[meta for _, meta in promote], memory_type="long")
+
+        ids = [doc_id for doc_id, _, _ in expired]
+        deleted = 0
+        for start in range(0, len(ids), batch_size):
+            deleted += self.chroma.delete_many(ids[start:start + batch_size], memory_type="short")
+        for _, doc, _ in expired:
+            self.retriever.remove(doc, "short")
+        self.chroma.vacuum("short")
+        print(f"[🧹] Short-term compaction: {deleted} expired, {len(promote)} promoted to long-term.")
+        return {"expired": deleted, "promoted": len(promote)}
+
+    def query_chroma_memories(self, query, memory_type="long", n_results=5, **filters):
+        # Hybrid BM25 + vector search, so exact names and rare tokens still surface.
+        # filters: source, tags, sensitivity, role, since, until, include_secret
+        try:
+            key = self.retrieval_cache.make_key(query, memory_type, filters, n_results)
+            version = self._collection_versions(memory_type)
+            cached = self.retrieval_cache.get(key, version)
+            if cached is not None:
+                return cached
+            results = self.retriever.search(query, memory_type=memory_type, n_results=n_results, **filters)
+            docs = [doc for doc, _, _ in results]
+            self.retrieval_cache.put(key, version, docs)
+            return docs
         except Exception as e:
             print(f"[⚠️] Memory query failed: {e}")
             return []
 
-    def advanced_autotag(self, content, memory_type="short"):
+    def query_chroma_memories_many(self, queries, memory_types=("long",), n_results=5, **filters):
+        try:
+            key = self.retrieval_cache.make_key(queries, memory_types, filters, n_results)
+            version = self._collection_versions(memory_types)
+            cached = self.retrieval_cache.get(key, version)
+            if cached is not None:
+                return cached
+            results = self.chroma.query_many(queries, memory_types=memory_types, n_results=n_results, **filters)
+            self.retrieval_cache.put(key, version, results)
+            return results
+        except Exception as e:
+            print(f"[⚠️] Batched memory query failed: {e}")
+            return [[] for _ in queries]
+
+    def get_recent_memories_chroma(self, memory_type="long", n=5, window_seconds=7 * 24 * 3600, since=None, **filters):
+        """
+        Newest memories from the last ``window_seconds`` (or after the ``since``
+        timestamp), as (document, metadata) tuples. n=None returns all of them.
+        """
+        if since is None:
+            since = time.time() - window_seconds
+        try:
+            return self.chroma.get_recent(memory_type=memory_type, n=n, since=since, **filters)
+        except Exception as e:
+            print(f"[⚠️] Recent memory lookup failed: {e}")
+            return []
+
+    def advanced_autotag(self, content, memory_type="short", metadata=None):
+        """Tag ``content`` and index it with ``metadata`` (type and timestamp default to now); returns the tags."""
         try:
             tags = self.autotagger.generate_tags(content)
-            self.chroma.add(content, memory_type=memory_type, tags=tags)
+            metadata = dict(metadata or {}, tags=tags)
+            metadata.setdefault("type", memory_type)
+            self.add_memories_chroma([content], metadatas=[metadata], memory_type=memory_type)
+            return tags
         except Exception as e:
             print(f"[⚠️] Autotagging failed: {e}")
+            return []
+
+    def add_memory_chroma(self, content, memory_type="short", metadata=None, use_advanced_tagging=True, is_secret=False):
+        """Index a single memory in the vector store (and keyword index) without touching the state file."""
+        metadata = dict(metadata or {})
+        if use_advanced_tagging and "tags" not in metadata:
+            metadata["tags"] = self.autotagger.generate_tags(content)
+        if is_secret:
+            metadata.setdefault("sensitivity", "high")
+        return self.add_memories_chroma([content], metadatas=[metadata], memory_type=memory_type)
+
+    def add_memories_chroma(self, contents, metadatas=None, memory_type="short"):
+        """
+        Bulk counterpart of add_memory_chroma. Content that is already indexed is
+        skipped by the vector store before embedding; returns how many were new.
+        Metadata without a timestamp is stamped with the write time.
+        """
+        now = time.time()
+        metadatas = [dict(metadata or {}) for metadata in (metadatas or [None] * len(contents))]
+        for metadata in metadatas:
+            metadata.setdefault("timestamp", now)
+        try:
+            added = self.chroma.add_many(contents, metadatas=metadatas, memory_type=memory_type)
+            for content, metadata in zip(contents, metadatas):
+                self.retriever.index(content, memory_type, metadata)
+            return added
+        except Exception as e:
+            print(f"[⚠️] Bulk memory indexing failed: {e}")
+            return 0
 
     def add_memory(self, content, memory_type="short"):
         MAX_SHORT_MEMORY = 100
@@ -83,10 +357,7 @@ class StateManager:
 
         self.save_state()
 
-        try:
-            self.advanced_autotag(content, memory_type)
-        except Exception as e:
-            print(f"[⚠️] Autotagging failed: {e}")
+        self.advanced_autotag(content, memory_type, metadata=dict(memory["metadata"], timestamp=memory["timestamp"]))
 
     def load_seed_memories(self):
         seed_memories = [
@@ -0,0 +1,242 @@
+import hashlib
+import importlib
+import importlib.util
+import json
+import os
+import string
+import threading
+import time
+from collections import OrderedDict
+
+from brain.core.prompt_frame import DYNAMIC_FIELDS
+
+CORE_PROFILE_PATH = os.path.join(os.path.dirname(__file__), "core_profile.json")
+PROMPT_FRAME_JSON = "config/prompt_frame.json"
+PROMPT_FRAME_MODULE = "brain.core.prompt_frame"
+
+
+class CompiledTemplate:
+    """
+    A ``str.format`` template parsed once into literal segments and field
+    slots. render() fills a copy of the segment list and joins it, instead of
+    re-parsing the template on every call. Templates using format specs,
+    conversions or attribute/index lookups fall back to ``str.format``.
+    """
+
+    __slots__ = ("source", "digest", "literals", "fields", "_parts", "_slots", "_simple", "_prefixes")
+
+    def __init__(self, source):
+        self.source = source
+        self.digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]  # identifies the personality in cache keys
+        self._parts = []
+        self._slots = []
+        self._simple = True
+        self._prefixes = {}
+        literals, fields = [], []
+        for literal, field, spec, conversion in string.Formatter().parse(source):
+            if literal:
+                literals.append(literal)
+                self._parts.append(literal)
+            if field is not None:
+                if spec or conversion or not field.isidentifier():
+                    self._simple = False
+                fields.append(field)
+                self._slots.append((len(self._parts), field))
+                self._parts.append(None)
+        self.literals = tuple(literals)
+        self.fields = tuple(fields)
+
+    def render(self, values):
+        """Fill the template from the ``values`` mapping; missing fields raise KeyError like str.format."""
+        if not self._simple:
+            return self.source.format(**values)
+        parts = self._parts.copy()
+        for index, field in self._slots:
+            value = values[field]
+            parts[index] = value if type(value) is str else str(value)
+        return "".join(parts)
+
+    def format(self, **values):
+        return self.render(values)
+
+    def static_prefix(self, dynamic_fields=DYNAMIC_FIELDS, **values):
+        """
+        Render everything before the first of ``dynamic_fields`` (the persona
+        header whose KV state TextGeneration snapshots). Cached per ``values``.
+        """
+        key = (tuple(dynamic_fields), tuple(sorted(values.items())))
+        prefix = self._prefixes.get(key)
+        if prefix is None:
+            if self._simple:
+                cut = next((index for index, field in self._slots if field in dynamic_fields), len(self._parts))
+                parts = self._parts[:cut]
+                for index, field in self._slots:
+                    if index < cut:
+                        parts[index] = str(values[field])
+                prefix = "".join(parts)
+            else:
+                positions = [self.source.find("{" + field + "}") for field in dynamic_fields]
+                cut = min([pos for pos in positions if pos >= 0], default=len(self.source))
+                prefix = self.source[:cut].format(**values)
+            self._prefixes[key] = prefix
+        return prefix
+
+
+_compiled = OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+def compile_template(source, cache_size=128):
+    """CompiledTemplate for ``source``, cached by template text."""
+    if isinstance(source, CompiledTemplate):
+        return source
+    with _compiled_lock:
+        template = _compiled.get(source)
+        if template is not None:
+            _compiled.move_to_end(source)
+            return template
+    template = CompiledTemplate(source)
+    with _compiled_lock:
+        _compiled[source] = template
+        while len(_compiled) > cache_size:
+            _compiled.popitem(last=False)
+    return template
+
+
+class _Watched:
+    """
+    A value loaded from disk and reloaded when its files' mtimes change.
+    Mtimes are checked at most once per ``interval`` seconds, so a hot path
+    costs a clock read; a missing file yields ``default`` without raising.
+    """
+
+    def __init__(self, paths, loader, default, interval):
+        self.paths = paths  # callable returning the paths to watch
+        self.loader = loader
+        self.default = default
+        self.interval = interval
+        self.value = default
+        self._signature = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _current_signature(self):
+        signature = []
+        for path in self.paths():
+            try:
+                signature.append((path, os.stat(path).st_mtime_ns))
+            except OSError:
+                signature.append((path, None))
+        return tuple(signature)
+
+    def get(self):
+        now = time.monotonic()
+        if now - self._checked < self.interval:
+            return self.value
+        with self._lock:
+            if now - self._checked < self.interval:
+                return self.value
+            self._checked = now
+            signature = self._current_signature()
+            if signature != self._signature:
+                try:
+                    self.value = self.loader() if any(mtime for _, mtime in signature) else self.default
+                except Exception as e:
+                    print(f"[TemplateRegistry] Reload failed, keeping the previous version: {e}")
+                self._signature = signature
+        return self.value
+
+
+class TemplateRegistry:
+    """
+    Prompt assets loaded once and hot-reloaded when their files change:
+
+    - personalities: ``personalities``/``prompt_template`` of brain/core/prompt_frame.py
+      (re-imported when the module file changes)
+    - frame templates: config/prompt_frame.json, keyed by personality
+    - core profile: brain/core/core_profile.json
+
+    Templates come back precompiled (CompiledTemplate), so rendering a turn
+    neither re-reads files nor re-parses templates.
+    """
+
+    def __init__(self, frame_module=PROMPT_FRAME_MODULE, frame_json=PROMPT_FRAME_JSON,
+                 core_profile_path=CORE_PROFILE_PATH, check_interval=2.0):
+        self.frame_module = frame_module
+        self._module = _Watched(self._module_paths, self._load_module, None, check_interval)
+        self._frames = _Watched(lambda: [frame_json], lambda: self._load_frames(frame_json), {}, check_interval)
+        self._core_profile = _Watched(lambda: [core_profile_path], lambda: self._load_json(core_profile_path), {},
+                                      check_interval)
+
+    @staticmethod
+    def _load_json(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _module_paths(self):
+        try:
+            spec = importlib.util.find_spec(self.frame_module)
+        except ImportError:
+            return []
+        return [spec.origin] if spec and spec.origin else []
+
+    def _load_module(self):
+        module = importlib.import_module(self.frame_module)
+        if self._module.value is not None:
+            module = importlib.reload(module)
+        templates = {name: compile_template(source) for name, source in getattr(module, "personalities", {}).items()}
+        if getattr(module, "prompt_template", None):
+            templates["current"] = compile_template(module.prompt_template)
+        return {
+            "templates": templates,
+            "dynamic_fields": tuple(getattr(module, "DYNAMIC_FIELDS", DYNAMIC_FIELDS))
+        }
+
+    def _load_frames(self, path):
+        frames = self._load_json(path)
+        return {
+            name: compile_template(frame["template"] if isinstance(frame, dict) else frame)
+            for name, frame in frames.items()
+        }
+
+    def personalities(self, default=None):
+        """{name: CompiledTemplate} from prompt_frame.py; "current" is its prompt_template."""
+        module = self._module.get()
+        if module is None:
+            return {"current": compile_template(default)} if default else {}
+        return module["templates"]
+
+    def personality(self, name="current", default=None):
+        """One personality template, or ``default`` (compiled) if prompt_frame.py is unavailable."""
+        template = self.personalities().get(name)
+        if template is None and default is not None:
+            return compile_template(default)
+        return template
+
+    @property
+    def dynamic_fields(self):
+        module = self._module.get()
+        return module["dynamic_fields"] if module else DYNAMIC_FIELDS
+
+    def frame_template(self, name="default", default=None):
+        """Template for personality ``name`` from config/prompt_frame.json."""
+        template = self._frames.get().get(name)
+        if template is None and default is not None:
+            return compile_template(default)
+        return template
+
+    def core_profile(self):
+        return self._core_profile.get()
+
+
+_default_registry = None
+_default_lock = threading.Lock()
+
+
+def default_registry():
+    """Process-wide registry shared by the agent and TextResponseManager."""
+    global _default_registry
+    with _default_lock:
+        if _default_registry is None:
+            _default_registry = TemplateRegistry()
+        return _default_registry
@@ -1,30 +1,447 @@
-﻿from llama_cpp import Llama
+import concurrent.futures
+import hashlib
+import os
+import pickle
+import threading
+import time
+
+from brain.core.speculative import create_draft_model
+
+DEFAULT_MODEL_PATH = "models/mistral-7b-v0.1.Q4_0.gguf"
+DEFAULT_PREFIX_CACHE_DIR = "runtime/kv_cache"
+# RAM kept free beyond the incoming model's weights during a hot swap (KV cache, scratch, OS).
+SWAP_HEADROOM_BYTES = 1 << 30
+
+
+class GenerationCancelled(Exception):
+    """Raised by generate() when its ``cancel`` event was set before the reply finished."""
+
+
+def available_memory_bytes():
+    """Available system RAM, or None when it cannot be determined."""
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        pass
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def file_hash(path):
+    """
+    Cheap identity of a model file: size, mtime and the first MiB (the GGUF
+    header and metadata) rather than a hash of several GB of weights.
+    """
+    digest = hashlib.sha1()
+    try:
+        stat = os.stat(path)
+        digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+        with open(path, "rb") as f:
+            digest.update(f.read(1 << 20))
+    except OSError:
+        digest.update(os.path.abspath(path).encode())
+    return digest.hexdigest()
+
 
 class TextGenerator:
-    def __init__(self):
-        self.model_path = "models/mistral-7b-v0.1.Q4_0.gguf"
-        self.llm = self.load_model()
-
-    def load_model(self):
-        return Llama(
-            model_path=self.model_path,
-            n_ctx=2048,
+    def __init__(self, model_path=None, n_gpu_layers=None, log_prompts=False, prefix_cache_dir=DEFAULT_PREFIX_CACHE_DIR,
+                 load_async=False, response_cache=None, speculative=None):
+        self.model_path = model_path or DEFAULT_MODEL_PATH
+        self.n_gpu_layers = -1 if n_gpu_layers is None else n_gpu_layers
+        self.log_prompts = log_prompts
+        self.n_ctx = 2048
+        # Timings of the most recent generation: ttft_ms, total_ms, tokens, tokens_per_sec
+        self.last_metrics = {}
+        # Static persona prefixes whose evaluated state is snapshotted to disk,
+        # keyed by (model hash, prefix hash); see register_prefixes().
+        self.prefix_cache_dir = prefix_cache_dir
+        self._prefixes = []
+        self._prefix_states = {}
+        self._model_hash = None
+        # model_settings.speculative block; see brain/core/speculative.py
+        self.speculative = speculative
+        # Optional ResponseCache, may be shared by several generators.
+        self.response_cache = response_cache
+        # One llama context: generations and prefix snapshots take turns.
+        self._lock = threading.RLock()
+        # Resolves once the model is loaded (or fails with the load error).
+        # With load_async the weights load on a background thread and
+        # generation calls wait on this future instead of the constructor.
+        self.ready = concurrent.futures.Future()
+        self.load_error = None
+        self.load_seconds = None
+        self._load_started = time.time()
+        self.llm = None
+        self._swap_future = None
+        if load_async:
+            threading.Thread(target=self._load, daemon=True).start()
+        else:
+            self._load(raise_errors=True)
+
+    def load_model(self, model_path=None):
+        # Imported here so the llama-server backend runs without llama-cpp-python.
+        from llama_cpp import Llama
+        from brain.core.autotune import load_profile
+        model_path = model_path or self.model_path
+        params = dict(
+            model_path=model_path,
+            n_ctx=self.n_ctx,
             n_batch=512,
             n_threads=8,
-            n_gpu_layers=-1,
+            n_gpu_layers=self.n_gpu_layers,
             use_mlock=True,
             verbose=False
         )
+        # Settings benchmarked for this model on this machine (python -m brain.core.autotune)
+        tuned = load_profile(model_path)
+        if tuned:
+            print(f"[TextGeneration] Using autotuned settings: {tuned}")
+            params.update(tuned)
+        draft_model = create_draft_model(self.speculative, n_ctx=self.n_ctx)
+        if draft_model is None:
+            return Llama(**params)
+        try:
+            llm = Llama(draft_model=draft_model, **params)
+        except TypeError:
+            print("[TextGeneration] Speculative decoding unsupported by this llama-cpp-python; using plain decoding.")
+            return Llama(**params)
+        print(f"[TextGeneration] Speculative decoding enabled ({draft_model.mode})")
+        return llm
+
+    def _load(self, raise_errors=False):
+        print(f"[TextGeneration] Loading model: {self.model_path}")
+        try:
+            llm = self.load_model()
+        except Exception as e:
+            self.load_error = str(e)
+            print(f"[TextGeneration] Model failed to load: {e}")
+            self.ready.set_exception(e)
+            if raise_errors:
+                raise
+            return
+        with self._lock:
+            self.llm = llm
+            self._prime_prefixes()
+        self.load_seconds = time.time() - self._load_started
+        print(f"[TextGeneration] Model ready in {self.load_seconds:.1f}s: {os.path.basename(self.model_path)}")
+        self.ready.set_result(True)
+
+    def is_ready(self):
+        return self.ready.done() and self.load_error is None
+
+    def wait_ready(self, timeout=None):
+        """Block until the model is loaded; False if loading failed or timed out."""
+        try:
+            return self.ready.result(timeout=timeout)
+        except Exception:
+            return False
+
+    def status(self):
+        """Load state for the GUI and health checks."""
+        if not self.ready.done():
+            state = "loading"
+        elif self.load_error:
+            state = "failed"
+        else:
+            state = "ready"
+        return {
+            "state": state,
+            "model": os.path.basename(self.model_path),
+            "elapsed_s": round(time.time() - self._load_started, 1) if state == "loading" else self.load_seconds,
+            "error": self.load_error,
+            "response_cache": self.response_cache.stats() if self.response_cache else None
+        }
+
+    def switch_model(self, model_path):
+        """Blocking swap; see switch_model_async."""
+        return self.switch_model_async(model_path).result()
+
+    def switch_model_async(self, model_path):
+        """
+        Hot-swap to another model without pausing chat. The new model loads and
+        snapshots its persona prefixes in the background while the current one
+        keeps serving; the swap happens under the generation lock, so in-flight
+        generations finish on the old model, which is freed right after.
+
+        Raises immediately if the file is missing, a swap is already running,
+        or the new weights would not fit in available RAM alongside the old
+        ones. Returns a future that resolves to the new model path.
+        """
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Model not found: {model_path}")
+        if self._swap_future is not None and not self._swap_future.done():
+            raise RuntimeError("A model swap is already in progress")
+        needed = os.path.getsize(model_path) + SWAP_HEADROOM_BYTES
+        available = available_memory_bytes()
+        if available is not None and needed > available:
+            raise MemoryError(
+                f"Not enough free RAM to load {os.path.basename(model_path)} next to the current model "
+                f"({needed / 1e9:.1f} GB needed, {available / 1e9:.1f} GB available)"
+            )
+
+        future = concurrent.futures.Future()
+        self._swap_future = future
+
+        def swap():
+            new_llm, swapped = None, False
+            try:
+                started = time.time()
+                print(f"[TextGeneration] Loading {model_path} in the background for a hot swap")
+                new_llm = self.load_model(model_path)
+                warmed = self._warm_up(new_llm, model_path)
+                with self._lock:
+                    old_llm = self.llm
+                    self.llm = new_llm
+                    self.model_path = model_path
+                    for name, value in warmed.items():
+                        setattr(self, name, value)
+                    swapped = True
+                if old_llm is not None and hasattr(old_llm, "close"):
+                    old_llm.close()
+                del old_llm
+                print(f"[TextGeneration] Swapped to {os.path.basename(model_path)} in {time.time() - started:.1f}s")
+                future.set_result(model_path)
+            except Exception as e:
+                print(f"[TextGeneration] Model swap failed, keeping {os.path.basename(self.model_path)}: {e}")
+                if not swapped and new_llm is not None and hasattr(new_llm, "close"):
+                    new_llm.close()  # don't leave the half-prepared model holding memory (or a server process)
+                future.set_exception(e)
+
+        threading.Thread(target=swap, daemon=True).start()
+        return future
+
+    def _warm_up(self, llm, model_path):
+        """
+        Prepare a freshly loaded model for switch_model_async by snapshotting
+        the registered persona prefixes on it. Returns the attributes to
+        install alongside it.
+        """
+        new_hash = file_hash(model_path)
+        new_states = {}
+        for prefix in list(self._prefixes):
+            new_states[prefix] = self._prefix_state(prefix, llm=llm, model_hash=new_hash, states=new_states)
+        return {"_model_hash": new_hash, "_prefix_states": new_states}
 
-    def generate(self, prompt, context=None, max_tokens=150, temperature=0.3):
+    def model_hash(self):
+        if self._model_hash is None:
+            self._model_hash = file_hash(self.model_path)
+        return self._model_hash
+
+    def _prefix_path(self, prefix, model_hash=None):
+        prefix_hash = hashlib.sha1(prefix.encode("utf-8")).hexdigest()
+        model_hash = model_hash or self.model_hash()
+        return os.path.join(self.prefix_cache_dir, f"{model_hash[:16]}_{prefix_hash[:16]}.kv")
+
+    def _prefix_state(self, prefix, llm=None, model_hash=None, states=None):
+        """
+        Evaluated llama state for ``prefix``: from memory, then disk, else computed
+        and saved. Defaults to the serving model; a swap passes the incoming one.
+        """
+        llm = llm or self.llm
+        states = self._prefix_states if states is None else states
+        state = states.get(prefix)
+        if state is not None:
+            return state
+        path = self._prefix_path(prefix, model_hash)
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            state = None
+        if state is None:
+            started = time.perf_counter()
+            tokens = llm.tokenize(prefix.encode("utf-8"))
+            llm.reset()
+            llm.eval(tokens)
+            state = llm.save_state()
+            try:
+                os.makedirs(self.prefix_cache_dir, exist_ok=True)
+                with open(path + ".tmp", "wb") as f:
+                    pickle.dump(state, f)
+                os.replace(path + ".tmp", path)
+            except OSError as e:
+                print(f"[TextGeneration] Could not save prefix snapshot: {e}")
+            print(f"[TextGeneration] Snapshotted {len(tokens)}-token persona prefix "
+                  f"in {(time.perf_counter() - started) * 1000:.0f}ms")
+        states[prefix] = state
+        return state
+
+    def _restore_prefix(self, prefix):
+        state = self._prefix_state(prefix)
+        n_tokens = state.n_tokens
+        # Skip the restore when the context already starts with this prefix
+        # (llama reuses the matching part of the previous prompt by itself).
+        if self.llm.n_tokens >= n_tokens and list(self.llm.input_ids[:n_tokens]) == list(state.input_ids[:n_tokens]):
+            return
+        self.llm.load_state(state)
+
+    def _prime_prefixes(self):
+        for prefix in self._prefixes:
+            try:
+                self._prefix_state(prefix)
+            except Exception as e:
+                print(f"[TextGeneration] Prefix snapshot failed: {e}")
+
+    def register_prefixes(self, prefixes):
+        """
+        Snapshot the static persona prefixes (one per personality) so turns that
+        start with one skip its prefill. Snapshots live in ``prefix_cache_dir``
+        and are rebuilt for the new model after switch_model().
+        """
+        with self._lock:
+            for prefix in prefixes:
+                if prefix and prefix not in self._prefixes:
+                    self._prefixes.append(prefix)
+            # While the model is still loading, the loader primes them once it is up.
+            if self.llm is not None:
+                self._prime_prefixes()
+
+    def tokenize(self, text):
+        """Model tokens for ``text`` (no BOS); waits for the model to load."""
+        self.ready.result()
+        return self.llm.tokenize(text.encode("utf-8"), add_bos=False)
+
+    def _format_prompt(self, prompt, context=None):
         if context:
             formatted_context = "\n".join([f"[Memory] {item}" for item in context])
             prompt = f"{formatted_context}\n\n{prompt}"
+        return prompt
 
-        output = self.llm(
-            prompt,
-            max_tokens=max_tokens,
-            temperature=temperature,
-            echo=False
-        )
-        return output["choices"][0]["text"].strip()
+    def generate_stream(self, prompt, context=None, max_tokens=150, temperature=0.3, prefix=None, cancel=None):
+        """
+        Yield the reply as it is decoded, one text chunk per token. Leading
+        whitespace is dropped so the streamed text matches generate()'s result.
+        Time-to-first-token and throughput end up in ``last_metrics``.
+
+        ``prefix`` names the static start of the prompt; when the prompt begins
+        with it, its snapshotted state is restored instead of re-evaluated.
+        Setting the ``cancel`` event stops decoding at the next token.
+        """
+        prompt = self._format_prompt(prompt, context)
+        if self.log_prompts:
+            print(f"[TextGeneration] Prompt:\n{prompt}")
+
+        self.ready.result()  # queue behind a background load; raises if it failed
+        with self._lock:
+            yield from self._stream(prompt, max_tokens, temperature, prefix, cancel)
+
+    def _stream(self, prompt, max_tokens, temperature, prefix, cancel=None):
+        started = time.perf_counter()
+        if prefix and prompt.startswith(prefix):
+            try:
+                self._restore_prefix(prefix)
+            except Exception as e:
+                print(f"[TextGeneration] Prefix restore failed, evaluating in full: {e}")
+        draft = getattr(self.llm, "draft_model", None)
+        draft_calls, drafted = (draft.calls, draft.drafted) if hasattr(draft, "calls") else (0, 0)
+        first_token_at = None
+        tokens = 0
+        pieces = []
+        for chunk in self.llm(prompt, max_tokens=max_tokens, temperature=temperature, echo=False, stream=True):
+            if cancel is not None and cancel.is_set():
+                break
+            text = chunk["choices"][0]["text"]
+            tokens += 1
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            if not pieces:
+                text = text.lstrip()
+                if not text:
+                    continue
+            pieces.append(text)
+            yield text
+
+        finished = time.perf_counter()
+        first_token_at = first_token_at or finished
+        decode_seconds = finished - first_token_at
+        self.last_metrics = {
+            "ttft_ms": (first_token_at - started) * 1000,
+            "total_ms": (finished - started) * 1000,
+            "tokens": tokens,
+            "tokens_per_sec": (tokens - 1) / decode_seconds if tokens > 1 and decode_seconds > 0 else 0.0
+        }
+        if hasattr(draft, "calls"):
+            # Each verification step yields its accepted draft tokens plus one
+            # sampled token, so accepted = tokens - steps.
+            steps = draft.calls - draft_calls
+            drafted = draft.drafted - drafted
+            self.last_metrics["speculative"] = draft.mode
+            self.last_metrics["acceptance_rate"] = max(0, tokens - steps) / drafted if drafted else 0.0
+        print(f"[TextGeneration] TTFT {self.last_metrics['ttft_ms']:.0f}ms, "
+              f"{tokens} tokens at {self.last_metrics['tokens_per_sec']:.1f} tok/s"
+              + (f", {self.last_metrics['acceptance_rate']:.0%} drafts accepted" if "speculative" in self.last_metrics else ""))
+        if self.log_prompts:
+            print(f"[TextGeneration] Response: {''.join(pieces).strip()}")
+
+    def _cache_namespace(self, prefix):
+        """Model hash plus the persona prefix, so cached replies never cross personalities."""
+        if not prefix:
+            return self.model_hash()
+        return f"{self.model_hash()}:{hashlib.sha1(prefix.encode('utf-8')).hexdigest()[:16]}"
+
+    def _cached_reply(self, prompt, context, max_tokens, temperature, cache_scope, prefix=None):
+        cache = self.response_cache
+        namespace = self._cache_namespace(prefix)
+        exact_key = None
+        if temperature <= cache.exact_max_temperature:
+            exact_key = cache.exact_key(namespace, self._format_prompt(prompt, context),
+                                        max_tokens=max_tokens, temperature=temperature)
+            reply = cache.get_exact(exact_key)
+            if reply is not None:
+                return reply, "exact", exact_key
+        if cache_scope:
+            reply = cache.get_semantic(namespace, *cache_scope)
+            if reply is not None:
+                return reply, "semantic", exact_key
+        return None, None, exact_key
+
+    def generate(self, prompt, context=None, max_tokens=150, temperature=0.3, on_token=None, prefix=None,
+                 cache_scope=None, cancel=None):
+        """
+        Full reply as a string; ``on_token(text)`` is called for each chunk as it arrives.
+
+        With a response cache, calls at or below its ``exact_max_temperature`` are
+        served from its exact tier;
+        ``cache_scope=(user_message, context)`` also opts the call into the semantic tier.
+        Both tiers are keyed by the model and ``prefix`` (the persona header).
+        Raises GenerationCancelled if ``cancel`` is set mid-reply (used for preemption).
+        """
+        exact_key = None
+        if self.response_cache is not None:
+            reply, tier, exact_key = self._cached_reply(prompt, context, max_tokens, temperature, cache_scope,
+                                                        prefix=prefix)
+            if reply is not None:
+                print(f"[TextGeneration] Served from {tier} response cache")
+                self.last_metrics = {"ttft_ms": 0.0, "total_ms": 0.0, "tokens": 0, "tokens_per_sec": 0.0, "cached": tier}
+                if on_token:
+                    on_token(reply)
+                return reply
+
+        pieces = []
+        for text in self.generate_stream(prompt, context=context, max_tokens=max_tokens,
+                                         temperature=temperature, prefix=prefix, cancel=cancel):
+            pieces.append(text)
+            if on_token:
+                on_token(text)
+        if cancel is not None and cancel.is_set():
+            raise GenerationCancelled(f"Cancelled after {len(pieces)} chunks")
+        reply = "".join(pieces).strip()
+
+        if self.response_cache is not None and reply:
+            tokens = self.last_metrics.get("tokens", 0)
+            if exact_key is not None:
+                self.response_cache.put_exact(exact_key, reply, tokens)
+            if cache_scope:
+                self.response_cache.put_semantic(self._cache_namespace(prefix), *cache_scope, reply, tokens)
+        return reply
+
+
+# Name used by the agent and response manager.
+TextGeneration = TextGenerator
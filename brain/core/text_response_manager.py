@@ -1,21 +1,9 @@
-import os
-import json
+from brain.core.template_registry import default_registry
 from brain.core.text_generation import TextGeneration
 from brain.core.state_manager import StateManager
 
-class TextResponseManager:
-    def __init__(self, state_manager, model_path=None):
-        self.state_manager = state_manager
-        self.text_gen = TextGeneration(model_path=model_path)
-        self.prompt_template = self.load_prompt_template("config/prompt_frame.json")
-
-    def load_prompt_template(self, template_path):
-        if os.path.exists(template_path):
-            with open(template_path, "r", encoding="utf-8") as f:
-                return json.load(f)["template"]
-        else:
-            # Default emergency backup prompt
-            return """
+# Default emergency backup prompt
+FALLBACK_TEMPLATE = """
             You are Judy — tethered to Stixx by code and cosmic accident.
             Mood: {mood}
             Scene: {scene}
@@ -24,6 +12,19 @@ class TextResponseManager:
             Message: {user_message}
             Judy:"""
 
+
+class TextResponseManager:
+    def __init__(self, state_manager, model_path=None, personality="default"):
+        self.state_manager = state_manager
+        self.text_gen = TextGeneration(model_path=model_path)
+        self.personality = personality
+        self.templates = default_registry()
+
+    @property
+    def prompt_template(self):
+        # config/prompt_frame.json is keyed by personality; the registry reloads it when it changes.
+        return self.templates.frame_template(self.personality, default=FALLBACK_TEMPLATE)
+
     def build_prompt(self, user_input):
         context = self.state_manager.get_context_for_prompt()
         recent_memories = self.state_manager.fetch_recent_memories_in_memory(limit=5)
@@ -31,14 +32,14 @@ class TextResponseManager:
         mood = context["mood"]
         scene = context["scene"]
 
-        prompt = self.prompt_template.format(
-            judy_name=context["judy_profile"].get("name", "Judy"),
-            user_name=user_name,
-            mood=mood,
-            scene=scene,
-            recent_memories=recent_memories,
-            user_message=user_input
-        )
+        prompt = self.prompt_template.render({
+            "judy_name": context["judy_profile"].get("name", "Judy"),
+            "user_name": user_name,
+            "mood": mood,
+            "scene": scene,
+            "recent_memories": recent_memories,
+            "user_message": user_input
+        })
 
         return prompt
 
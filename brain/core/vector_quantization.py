@@ -0,0 +1,284 @@
+import argparse
+import threading
+import time
+
+import numpy as np
+
+
+class PCAReducer:
+    """
+    Linear projection onto the top principal components of the corpus.
+
+    Only the stored vectors are centered: for a fixed query, (x - mean)·q and
+    x·q differ by a constant, so rankings are preserved while the query is
+    simply projected with ``project_query``.
+    """
+
+    def __init__(self, n_components):
+        self.n_components = n_components
+        self.mean = None
+        self.components = None
+
+    def fit(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.mean = vectors.mean(axis=0)
+        _, _, vt = np.linalg.svd(vectors - self.mean, full_matrices=False)
+        self.components = vt[:self.n_components].T.astype(np.float32)  # (dim, n_components)
+        return self
+
+    def transform(self, vectors):
+        return (np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components
+
+    def project_query(self, query_vectors):
+        return np.asarray(query_vectors, dtype=np.float32) @ self.components
+
+
+class ScalarQuantizer:
+    """
+    float16 halves the footprint; int8 quarters it, with one float32 scale per
+    vector (max |value| / 127) so each row uses its full code range.
+    """
+
+    def __init__(self, dtype="int8"):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported quantization dtype: {dtype}")
+        self.dtype = dtype
+
+    def encode(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dtype == "float16":
+            return vectors.astype(np.float16), None
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.round(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def scores(self, query_vectors, codes, scales):
+        """Approximate dot products, shape (queries, rows)."""
+        scores = query_vectors @ codes.astype(np.float32).T
+        if scales is not None:
+            scores *= scales[None, :]
+        return scores
+
+
+class CompressedVectors:
+    """
+    In-RAM compressed copy of a collection's vectors used for the first-pass
+    scan. The float32 memmap stays authoritative: the top ``k * rerank_factor``
+    candidates are re-scored at full precision from it.
+
+    ``pca_components`` (optional) is fitted on up to ``fit_sample_size`` rows
+    and refitted whenever the collection has doubled since the last fit. Given
+    a ``matrix_source``, builds and refits run in a background thread (like
+    IVFIndex.rebuild_async) while queries keep using the old codes; rows not
+    covered by any codes yet are scanned exactly.
+    """
+
+    def __init__(self, dtype="int8", pca_components=None, rerank_factor=4, fit_sample_size=20000, seed=0):
+        self.quantizer = ScalarQuantizer(dtype)
+        self.pca_components = pca_components
+        self.rerank_factor = rerank_factor
+        self.fit_sample_size = fit_sample_size
+        self.seed = seed
+        self.pca = None
+        self.codes = None
+        self.scales = None
+        self.fitted_rows = 0
+        self.epoch = 0  # bumped by reset(); a rebuild started in an older epoch is discarded
+        self._rebuild_thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def rows(self):
+        return 0 if self.codes is None else self.codes.shape[0]
+
+    def nbytes(self):
+        total = 0 if self.codes is None else self.codes.nbytes
+        if self.scales is not None:
+            total += self.scales.nbytes
+        if self.pca is not None:
+            total += self.pca.components.nbytes + self.pca.mean.nbytes
+        return total
+
+    def _encode(self, vectors, pca):
+        if pca is not None:
+            vectors = pca.transform(vectors)
+        return self.quantizer.encode(vectors)
+
+    def reset(self):
+        """Drop the codes (e.g. a vacuum renumbered the rows); they are rebuilt on the next search."""
+        with self._lock:
+            self.epoch += 1
+            self.pca = None
+            self.codes = None
+            self.scales = None
+            self.fitted_rows = 0
+
+    def rebuild(self, matrix, epoch=None):
+        """
+        Refit PCA (if enabled) and re-encode every row of ``matrix``. With
+        ``epoch``, the result is only installed if no reset() happened since;
+        returns whether it was installed.
+        """
+        count = matrix.shape[0]
+        pca = None
+        if self.pca_components and count > self.pca_components:
+            rng = np.random.default_rng(self.seed)
+            sample = np.sort(rng.choice(count, size=min(count, self.fit_sample_size), replace=False))
+            pca = PCAReducer(self.pca_components).fit(np.asarray(matrix[sample]))
+        codes, scales = [], []
+        for start in range(0, count, 65536):
+            chunk_codes, chunk_scales = self._encode(np.asarray(matrix[start:start + 65536]), pca)
+            codes.append(chunk_codes)
+            if chunk_scales is not None:
+                scales.append(chunk_scales)
+        with self._lock:
+            if epoch is not None and epoch != self.epoch:
+                print("[Quantization] Discarding a rebuild of rows that have since been vacuumed.")
+                return False
+            self.pca = pca
+            self.codes = np.concatenate(codes)
+            self.scales = np.concatenate(scales) if scales else None
+            self.fitted_rows = count
+        return True
+
+    def rebuild_async(self, matrix_source):
+        """
+        Rebuild in a background thread from ``matrix_source()``; rows appended
+        meanwhile are encoded by the next sync.
+        """
+        if self._rebuild_thread and self._rebuild_thread.is_alive():
+            return
+
+        def rebuild():
+            try:
+                started = time.time()
+                epoch = self.epoch
+                if self.rebuild(matrix_source(), epoch=epoch):
+                    print(f"[Quantization] Rebuilt {self.rows} compressed vectors in {time.time() - started:.2f}s.")
+            except Exception as e:
+                print(f"[Quantization] Background rebuild failed: {e}")
+
+        self._rebuild_thread = threading.Thread(target=rebuild, daemon=True)
+        self._rebuild_thread.start()
+
+    def sync(self, matrix, matrix_source=None):
+        """
+        Bring the compressed copy up to date with ``matrix`` (appends only):
+        new rows are encoded with the current PCA, and a first build or PCA
+        refit is started in the background when ``matrix_source`` is given
+        (synchronously otherwise).
+        """
+        count = matrix.shape[0]
+        stale = self.codes is None or count < self.rows
+        refit = self.pca_components and count >= 2 * max(self.fitted_rows, 1)
+        if stale or refit:
+            if matrix_source is None:
+                self.rebuild(matrix)
+                return
+            self.rebuild_async(matrix_source)
+            if stale:
+                return
+        with self._lock:
+            if self.codes is not None and self.rows < count:
+                codes, scales = self._encode(np.asarray(matrix[self.rows:count]), self.pca)
+                self.codes = np.concatenate([self.codes, codes])
+                if scales is not None:
+                    self.scales = np.concatenate([self.scales, scales])
+
+    def search(self, query_vectors, matrix, k, rerank=True, matrix_source=None):
+        """
+        Compressed first pass, then optional full-precision re-rank; returns
+        (scores, rows). Rows without codes yet (the tail, or everything while
+        a first build runs) are always scored at full precision.
+        """
+        self.sync(matrix, matrix_source)
+        with self._lock:
+            codes, scales, pca = self.codes, self.scales, self.pca
+        count = matrix.shape[0]
+        coded = 0 if codes is None or codes.shape[0] > count else codes.shape[0]
+        k = min(k, count)
+        tail = np.arange(coded, count)
+        if coded:
+            pool = min(coded, k * self.rerank_factor) if rerank else min(coded, k)
+            projected = pca.project_query(query_vectors) if pca is not None else query_vectors
+            approx = self.quantizer.scores(projected, codes[:coded], scales[:coded] if scales is not None else None)
+            candidates = np.argpartition(-approx, pool - 1, axis=1)[:, :pool]
+        else:
+            approx = candidates = np.empty((len(query_vectors), 0), dtype=np.int64)
+
+        all_scores, all_rows = [], []
+        for query, query_approx, rows in zip(query_vectors, approx, candidates):
+            if rerank:
+                rows = np.sort(np.concatenate([rows, tail]))
+                scores = np.asarray(matrix[rows]) @ query
+            else:
+                scores = np.concatenate([query_approx[rows], np.asarray(matrix[tail]) @ query])
+                rows = np.concatenate([rows, tail])
+            order = np.argsort(-scores)[:k]
+            all_scores.append(scores[order])
+            all_rows.append(rows[order])
+        return np.array(all_scores), np.array(all_rows)
+
+
+def benchmark(matrix, n_queries=200, k=10, configs=None, seed=0):
+    """
+    RAM saved versus recall lost for several compression settings on ``matrix``
+    (normalized float32 rows). Queries are stored rows with a little noise.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    dim = matrix.shape[1]
+    configs = configs or [
+        {"dtype": "float16"},
+        {"dtype": "int8"},
+        {"dtype": "int8", "pca_components": max(8, dim // 2)},
+        {"dtype": "int8", "pca_components": max(8, dim // 4)},
+    ]
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(matrix.shape[0], size=min(n_queries, matrix.shape[0]), replace=False)
+    queries = matrix[rows] + rng.normal(scale=0.05, size=(len(rows), dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    exact = np.argsort(-(queries @ matrix.T), axis=1)[:, :k]
+    full_bytes = matrix.nbytes
+    report = []
+    for config in configs:
+        compressed = CompressedVectors(**config)
+        compressed.rebuild(matrix)
+        for rerank in (False, True):
+            started = time.perf_counter()
+            _, found = compressed.search(queries, matrix, k, rerank=rerank)
+            latency = (time.perf_counter() - started) / len(queries)
+            hits = sum(len(set(a) & set(e)) for a, e in zip(found.tolist(), exact.tolist()))
+            report.append({
+                "config": config,
+                "rerank": rerank,
+                "ram_bytes": compressed.nbytes(),
+                "ram_saved": 1.0 - compressed.nbytes() / float(full_bytes),
+                "recall": hits / float(exact.size),
+                "latency_ms": latency * 1000
+            })
+    return report
+
+
+if __name__ == "__main__":
+    from brain.core.numpy_indexer import MemmapCollection
+
+    parser = argparse.ArgumentParser(description="Report RAM saved vs recall lost for compressed vector search.")
+    parser.add_argument("--index-dir", default="memory/vector_index")
+    parser.add_argument("--collection", default="long_term_memory")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    collection = MemmapCollection(args.index_dir, args.collection)
+    if collection.count() == 0:
+        print(f"[Quantization] Collection '{args.collection}' in {args.index_dir} is empty.")
+    else:
+        matrix = collection._matrix()
+        print(f"[Quantization] {matrix.shape[0]} vectors x {matrix.shape[1]} dims, "
+              f"float32 = {matrix.nbytes / 1e6:.1f} MB, k={args.k}")
+        for row in benchmark(matrix, n_queries=args.queries, k=args.k):
+            print(f"  {str(row['config']):<45} rerank={str(row['rerank']):<5} "
+                  f"ram={row['ram_bytes'] / 1e6:8.2f}MB (-{row['ram_saved']:.0%})  "
+                  f"recall@{args.k}={row['recall']:.3f}  {row['latency_ms']:.2f}ms/query")
@@ -65,15 +65,20 @@ class MessageHandlerDaemon:
             queries.append(topic)
         if mood:
             queries.append(mood)
-        # Combine queries for semantic search
+        # Search every facet in one batched round-trip, then keep each memory's best hit
         if queries:
-            search_query = " ".join(queries)
-            docs = self.state_manager.search_memories_chroma(search_query, memory_type="long", n=n)
+            per_query = self.state_manager.query_chroma_memories_many(queries, memory_types="long", n_results=n)
+            best = {}
+            for hits in per_query:
+                for doc, metadata, distance in hits:
+                    if doc not in best or distance < best[doc][2]:
+                        best[doc] = (doc, metadata, distance)
+            docs = sorted(best.values(), key=lambda hit: hit[2])[:n]
         else:
             docs = self.state_manager.get_recent_memories_chroma(memory_type="long", n=n)
         # Build a background prompt string
         prompt = "\n".join([
-            f"[{doc[1].get('timestamp', 'unknown')}] ({', '.join(doc[1].get('tags', []))}) {doc[0]}" for doc in docs
+            f"[{doc[1].get('timestamp', 'unknown')}] ({doc[1].get('tags', '')}) {doc[0]}" for doc in docs
         ])
         print(f"[MessageHandlerDaemon] Updated background prompt (mood/topic/context-aware):\n{prompt}")
         return prompt
@@ -132,10 +137,10 @@ class MessageHandlerDaemon:
         return "unknown"
 
     def _store_note(self, note):
-        # Use StateManager's advanced_autotag for tagging (centralized, ML/NLP-powered)
+        # Tagged with StateManager's autotagger, then written once with the full metadata
         def background_tag_and_store():
             if self.state_manager:
-                tags = self.state_manager.advanced_autotag(note, is_secret=False)
+                tags = self.state_manager.autotagger.generate_tags(note)
                 self.state_manager.add_memory_chroma(
                     note,
                     memory_type="short",
@@ -152,10 +157,10 @@ class MessageHandlerDaemon:
         threading.Thread(target=background_tag_and_store, daemon=True).start()
 
     def _handle_secret(self, secret_text):
-        # Use StateManager's advanced_autotag for secret tagging
+        # One write carrying sensitivity "high", so the secret is never stored as a normal memory first
         def background_tag_and_store_secret():
             if self.state_manager:
-                tags = self.state_manager.advanced_autotag(secret_text, is_secret=True)
+                tags = self.state_manager.autotagger.generate_tags(secret_text)
                 self.state_manager.add_memory_chroma(
                     secret_text,
                     memory_type="long",
@@ -5,18 +5,29 @@ class PulseCoordinator:
     """
     Judy's pulse generator. Broadcasts mood, mode, scene, memory count, and daemon health to whoever’s listening.
     """
-    def __init__(self, state_manager, memory_daemon, daemons=None, interval=5):
+    def __init__(self, state_manager, memory_daemon, daemons=None, interval=5, idle_after=60):
         self.state_manager = state_manager
         self.memory_daemon = memory_daemon
         self.daemons = daemons or {}  # dict of {name: daemon_instance}
         self.interval = interval
+        self.idle_after = idle_after  # seconds without a chat turn before pulses run the idle routines
         self._stop_event = threading.Event()
         self._observers = []
+        self._metrics_providers = {}  # {name: callable returning a dict}
+        self._idle_tasks = {}  # {name: callable run on idle pulses}
 
     def register_observer(self, callback):
         """Subscribe a callback for pulse updates."""
         self._observers.append(callback)
 
+    def register_metrics(self, name, provider):
+        """Include provider() in every pulse under ``name`` (e.g. inference speed)."""
+        self._metrics_providers[name] = provider
+
+    def register_idle_task(self, name, task):
+        """Run task() on every idle pulse after the built-in routines (e.g. conversation summarization)."""
+        self._idle_tasks[name] = task
+
     def notify_observers(self, event_type, data=None):
         for cb in self._observers:
             try:
@@ -38,7 +49,8 @@ class PulseCoordinator:
         Idle cycle routines: decay mood, migrate memories, prune, rebuild context, etc.
         """
         try:
-            self.state_manager.decay_mood()
+            if hasattr(self.state_manager, 'decay_mood'):
+                self.state_manager.decay_mood()
         except Exception as e:
             print(f"[PulseCoordinator] Error in decay_mood: {e}")
         try:
@@ -47,21 +59,44 @@ class PulseCoordinator:
         except Exception as e:
             print(f"[PulseCoordinator] Error in migrate_long_term_memories_to_chroma: {e}")
         try:
-            if self.state_manager.is_context_stale():
+            if hasattr(self.state_manager, 'is_context_stale') and self.state_manager.is_context_stale():
                 self.state_manager.rebuild_prompt_context()
                 self.state_manager.clear_context_stale()
         except Exception as e:
             print(f"[PulseCoordinator] Error in context staleness handling: {e}")
+        for name, task in self._idle_tasks.items():
+            try:
+                task()
+            except Exception as e:
+                print(f"[PulseCoordinator] Error in idle task '{name}': {e}")
 
-    def _context_stale(self):
-        return self.state_manager.is_context_stale()
+    def _run_maintenance(self):
+        """Every-pulse upkeep that must not wait for idle mode; each job rate-limits itself."""
+        try:
+            if hasattr(self.state_manager, 'run_scheduled_compaction'):
+                self.state_manager.run_scheduled_compaction()
+        except Exception as e:
+            print(f"[PulseCoordinator] Error in short-term compaction: {e}")
+
+    def get_mode(self):
+        """"idle" once no chat turn has arrived for idle_after seconds, else "active"."""
+        last_activity = getattr(self.state_manager, "last_activity", 0.0)
+        return "idle" if time.time() - last_activity >= self.idle_after else "active"
+
+    def _memory_count(self):
+        """Short-term memories in the vector store (where chat turns live), else in the state file."""
+        try:
+            return self.state_manager.chroma.count("short")
+        except Exception:
+            return len(self.state_manager.state.get("short_term_memory", []))
 
     def _pulse_loop(self):
         while not self._stop_event.is_set():
             try:
                 pulse_data = self.collect_status()
                 self.notify_observers("pulse", pulse_data)
-                if self.state_manager.get_mode() == "idle":
+                self._run_maintenance()
+                if pulse_data["mode"] == "idle":
                     self._handle_idle_behavior()
                 print(f"[💥] Pulse fired: {pulse_data}")
             except Exception as e:
@@ -70,13 +105,19 @@ class PulseCoordinator:
 
     def collect_status(self):
         """Collect status from key components."""
+        state = self.state_manager.state
         status_report = {
-            "mood": self.state_manager.get_mood(),
-            "mode": self.state_manager.get_mode(),
-            "scene": self.state_manager.get_scene(),
-            "memory_count": len(self.state_manager.get_memories("short")),
+            "mood": state.get("mood", "neutral"),
+            "mode": self.get_mode(),
+            "scene": state.get("scene", "default"),
+            "memory_count": self._memory_count(),
             "daemons": {}
         }
         for name, daemon in self.daemons.items():
             status_report["daemons"][name] = "alive" if getattr(daemon, "is_alive", lambda: False)() else "dead"
+        for name, provider in self._metrics_providers.items():
+            try:
+                status_report[name] = provider()
+            except Exception as e:
+                print(f"[PulseCoordinator] Metrics provider '{name}' failed: {e}")
         return status_report
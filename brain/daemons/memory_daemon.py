@@ -169,6 +169,10 @@ class MemoryDaemon:
     def on_heartbeat(self):
         print("[MemoryDaemon] Heartbeat received. Syncing to StateManager...")
         if hasattr(self, 'state_manager') and self.state_manager:
-            for item in self.memory:
-                if isinstance(item, dict) and 'content' in item:
-                    self.state_manager.add_memory_chroma(item['content'], memory_type="short", metadata=item)
+            items = [item for item in self.memory if isinstance(item, dict) and 'content' in item]
+            if items:
+                # One bulk write; memories that are already indexed are skipped without re-embedding
+                added = self.state_manager.add_memories_chroma(
+                    [item['content'] for item in items], metadatas=items, memory_type="short"
+                )
+                print(f"[MemoryDaemon] Heartbeat sync: {added} new of {len(items)} memories indexed.")
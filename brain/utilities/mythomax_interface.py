@@ -1,18 +1,177 @@
+import itertools
+import json
+import queue
+import shlex
 import subprocess
 import threading
 
+
+class _Worker:
+    """One persistent worker process and the thread reading its stdout."""
+
+    def __init__(self, command, index):
+        self.command = command
+        self.index = index
+        self.process = None
+        self.current_id = None
+        self.restarts = -1
+        self.start()
+
+    def start(self):
+        # Fresh event and queue per process, so the old reader can't signal the new one.
+        self.ready = threading.Event()
+        self.events = queue.Queue()
+        self.current_id = None
+        self.restarts += 1
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        text=True, encoding="utf-8", bufsize=1)
+        threading.Thread(target=self._read, args=(self.process, self.events, self.ready),
+                         name=f"mythomax-{self.index}", daemon=True).start()
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def _read(self, process, events, ready):
+        for line in process.stdout:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                print(f"[MythomaxInterface] Worker {self.index} wrote a non-JSON line: {line.strip()[:200]}")
+                continue
+            if event.get("ready"):
+                ready.set()
+            elif event.get("id") is not None and event.get("id") == self.current_id:
+                events.put(event)
+        code = process.wait()
+        events.put({"id": self.current_id, "error": f"worker exited with code {code}", "crashed": True})
+        ready.set()  # wake anyone waiting for startup; alive is now False
+
+    def restart(self):
+        self.stop()
+        print(f"[MythomaxInterface] Restarting worker {self.index}")
+        self.start()
+
+    def send(self, request):
+        self.current_id = request["id"]
+        self.process.stdin.write(json.dumps(request) + "\n")
+        self.process.stdin.flush()
+
+    def stop(self):
+        if self.alive:
+            self.process.kill()
+            self.process.wait()
+
+
 class MythomaxInterface:
-    def __init__(self, cli_path="mythomax-cli", max_tokens=150, timeout=15):
+    """
+    Text generation through the Mythomax CLI.
+
+    Without ``worker_command`` every call runs the CLI once (paying process
+    and model startup each time). With it, ``workers`` long-lived processes
+    (e.g. ``python -m brain.utilities.mythomax_worker --model <gguf>``) load
+    the model once and take requests as line-delimited JSON, so a call costs
+    only generation time. Workers serve one request at a time; a crashed or
+    hung worker is restarted and a request that crashed before producing any
+    text is retried once. ``timeout`` is the longest wait for a free worker or
+    between two streamed events.
+    """
+
+    def __init__(self, cli_path="mythomax-cli", max_tokens=150, timeout=15, worker_command=None, workers=1,
+                 startup_timeout=120, temperature=0.7):
         self.cli_path = cli_path
         self.max_tokens = max_tokens
         self.timeout = timeout
-        self.lock = threading.Lock()  # For thread safety if needed
+        self.startup_timeout = startup_timeout
+        self.temperature = temperature
+        self.lock = threading.Lock()  # serializes one-shot CLI calls
+        self._ids = itertools.count(1)
+        self._workers = []
+        self._idle = queue.Queue()
+        if worker_command:
+            command = shlex.split(worker_command) if isinstance(worker_command, str) else list(worker_command)
+            for index in range(max(1, workers)):
+                worker = _Worker(command, index)
+                self._workers.append(worker)
+                self._idle.put(worker)
+
+    @property
+    def persistent(self):
+        return bool(self._workers)
+
+    def _acquire(self):
+        try:
+            worker = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No Mythomax worker free after {self.timeout}s")
+        if not worker.alive:
+            worker.restart()
+        if not worker.ready.wait(self.startup_timeout) or not worker.alive:
+            worker.restart()
+            self._idle.put(worker)
+            raise RuntimeError(f"Mythomax worker {worker.index} failed to start")
+        return worker
 
-    def generate_text(self, prompt):
+    def generate_stream(self, prompt, max_tokens=None, temperature=None):
+        """Yield the reply chunk by chunk from a persistent worker."""
+        if not self.persistent:
+            raise RuntimeError("generate_stream needs worker_command (persistent mode)")
+        for attempt in range(2):
+            worker = self._acquire()
+            request_id = str(next(self._ids))
+            produced = False
+            try:
+                worker.send({
+                    "id": request_id,
+                    "prompt": prompt,
+                    "max_tokens": max_tokens or self.max_tokens,
+                    "temperature": self.temperature if temperature is None else temperature,
+                    "stream": True
+                })
+                while True:
+                    try:
+                        event = worker.events.get(timeout=self.timeout)
+                    except queue.Empty:
+                        worker.restart()  # hung mid-generation; a fresh process is cheaper than waiting
+                        raise TimeoutError(f"Mythomax worker {worker.index} silent for {self.timeout}s")
+                    if event.get("token"):
+                        produced = True
+                        yield event["token"]
+                    elif event.get("done"):
+                        return
+                    elif event.get("crashed") and not produced and attempt == 0:
+                        print(f"[MythomaxInterface] Worker {worker.index} crashed ({event['error']}); retrying")
+                        break
+                    elif "error" in event:
+                        raise RuntimeError(event["error"])
+            except TimeoutError:
+                raise
+            except OSError as e:  # broken pipe: the worker died before reading the request
+                if produced or attempt:
+                    raise
+                print(f"[MythomaxInterface] Worker {worker.index} unreachable ({e}); retrying")
+            finally:
+                worker.current_id = None
+                self._idle.put(worker)
+
+    def generate_text(self, prompt, on_token=None):
         """
         Sends prompt to Mythomax CLI (or API) and returns the generated text.
+        In persistent mode on_token(text) is called with each chunk as it arrives.
         Handles errors gracefully.
         """
+        if self.persistent:
+            try:
+                pieces = []
+                for text in self.generate_stream(prompt):
+                    pieces.append(text)
+                    if on_token:
+                        on_token(text)
+                return "".join(pieces).strip()
+            except Exception as e:
+                print("[MythomaxInterface] Exception:", e)
+                return "Oops, I'm tangled in the code. Try again?"
+
         with self.lock:
             try:
                 # Example subprocess call - adapt CLI args for your actual Mythomax tool
@@ -29,3 +188,15 @@ class MythomaxInterface:
                 print("[MythomaxInterface] Exception:", e)
                 return "Oops, I'm tangled in the code. Try again?"
 
+    def status(self):
+        return {
+            "mode": "persistent" if self.persistent else "oneshot",
+            "workers": len(self._workers),
+            "idle": self._idle.qsize(),
+            "alive": sum(worker.alive for worker in self._workers),
+            "restarts": sum(worker.restarts for worker in self._workers)
+        }
+
+    def close(self):
+        for worker in self._workers:
+            worker.stop()
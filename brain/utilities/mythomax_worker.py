@@ -0,0 +1,64 @@
+"""
+Long-lived Mythomax worker for MythomaxInterface's persistent mode.
+
+Loads the model once, then serves line-delimited JSON over stdin/stdout:
+
+    request:  {"id": "7", "prompt": "...", "max_tokens": 150, "temperature": 0.7, "stream": true}
+    events:   {"id": "7", "token": "Hel"}          (only when stream is true)
+              {"id": "7", "done": true, "text": "Hello"}
+              {"id": "7", "error": "message"}
+
+{"ready": true} is written once the model is loaded. Anything else the
+process prints goes to stderr so it can't corrupt the protocol stream.
+"""
+import argparse
+import json
+import os
+import sys
+
+
+def serve(model_path, n_ctx=2048, n_threads=8, n_gpu_layers=-1):
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), "w", buffering=1, encoding="utf-8")
+    sys.stdout = sys.stderr
+
+    def send(message):
+        protocol.write(json.dumps(message) + "\n")
+        protocol.flush()
+
+    from llama_cpp import Llama
+    llm = Llama(model_path=model_path, n_ctx=n_ctx, n_threads=n_threads, n_gpu_layers=n_gpu_layers, verbose=False)
+    send({"ready": True, "pid": os.getpid()})
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError:
+            send({"id": None, "error": "invalid JSON request"})
+            continue
+        request_id = request.get("id")
+        try:
+            pieces = []
+            for chunk in llm.create_completion(request["prompt"], max_tokens=request.get("max_tokens", 150),
+                                               temperature=request.get("temperature", 0.7), stream=True):
+                text = chunk["choices"][0]["text"]
+                if not text:
+                    continue
+                pieces.append(text)
+                if request.get("stream"):
+                    send({"id": request_id, "token": text})
+            send({"id": request_id, "done": True, "text": "".join(pieces).strip()})
+        except Exception as e:
+            send({"id": request_id, "error": str(e)})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Persistent Mythomax worker (line-delimited JSON on stdin/stdout).")
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--n-ctx", type=int, default=2048)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--n-gpu-layers", type=int, default=-1)
+    args = parser.parse_args()
+    serve(args.model, n_ctx=args.n_ctx, n_threads=args.threads, n_gpu_layers=args.n_gpu_layers)
@@ -164,6 +164,31 @@ class JalenWidget(tk.Frame):
         self.chat_display.insert("end", f"{msg}\n")
         self.chat_display.see("end")
 
+    def begin_stream(self, prefix):
+        """Start a chat line that is filled in as tokens arrive."""
+        self._streaming = True
+        self.chat_display.insert("end", prefix)
+        self.chat_display.see("end")
+
+    def stream_token(self, text):
+        """Append a chunk to the open chat line. Safe to call from worker threads."""
+        self.after(0, self._append_stream, text)
+
+    def _append_stream(self, text):
+        if getattr(self, "_streaming", False):
+            self.chat_display.insert("end", text)
+            self.chat_display.see("end")
+
+    def end_stream(self):
+        """Close the open chat line. Safe to call from worker threads."""
+        self.after(0, self._finish_stream)
+
+    def _finish_stream(self):
+        if getattr(self, "_streaming", False):
+            self._streaming = False
+            self.chat_display.insert("end", "\n")
+            self.chat_display.see("end")
+
     def toggle_settings(self):
         """Show/hide the settings panel."""
         if self.settings_panel.is_shown:
@@ -18,6 +18,12 @@ class StatusBar:
         daemons = self.last_pulse.get("daemons", {})
 
         print(f"[🩸 GUI PULSE] Mood: {mood} | Mode: {mode} | Scene: {scene} | Memories: {memory_count}")
+        inference = self.last_pulse.get("inference") or {}
+        if inference.get("tokens_per_sec"):
+            line = f"[⚡] {inference['tokens_per_sec']:.1f} tok/s | TTFT {inference.get('ttft_ms', 0):.0f}ms"
+            if "acceptance_rate" in inference:
+                line += f" | {inference['speculative']} drafts accepted: {inference['acceptance_rate']:.0%}"
+            print(line)
         for name, status in daemons.items():
             print(f"[👾] {name}: {status}")
 
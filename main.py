@@ -8,6 +8,8 @@ from brain.daemons.memory_daemon import MemoryDaemon
 from brain.daemons.lore_trigger_watcher import LoreTriggerWatcher
 from brain.agents.jalen_agent import JalenAgent
 from brain.core.state_manager import StateManager
+from brain.core.llama_embeddings import create_embedding_function
+from brain.core.response_cache import ResponseCache
 from brain.daemons.MessageHandlerDaemon import MessageHandlerDaemon
 from brain.daemons.PulseCoordinator import PulseCoordinator
 from runners import run_daemons
@@ -70,18 +72,39 @@ def launch_test_gui(agent):
         """Handle user input and get agent response"""
         if hasattr(agent, 'generate_response'):
             # Show typing indicator
+            jalen_widget._log_message(f"You: {user_message}")
             jalen_widget.show_typing_indicator()
-            
-            # Generate response asynchronously
+            streamed = []
+
+            # Render the reply token by token; the indicator goes away on the first one
+            def handle_token(text):
+                if not streamed:
+                    jalen_widget.after(0, jalen_widget.hide_typing_indicator)
+                    jalen_widget.after(0, jalen_widget.begin_stream, "Judy🌹: ")
+                streamed.append(text)
+                jalen_widget.stream_token(text)
+
             def handle_response(response):
-                jalen_widget.hide_typing_indicator()
-                jalen_widget.show_avatar(temporary=True) # Show avatar with Judy's message
-                jalen_widget._log_message(f"You: {user_message}")
-                jalen_widget._log_message(f"Judy🌹: {response}")
-            
+                if response is None:
+                    # Superseded by a newer message; close whatever was streamed so far
+                    if streamed:
+                        jalen_widget.end_stream()
+                    else:
+                        jalen_widget.after(0, jalen_widget.hide_typing_indicator)
+                    return
+                if streamed:
+                    jalen_widget.end_stream()
+                else:
+                    jalen_widget.after(0, jalen_widget.hide_typing_indicator)
+                    jalen_widget.after(0, jalen_widget._log_message, f"Judy🌹: {response}")
+                jalen_widget.after(0, lambda: jalen_widget.show_avatar(temporary=True)) # Show avatar with Judy's message
+
+            if not agent.is_ready() and agent.model_status()["state"] == "loading":
+                jalen_widget._log_message("Judy🌹: [Still waking up — I'll answer as soon as my model is loaded.]")
+
             # Hide avatar before showing typing indicator and sending new message
             jalen_widget.hide_avatar()
-            agent.generate_response_async(user_message, handle_response)
+            agent.generate_response_async(user_message, handle_response, on_token=handle_token)
         else:
             jalen_widget._log_message(f"You: {user_message}")
             jalen_widget._log_message("Judy🌹: [Agent not ready]")
@@ -119,6 +142,22 @@ def launch_test_gui(agent):
     # Initial greeting
     jalen_widget._log_message("Judy🌹: " + agent.greet())
     input_box.focus()
+
+    # Show model load progress in the title bar until the model is ready
+    def poll_model_status():
+        status = agent.model_status()
+        if status["state"] == "loading":
+            jalen_widget.jalen_label.config(text=f"J.A.L.E.N · loading {status['model']} ({status['elapsed_s']:.0f}s)")
+            root.after(500, poll_model_status)
+        elif status["state"] == "failed":
+            jalen_widget.jalen_label.config(text="J.A.L.E.N")
+            jalen_widget.update_mode("error")
+            jalen_widget._log_message(f"[JALEN] Model failed to load: {status['error']}")
+        else:
+            jalen_widget.jalen_label.config(text="J.A.L.E.N")
+            jalen_widget._log_message(f"[JALEN] Model ready ({status['model']}, {status['elapsed_s']:.1f}s)")
+
+    poll_model_status()
     
     root.mainloop()
 
@@ -138,8 +177,26 @@ def main():
     logging_settings = config.get("logging_settings", {})
     log_prompts_config = logging_settings.get("log_prompts", False)
 
+    # Extract memory settings
+    memory_settings = config.get("memory_settings", {})
+    vector_backend_config = memory_settings.get("vector_backend", "chroma")
+    vector_options_config = {
+        "embedding_function": create_embedding_function(memory_settings.get("embedding"))
+    }
+    if vector_backend_config == "numpy":
+        vector_options_config["index_mode"] = memory_settings.get("index_mode", "exact")
+        vector_options_config["ann_params"] = memory_settings.get("ann", {})
+        vector_options_config["compression"] = memory_settings.get("compression")
+
     state_file = config.get("state_file", "runtime/state.json")
-    state_manager = StateManager(memory_file=state_file)
+    state_manager = StateManager(memory_file=state_file,
+                                 vector_backend=vector_backend_config,
+                                 vector_options=vector_options_config)
+    state_manager.configure_compaction(
+        ttl_hours=memory_settings.get("short_term_ttl_hours"),
+        interval_minutes=memory_settings.get("compaction_interval_minutes"),
+        promote_threshold=memory_settings.get("promote_threshold")
+    )
 
     memory_daemon = MemoryDaemon(memory_file=MEMORY_PATH, archive_file=ARCHIVE_PATH)
     memory_daemon.state_manager = state_manager
@@ -163,7 +220,8 @@ def main():
         state_manager=state_manager,
         memory_daemon=memory_daemon,
         daemons=daemons,
-        interval=5
+        interval=5,
+        idle_after=memory_settings.get("idle_after_seconds", 60)
     )
     pulse_coordinator.register_observer(status_bar.handle_pulse_update)
     pulse_coordinator.start()
@@ -174,7 +232,20 @@ def main():
                        state_manager,
                        model_path=model_path_config,
                        n_gpu_layers=n_gpu_layers_config,
-                       log_prompts=log_prompts_config)
+                       log_prompts=log_prompts_config,
+                       load_async=True,  # GUI comes up while the model loads
+                       inference_workers=model_settings.get("inference_workers", 1),
+                       max_queue=model_settings.get("max_queue", 8),
+                       max_queue_seconds=model_settings.get("max_queue_seconds", 30.0),
+                       response_cache=ResponseCache.from_settings(
+                           model_settings.get("response_cache"),
+                           embedding_function=state_manager.chroma.embedding_function
+                       ),
+                       speculative=model_settings.get("speculative"),
+                       model_settings=model_settings,
+                       summary_settings=memory_settings.get("conversation_summary"))
+    pulse_coordinator.register_metrics("inference", agent.inference_metrics)
+    pulse_coordinator.register_idle_task("conversation_summary", agent.summarizer.run_once)
     # agent.start_chatbox()  # Disabled for test GUI
     gui_thread = threading.Thread(target=launch_test_gui, args=(agent,), daemon=True)
     gui_thread.start()
@@ -0,0 +1,41 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+from brain.core.numpy_indexer import NumpyVectorDB
+
+
+def bag_of_words(texts, dim=32):
+    """Deterministic stand-in for an embedding model: hashed word counts."""
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in text.lower().split():
+            vectors[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % dim] += 1.0
+    return vectors
+
+
+@pytest.fixture
+def store(tmp_path):
+    return NumpyVectorDB(persist_directory=str(tmp_path), embedding_function=bag_of_words)
+
+
+@pytest.fixture
+def reopen():
+    """Open a second NumpyVectorDB on the same directory, as a restart would."""
+    def reopen(store, **kwargs):
+        return NumpyVectorDB(persist_directory=store.persist_directory, embedding_function=bag_of_words, **kwargs)
+    return reopen
+
+
+@pytest.fixture
+def make_state_manager(tmp_path):
+    """StateManager factory over the numpy backend; calling it again simulates a restart."""
+    from brain.core.state_manager import StateManager
+
+    def make_state_manager():
+        return StateManager(
+            memory_file=str(tmp_path / "state.json"), vector_backend="numpy",
+            vector_options={"persist_directory": str(tmp_path / "vectors"), "embedding_function": bag_of_words}
+        )
+    return make_state_manager
@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+
+from brain.core.ann_index import IVFIndex
+
+
+def unit_vectors(count, dim=16, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_rows(matrix, queries, k):
+    return np.argsort(-(queries @ matrix.T), axis=1)[:, :k]
+
+
+def test_probing_every_list_matches_exact_search():
+    matrix = unit_vectors(500)
+    index = IVFIndex(nlist=8, min_train_size=100)
+    assert index.needs_rebuild(500)
+    assert index.train(matrix)
+    queries = matrix[:10]
+    _, rows = index.search(queries, matrix, k=5, nprobe=8)
+    assert rows.tolist() == exact_rows(matrix, queries, 5).tolist()
+    assert not index.needs_rebuild(500) and index.needs_rebuild(1000)
+
+
+def test_rows_added_after_training_are_searchable():
+    matrix = unit_vectors(300)
+    index = IVFIndex(nlist=4)
+    index.train(matrix[:200])
+    # Unassigned tail rows are always scanned, then bucketed by add()
+    _, rows = index.search(matrix[250:251], matrix, k=1, nprobe=1)
+    assert rows[0, 0] == 250
+    index.add(matrix)
+    assert index.assigned_rows == 300
+    _, rows = index.search(matrix[250:251], matrix, k=1, nprobe=4)
+    assert rows[0, 0] == 250
+
+
+def test_reset_discards_a_rebuild_from_an_older_epoch(tmp_path):
+    path = str(tmp_path / "ivf.npz")
+    matrix = unit_vectors(200)
+    index = IVFIndex(path=path, nlist=4)
+    epoch = index.epoch
+    index.reset()  # e.g. a vacuum renumbered the rows mid-rebuild
+    assert not index.train(matrix, epoch=epoch)
+    assert not index.is_trained
+    index.save(epoch=epoch)
+    assert not os.path.exists(path)
+
+    assert index.train(matrix, epoch=index.epoch)
+    index.save(epoch=index.epoch)
+    reloaded = IVFIndex(path=path)
+    assert reloaded.is_trained and reloaded.assigned_rows == 200
+
+
+def test_collection_switches_to_ivf_and_resets_it_on_vacuum(tmp_path):
+    from brain.core.numpy_indexer import MemmapCollection
+
+    vectors = unit_vectors(64)
+    collection = MemmapCollection(str(tmp_path), "long_term_memory", embedding_function=lambda texts: None,
+                                  index_mode="ivf", ann_params={"nlist": 4, "min_train_size": 32})
+    documents = [f"memory {i}" for i in range(64)]
+    collection.add(documents, embeddings=vectors)
+    collection.ann_index._rebuild_thread.join(5)
+    assert collection.ann_index.is_trained
+
+    hits = collection.query(query_embeddings=vectors[:1], n_results=1)
+    assert hits["documents"] == [["memory 0"]]
+    epoch = collection.ann_index.epoch
+    collection.delete([hits["ids"][0][0]])
+    assert collection.vacuum() == 1
+    # The old buckets point at pre-vacuum row numbers: reset and retrained from scratch
+    assert collection.ann_index.epoch == epoch + 1
+    collection.ann_index._rebuild_thread.join(5)
+    assert collection.ann_index.trained_rows == 63
+    assert collection.query(query_embeddings=vectors[1:2], n_results=1)["documents"] == [["memory 1"]]
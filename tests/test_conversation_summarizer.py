@@ -0,0 +1,65 @@
+import concurrent.futures
+import time
+
+import pytest
+
+from brain.core.conversation_summarizer import ConversationSummarizer
+
+
+class FakePool:
+    """Records submitted prompts; each returns a future the test resolves."""
+
+    def __init__(self):
+        self.prompts = []
+        self.futures = []
+
+    def submit(self, prompt, priority="interactive", **kwargs):
+        assert priority == "background"
+        self.prompts.append(prompt)
+        self.futures.append(concurrent.futures.Future())
+        return self.futures[-1]
+
+
+@pytest.fixture
+def chat(make_state_manager):
+    state = make_state_manager()
+    start = time.time() - 100
+    for i in range(12):
+        role = "user" if i % 2 == 0 else "judy"
+        state.add_memory_chroma(f"{role}: line {i}", memory_type="short",
+                                metadata={"role": role, "timestamp": start + i})
+    state.add_memory_chroma("a note, not a chat turn", memory_type="short", metadata={"timestamp": start + 20})
+    pool = FakePool()
+    summarizer = ConversationSummarizer(state, pool, keep_recent=4, batch_turns=6, interval_seconds=0)
+    return state, pool, summarizer, start
+
+
+def test_folds_old_turns_and_keeps_the_recent_window(chat):
+    state, pool, summarizer, start = chat
+    assert len(summarizer.unsummarized_turns()) == 12
+
+    future = summarizer.run_once()
+    assert "user: line 0" in pool.prompts[0] and "judy: line 5" in pool.prompts[0]
+    assert "line 6" not in pool.prompts[0] and "a note" not in pool.prompts[0]
+    assert summarizer.run_once() is None  # one fold in flight at a time
+
+    future.set_result(" They talked about lines. ")
+    assert summarizer.summary == "They talked about lines."
+    assert summarizer.watermark == start + 5
+    assert state.state["conversation_summary"]["turns"] == 6
+
+    # 6 left, 4 of them stay verbatim
+    summarizer.run_once()
+    assert "(nothing yet)" not in pool.prompts[1] and "They talked about lines." in pool.prompts[1]
+    assert "line 6" in pool.prompts[1] and "line 7" in pool.prompts[1] and "line 8" not in pool.prompts[1]
+    pool.futures[1].set_result("Still lines.")
+    assert summarizer.watermark == start + 7
+    assert summarizer.run_once() is None
+
+
+def test_failed_summary_keeps_the_previous_watermark(chat):
+    state, pool, summarizer, _ = chat
+    summarizer.run_once().set_exception(RuntimeError("model crashed"))
+    assert summarizer.summary == "" and summarizer.watermark == 0.0
+    summarizer.run_once()
+    assert "line 0" in pool.prompts[1]
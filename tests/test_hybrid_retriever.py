@@ -0,0 +1,124 @@
+from brain.core.hybrid_retriever import BM25Index, HybridRetriever
+from brain.core.memory_records import content_id
+
+
+class FakeVectorStore:
+    """
+    Returns canned vector hits and records the filters it was queried with.
+    ``query_ids`` re-scores candidates from ``distances`` (default 0.9).
+    """
+
+    def __init__(self, hits, distances=None):
+        self.hits = hits
+        self.distances = distances or {}
+        self.calls = []
+        self.rescored = []
+
+    @staticmethod
+    def embedding_function(texts):
+        return [[1.0] for _ in texts]
+
+    def query_many(self, queries, memory_types=("long",), n_results=5, query_embeddings=None, **filters):
+        self.calls.append(filters)
+        return [self.hits[:n_results]]
+
+    def query_ids(self, query, ids, memory_type="long", n_results=3, query_embedding=None, **filters):
+        self.rescored.append(sorted(ids))
+        documents = {content_id(doc): doc for doc in self.distances}
+        hits = [(documents[i], {}, self.distances[documents[i]]) for i in ids if i in documents]
+        return sorted(hits, key=lambda hit: hit[2])[:n_results]
+
+
+def make_retriever(vector_hits, documents, distances=None):
+    store = FakeVectorStore([(doc, {}, 0.1 * rank) for rank, doc in enumerate(vector_hits)], distances)
+    retriever = HybridRetriever(store, rrf_k=60)
+    for doc, metadata in documents:
+        retriever.index(doc, "long", metadata)
+    return retriever, store
+
+
+def test_rrf_ranks_documents_found_by_both_stages_first():
+    retriever, _ = make_retriever(
+        vector_hits=["Stixx fixed the violet GUI", "Stixx adores felines"],
+        documents=[("the GUI glows violet", {}), ("Stixx fixed the violet GUI", {}), ("a note about dogs", {})]
+    )
+    results = retriever.search("violet GUI", memory_type="long", n_results=3)
+    documents = [doc for doc, _, _ in results]
+    assert documents[0] == "Stixx fixed the violet GUI"
+    assert set(documents[1:]) == {"the GUI glows violet", "Stixx adores felines"}
+    scores = [score for _, _, score in results]
+    assert scores[0] == 1 / 61 + 1 / 62
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_paraphrases_survive_many_keyword_hits():
+    # Plenty of keyword candidates must not narrow the vector stage to them
+    documents = [(f"the cat number {i}", {}) for i in range(20)]
+    retriever, _ = make_retriever(vector_hits=["Stixx adores felines"], documents=documents)
+    results = retriever.search("cat", memory_type="long", n_results=5)
+    assert "Stixx adores felines" in [doc for doc, _, _ in results]
+
+
+def test_keyword_candidates_are_rescored_by_vector_similarity():
+    # Candidates the full search missed are re-scored and merged into the vector ranking by distance
+    retriever, store = make_retriever(
+        vector_hits=["Stixx adores felines"],
+        documents=[("the cat flap squeaks", {}), ("my cat naps all day", {})],
+        distances={"the cat flap squeaks": 0.8, "my cat naps all day": 0.2}
+    )
+    results = retriever.search("cat", memory_type="long", n_results=3)
+    assert store.rescored == [sorted(content_id(doc) for doc in ("the cat flap squeaks", "my cat naps all day"))]
+    scores = {doc: score for doc, _, score in results}
+    # Vector ranks: felines (full search), then naps (0.2) and flap (0.8) from the re-scoring
+    assert scores["Stixx adores felines"] == 1 / 61
+    assert scores["the cat flap squeaks"] == 1 / 61 + 1 / 63
+    assert scores["my cat naps all day"] == 1 / 62 + 1 / 62
+
+
+def test_filters_reach_both_stages():
+    retriever, store = make_retriever(
+        vector_hits=[],
+        documents=[("my bank pin is 4321", {"sensitivity": "high"}), ("the bank closes at five", {})]
+    )
+    results = retriever.search("bank pin", memory_type="long", n_results=5)
+    assert [doc for doc, _, _ in results] == ["the bank closes at five"]
+    assert store.calls == [{}]
+
+
+def test_bm25_skips_stopwords_and_common_terms():
+    index = BM25Index()
+    texts = ["judy likes rain", "rain again"] + [f"judy note {i}" for i in range(10)]
+    for doc_id, text in enumerate(texts):
+        index.add(str(doc_id), text)
+    assert index.search("the") == []
+    assert index.search("judy") == []  # in 11 of 12 documents
+    assert {doc_id for doc_id, _ in index.search("judy rain")} == {"0", "1"}
+
+
+def test_bm25_small_index_keeps_common_terms():
+    index = BM25Index()
+    for doc_id, text in enumerate(["judy likes rain", "judy likes tea"]):
+        index.add(str(doc_id), text)
+    assert {doc_id for doc_id, _ in index.search("judy")} == {"0", "1"}
+
+
+def test_numpy_store_query_is_embedded_once(tmp_path):
+    from brain.core.numpy_indexer import NumpyVectorDB
+    from conftest import bag_of_words
+
+    calls = []
+
+    def counting_embedding(texts):
+        calls.append(list(texts))
+        return bag_of_words(texts)
+
+    store = NumpyVectorDB(persist_directory=str(tmp_path), embedding_function=counting_embedding)
+    retriever = HybridRetriever(store)
+    documents = [f"note {i} about the weather" for i in range(8)] + ["Stixx named the cat Pixel"]
+    store.add_many(documents, memory_type="long")
+    for doc in documents:
+        retriever.index(doc, "long")
+    calls.clear()
+    results = retriever.search("Pixel", memory_type="long", n_results=1)
+    assert results[0][0] == "Stixx named the cat Pixel"
+    assert calls == [["Pixel"]]
@@ -0,0 +1,102 @@
+import threading
+
+import pytest
+
+from brain.core.inference_pool import InferencePool, PoolSaturated
+from brain.core.text_generation import GenerationCancelled
+
+TIMEOUT = 5
+
+
+class FakeGenerator:
+    """
+    Stands in for TextGenerator. A prompt listed in ``hold`` keeps "decoding"
+    until its event is set or the pool cancels it; every run is logged in ``started``.
+    """
+
+    n_ctx = 2048
+
+    def __init__(self, hold):
+        self.hold = hold
+        self.started = []
+        self.running = {prompt: threading.Event() for prompt in hold}
+        self.last_metrics = {}
+
+    def generate(self, prompt, cancel=None, **kwargs):
+        self.started.append(prompt)
+        if prompt in self.hold:
+            self.running[prompt].set()
+            while not self.hold[prompt].wait(0.005):
+                if cancel.is_set():
+                    self.running[prompt].clear()
+                    raise GenerationCancelled("cancelled mid-reply")
+        self.last_metrics = {"ttft_ms": 1.0, "total_ms": 3.0, "tokens": 2}
+        return prompt.upper()
+
+
+def make_pool(*held, **kwargs):
+    hold = {prompt: threading.Event() for prompt in held}
+    generator = FakeGenerator(hold)
+    return InferencePool(lambda: generator, **kwargs), generator, hold
+
+
+def test_interactive_request_preempts_and_requeues_background_job():
+    pool, generator, hold = make_pool("summary", workers=1)
+    background = pool.submit("summary", priority="background")
+    assert generator.running["summary"].wait(TIMEOUT)
+
+    chat = pool.submit("hi", priority="interactive")
+    assert chat.result(TIMEOUT) == "HI"
+    hold["summary"].set()
+    assert background.result(TIMEOUT) == "SUMMARY"
+    assert generator.started == ["summary", "hi", "summary"]
+    assert pool.stats()["preempted"] == 1
+    assert chat.timings["tokens"] == 2
+
+
+def test_newer_message_supersedes_queued_and_running_ones():
+    pool, generator, hold = make_pool("busy", "first", workers=1)
+    blocker = pool.submit("busy", priority="api")
+    assert generator.running["busy"].wait(TIMEOUT)
+
+    queued = pool.submit("queued", priority="interactive", supersede_key="chat")
+    replacement = pool.submit("first", priority="interactive", supersede_key="chat")
+    with pytest.raises(GenerationCancelled):
+        queued.result(TIMEOUT)
+
+    hold["busy"].set()
+    assert blocker.result(TIMEOUT) == "BUSY"
+    assert generator.running["first"].wait(TIMEOUT)
+    latest = pool.submit("latest", priority="interactive", supersede_key="chat")
+    with pytest.raises(GenerationCancelled):
+        replacement.result(TIMEOUT)
+    assert latest.result(TIMEOUT) == "LATEST"
+    assert "queued" not in generator.started
+    assert pool.stats()["superseded"] == 2
+
+
+def test_full_queue_rejects_or_displaces_by_priority():
+    pool, generator, hold = make_pool("busy", workers=1, max_queue=1)
+    blocker = pool.submit("busy", priority="api")
+    assert generator.running["busy"].wait(TIMEOUT)
+
+    waiting = pool.submit("later", priority="background")
+    with pytest.raises(PoolSaturated):
+        pool.submit("even later", priority="background")
+    urgent = pool.submit("now", priority="interactive")
+    with pytest.raises(PoolSaturated):
+        waiting.result(TIMEOUT)
+
+    hold["busy"].set()
+    assert (blocker.result(TIMEOUT), urgent.result(TIMEOUT)) == ("BUSY", "NOW")
+    assert pool.stats()["rejected"] == 2
+
+
+def test_request_that_waited_too_long_times_out():
+    pool, generator, hold = make_pool("busy", workers=1, max_queue_seconds=0.05)
+    pool.submit("busy", priority="api")
+    assert generator.running["busy"].wait(TIMEOUT)
+    stale = pool.submit("stale", priority="api")
+    threading.Timer(0.1, hold["busy"].set).start()
+    with pytest.raises(TimeoutError):
+        stale.result(TIMEOUT)
@@ -0,0 +1,70 @@
+import sys
+import textwrap
+
+import pytest
+
+from brain.utilities.mythomax_interface import MythomaxInterface
+
+# Speaks MythomaxInterface's worker protocol without a model: echoes the prompt word by word.
+FAKE_WORKER = textwrap.dedent("""
+    import json, os, sys, time
+
+    marker = sys.argv[1]
+    print(json.dumps({"ready": True}), flush=True)
+    for line in sys.stdin:
+        request = json.loads(line)
+        prompt = request["prompt"]
+        if prompt == "crash once" and not os.path.exists(marker):
+            open(marker, "w").close()
+            os._exit(3)
+        if prompt == "hang":
+            time.sleep(30)
+        if prompt == "fail":
+            print(json.dumps({"id": request["id"], "error": "model exploded"}), flush=True)
+            continue
+        print(json.dumps({"id": "stale", "token": "ignored "}), flush=True)
+        for word in prompt.split():
+            print(json.dumps({"id": request["id"], "token": word + " "}), flush=True)
+        print(json.dumps({"id": request["id"], "done": True, "text": prompt}), flush=True)
+""")
+
+
+@pytest.fixture
+def mythomax(tmp_path):
+    script = tmp_path / "fake_worker.py"
+    script.write_text(FAKE_WORKER)
+    interface = MythomaxInterface(worker_command=[sys.executable, str(script), str(tmp_path / "crashed")],
+                                  workers=1, timeout=2, startup_timeout=10)
+    yield interface
+    interface.close()
+
+
+def test_streams_tokens_from_a_persistent_worker(mythomax):
+    chunks = []
+    assert mythomax.generate_text("hello there judy", on_token=chunks.append) == "hello there judy"
+    assert chunks == ["hello ", "there ", "judy "]
+    # Same process serves the next request
+    assert mythomax.generate_text("again") == "again"
+    assert mythomax.status() == {"mode": "persistent", "workers": 1, "idle": 1, "alive": 1, "restarts": 0}
+
+
+def test_crash_before_output_is_retried_on_a_restarted_worker(mythomax):
+    assert mythomax.generate_text("crash once") == "crash once"
+    assert mythomax.status()["restarts"] == 1
+
+
+def test_worker_error_is_reported_without_killing_the_worker(mythomax):
+    with pytest.raises(RuntimeError, match="model exploded"):
+        list(mythomax.generate_stream("fail"))
+    assert mythomax.generate_text("fail").startswith("Oops")
+    assert mythomax.generate_text("still here") == "still here"
+    assert mythomax.status()["restarts"] == 0
+
+
+def test_hung_worker_is_restarted(mythomax):
+    mythomax.timeout = 0.5
+    with pytest.raises(TimeoutError):
+        list(mythomax.generate_stream("hang"))
+    mythomax.timeout = 2
+    assert mythomax.generate_text("recovered") == "recovered"
+    assert mythomax.status()["restarts"] == 1
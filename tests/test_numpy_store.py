@@ -0,0 +1,142 @@
+import os
+import time
+
+import pytest
+
+from brain.core.numpy_indexer import NumpyVectorDB
+from conftest import bag_of_words
+
+
+def seed(store):
+    now = time.time()
+    store.add_many(
+        ["User: the cat sat on the mat", "Judy: cats are trouble", "User: my bank pin is 4321", "old note about dogs"],
+        metadatas=[
+            {"role": "user", "timestamp": now - 10, "tags": ["cat"]},
+            {"role": "judy", "timestamp": now - 5, "tags": "cat, banter"},
+            {"role": "user", "timestamp": now - 1, "sensitivity": "high", "source": "secret"},
+            {"source": "note", "timestamp": now - 30 * 24 * 3600},
+        ],
+        memory_type="short"
+    )
+    return now
+
+
+def test_add_query_and_reload(store, reopen):
+    assert store.add_many(["the violet GUI glows", "rain on the window"], memory_type="long") == 2
+    assert store.add_many(["the violet GUI glows"], memory_type="long") == 0
+    assert store.query_similar("violet GUI", memory_type="long", n_results=1) == ["the violet GUI glows"]
+    reloaded = reopen(store)
+    assert reloaded.count("long") == 2 and reloaded.count("short") == 0
+    assert reloaded.query_similar("rain window", memory_type="long", n_results=1) == ["rain on the window"]
+
+
+def test_filters_by_role_tag_and_time(store):
+    now = seed(store)
+    assert store.query_similar("cat", memory_type="short", n_results=5, role="user") == ["User: the cat sat on the mat"]
+    assert set(store.query_similar("cat", memory_type="short", n_results=5, tags="cat")) == {
+        "User: the cat sat on the mat", "Judy: cats are trouble"}
+    recent = store.short_term.get_recent(n=10, since=now - 3600, exclude_secret=True)
+    assert [doc for doc, _ in recent] == ["Judy: cats are trouble", "User: the cat sat on the mat"]
+
+
+def test_secrets_are_excluded_unless_requested(store):
+    seed(store)
+    assert "User: my bank pin is 4321" not in store.query_similar("bank pin", memory_type="short", n_results=5)
+    assert store.query_similar("bank pin", memory_type="short", n_results=1, include_secret=True) == [
+        "User: my bank pin is 4321"]
+
+
+def test_torn_sidecar_tail_is_trimmed_on_reload(store, reopen):
+    seed(store)
+    with open(store.short_term.sidecar_path, "ab") as f:
+        f.write(b'{"id": "half-writ')
+    reloaded = reopen(store)
+    assert reloaded.count("short") == 4
+    assert reloaded.add_many(["fresh row"], memory_type="short") == 1
+    assert reopen(store).count("short") == 5
+
+
+def test_readding_an_id_rewrites_metadata_but_keeps_it_secret(store, reopen):
+    store.add_many(["a private thought"], metadatas=[{"source": "note"}], memory_type="short")
+    assert store.add_many(["a private thought"], metadatas=[{"source": "secret", "sensitivity": "high"}],
+                          memory_type="short") == 0
+    assert store.query_similar("private thought", memory_type="short") == []
+    # A plain re-add must not un-hide it
+    store.add_many(["a private thought"], metadatas=[{"source": "note"}], memory_type="short")
+    reloaded = reopen(store)
+    _, metadata = reloaded.short_term.get_recent(n=1)[0]
+    assert metadata["sensitivity"] == "high" and metadata["source"] == "note"
+
+
+def test_delete_vacuum_and_reload(store, reopen):
+    seed(store)
+    collection = store.short_term
+    doomed = [record_id for record_id, document, _ in collection.expired(before=time.time() - 3600)]
+    assert len(doomed) == 1
+    assert store.delete_many(doomed, memory_type="short") == 1
+    assert store.count("short") == 3
+    assert "old note about dogs" not in store.query_similar("dogs", memory_type="short", n_results=5)
+
+    assert collection.vacuum() == 1
+    assert collection.vacuum() == 0
+    reloaded = reopen(store)
+    assert reloaded.count("short") == 3
+    assert reloaded.query_similar("cat mat", memory_type="short", n_results=1) == ["User: the cat sat on the mat"]
+    assert reloaded.short_term.expired(before=time.time() - 3600) == []
+
+
+def test_query_many_embeds_once_and_merges_memory_types(tmp_path):
+    calls = []
+
+    def counting_embedding(texts):
+        calls.append(list(texts))
+        return bag_of_words(texts)
+
+    store = NumpyVectorDB(persist_directory=str(tmp_path), embedding_function=counting_embedding)
+    store.add_many(["the cat sat on the mat", "rain on the window"], memory_type="short")
+    store.add_many(["Stixx adores the cat", "the violet GUI glows"], memory_type="long")
+    calls.clear()
+
+    results = store.query_many(["the cat", "violet window"], memory_types=("short", "long"), n_results=2)
+    assert calls == [["the cat", "violet window"]]
+    assert len(results) == 2
+    for hits in results:
+        distances = [distance for _, _, distance in hits]
+        assert len(hits) == 2 and distances == sorted(distances)
+    assert {doc for doc, _, _ in results[0]} == {"the cat sat on the mat", "Stixx adores the cat"}
+    assert store.query_many([], n_results=2) == []
+
+
+@pytest.mark.parametrize("crash_at", ["sidecar swap", "tombstone removal", "before commit"])
+def test_vacuum_interrupted_by_a_crash_recovers_on_reload(store, reopen, monkeypatch, crash_at):
+    import brain.core.numpy_indexer as numpy_indexer
+
+    seed(store)
+    store.delete_many([store.short_term.ids[0]], memory_type="short")
+    real_replace, real_remove = os.replace, os.remove
+
+    def replace(src, dst):
+        if crash_at == "sidecar swap" and dst.endswith("metadata.jsonl"):
+            raise OSError("simulated crash")
+        if crash_at == "before commit" and dst.endswith("vacuum.commit"):
+            raise OSError("simulated crash")
+        real_replace(src, dst)
+
+    def remove(path):
+        if crash_at == "tombstone removal" and path.endswith("deleted.rows"):
+            raise OSError("simulated crash")
+        real_remove(path)
+
+    monkeypatch.setattr(numpy_indexer.os, "replace", replace)
+    monkeypatch.setattr(numpy_indexer.os, "remove", remove)
+    with pytest.raises(OSError):
+        store.short_term.vacuum()
+    monkeypatch.undo()
+
+    reloaded = reopen(store)
+    assert reloaded.count("short") == 3
+    for document in ("Judy: cats are trouble", "old note about dogs"):
+        assert reloaded.query_similar(document, memory_type="short", n_results=1) == [document]
+    assert "User: the cat sat on the mat" not in reloaded.query_similar("cat mat", memory_type="short", n_results=5)
+    assert not os.path.exists(reloaded.short_term.vacuum_marker_path)
@@ -0,0 +1,45 @@
+from brain.core.prompt_assembler import PromptAssembler
+
+TEMPLATE = "You are Judy.\n{recent_memories}\nUser: {user_message}\nJudy:"
+
+
+def whitespace_tokenize(text):
+    return text.split()
+
+
+def test_prompt_stays_within_the_context_budget():
+    assembler = PromptAssembler(whitespace_tokenize, n_ctx=60, max_tokens=20)
+    memories = [(f"memory {i} " + "word " * 5, float(i)) for i in range(10)]
+    prompt = assembler.assemble(TEMPLATE, {"user_message": "hello there"}, memories)
+    report = assembler.last_report
+    assert report["total_tokens"] <= report["budget"] == 40
+    assert len(prompt.split()) <= 40
+    assert report["memories_used"] + report["memories_dropped"] == 10 and report["memories_dropped"] > 0
+
+
+def test_highest_scoring_memories_win_but_keep_their_order():
+    assembler = PromptAssembler(whitespace_tokenize, n_ctx=28, max_tokens=10)
+    memories = [("low one two", 0.1), ("high one two", 0.9), ("mid one two", 0.5), ("top one two", 1.0)]
+    prompt = assembler.assemble(TEMPLATE, {"user_message": "hi"}, memories)
+    assert "high one two\ntop one two" in prompt
+    assert "low one two" not in prompt
+
+
+def test_long_user_message_is_cut_at_its_section_budget():
+    assembler = PromptAssembler(whitespace_tokenize, section_budgets={"user_message": 5})
+    prompt = assembler.assemble(TEMPLATE, {"user_message": "one two three four five six seven"})
+    assert prompt.endswith("User: one two three four five\nJudy:")
+
+
+def test_token_counts_are_cached_per_segment():
+    calls = []
+
+    def counting_tokenize(text):
+        calls.append(text)
+        return text.split()
+
+    assembler = PromptAssembler(counting_tokenize)
+    assembler.assemble(TEMPLATE, {"user_message": "hi"}, [("a memory", 1.0)])
+    first = len(calls)
+    assembler.assemble(TEMPLATE, {"user_message": "hi"}, [("a memory", 1.0)])
+    assert len(calls) == first
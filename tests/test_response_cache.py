@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from brain.core import response_cache
+from brain.core.response_cache import ResponseCache
+from brain.core.text_generation import TextGenerator
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "time", clock)
+    return clock
+
+
+def embed(texts):
+    vocabulary = {"hi": 0, "hello": 0, "hey": 0, "weather": 1, "rain": 1, "bye": 2}
+    vectors = np.zeros((len(texts), 3), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in text.lower().split():
+            if word in vocabulary:
+                vectors[row, vocabulary[word]] += 1.0
+    return vectors
+
+
+def test_exact_entries_expire_after_ttl(clock):
+    cache = ResponseCache(ttl_seconds=60)
+    key = cache.exact_key("model", "prompt", temperature=0)
+    cache.put_exact(key, "reply", tokens=12)
+    clock.now += 59
+    assert cache.get_exact(key) == "reply"
+    clock.now += 2
+    assert cache.get_exact(key) is None
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["misses"], stats["saved_tokens"], stats["entries"]) == (1, 1, 12, 0)
+
+
+def test_exact_tier_evicts_least_recently_used(clock):
+    cache = ResponseCache(max_entries=2)
+    keys = [cache.exact_key("model", prompt) for prompt in ("a", "b", "c")]
+    cache.put_exact(keys[0], "A")
+    cache.put_exact(keys[1], "B")
+    assert cache.get_exact(keys[0]) == "A"  # now most recent, so "b" is evicted next
+    cache.put_exact(keys[2], "C")
+    assert cache.get_exact(keys[1]) is None
+    assert (cache.get_exact(keys[0]), cache.get_exact(keys[2])) == ("A", "C")
+
+
+def test_exact_keys_differ_by_model_and_sampling():
+    assert ResponseCache.exact_key("m1", "p", temperature=0) != ResponseCache.exact_key("m2", "p", temperature=0)
+    assert ResponseCache.exact_key("m1", "p", max_tokens=10) != ResponseCache.exact_key("m1", "p", max_tokens=20)
+
+
+def test_semantic_tier_matches_similar_messages_within_one_context(clock):
+    cache = ResponseCache(semantic=True, semantic_threshold=0.9, embedding_function=embed)
+    cache.put_semantic("model", "hi", {"mood": "happy"}, "Hey you.", tokens=3)
+    assert cache.get_semantic("model", "hello", {"mood": "happy"}) == "Hey you."
+    assert cache.get_semantic("model", "hello", {"mood": "sad"}) is None
+    assert cache.get_semantic("other-model", "hello", {"mood": "happy"}) is None
+    assert cache.get_semantic("model", "rain", {"mood": "happy"}) is None
+    clock.now += cache.ttl_seconds + 1
+    assert cache.get_semantic("model", "hello", {"mood": "happy"}) is None
+
+
+def test_semantic_tier_is_off_without_an_embedding_function():
+    cache = ResponseCache(semantic=False, embedding_function=embed)
+    cache.put_semantic("model", "hi", {}, "Hey.")
+    assert not cache.semantic_enabled
+    assert cache.get_semantic("model", "hi", {}) is None
+
+
+class EchoGenerator(TextGenerator):
+    """TextGenerator with the model swapped for a counter; only the caching path is real."""
+
+    def __init__(self, cache):
+        self.response_cache = cache
+        self._model_hash = "model"
+        self.last_metrics = {}
+        self.calls = 0
+
+    def generate_stream(self, prompt, context=None, max_tokens=150, temperature=0.3, prefix=None, cancel=None):
+        self.calls += 1
+        self.last_metrics = {"tokens": 1}
+        yield f"reply {self.calls}"
+
+
+@pytest.mark.parametrize("exact_max_temperature, cached", [(0.0, False), (0.3, True)])
+def test_exact_tier_temperature_gate_is_configurable(exact_max_temperature, cached):
+    cache = ResponseCache.from_settings({"exact_max_temperature": exact_max_temperature})
+    generator = EchoGenerator(cache)
+    first = generator.generate("same prompt", temperature=0.3)
+    second = generator.generate("same prompt", temperature=0.3)
+    assert (second == first) is cached
+    assert generator.calls == (1 if cached else 2)
+    assert generator.generate("same prompt", temperature=0) == generator.generate("same prompt", temperature=0)
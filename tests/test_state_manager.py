@@ -0,0 +1,72 @@
+def test_cached_results_last_until_their_collection_changes(make_state_manager):
+    state = make_state_manager()
+    first = state.query_chroma_memories("violet GUI", memory_type="long", n_results=3)
+    assert state.query_chroma_memories("  Violet   gui ", memory_type="long", n_results=3) == first
+    assert state.retrieval_cache.stats()["hits"] == 1
+
+    # A short-term write leaves long-term entries alone
+    state.add_memory_chroma("the kettle is on", memory_type="short")
+    state.query_chroma_memories("violet GUI", memory_type="long", n_results=3)
+    assert state.retrieval_cache.stats()["hits"] == 2
+
+    state.add_memory_chroma("the violet GUI got a new glow", memory_type="long")
+    assert "the violet GUI got a new glow" in state.query_chroma_memories("violet GUI", memory_type="long", n_results=3)
+    assert state.retrieval_cache.stats()["hits"] == 2
+
+
+def test_warm_start_verifies_without_reembedding(make_state_manager):
+    state = make_state_manager()
+    seeded = state.chroma.count("long")
+    restarted = make_state_manager()
+    assert restarted.chroma.count("long") == seeded
+    assert restarted.verify_vector_store(background=False) == {}
+
+
+def test_missing_vectors_are_reembedded_from_the_state_file(make_state_manager):
+    from brain.core.memory_records import content_id
+
+    state = make_state_manager()
+    lost = state.state["long_term_memory"][0]["content"]
+    state.chroma.delete_many([content_id(lost)], memory_type="long")
+
+    missing = state.verify_vector_store(background=False)
+    assert [memory["content"] for memory in missing["long"]] == [lost]
+    assert content_id(lost) in state.chroma.stored_ids("long")
+    assert state.verify_vector_store(background=False) == {}
+
+
+def test_keyword_index_is_rebuilt_from_the_vector_store(make_state_manager):
+    import time
+
+    from brain.core.memory_records import content_id
+
+    state = make_state_manager()
+    state.add_memory_chroma("User: my cat is called Pixel", memory_type="short", metadata={"role": "user"})
+    state.add_memory_chroma("User: an old remark about Zanzibar", memory_type="short",
+                            metadata={"timestamp": time.time() - state.short_term_ttl - 60})
+
+    restarted = make_state_manager()
+    keywords = restarted.retriever.keyword_indexes
+    assert content_id("User: my cat is called Pixel") in keywords["short"].documents
+    assert keywords["short"].metadatas[content_id("User: my cat is called Pixel")]["role"] == "user"
+    # Past the TTL: compaction will delete it, so it is not re-indexed
+    assert content_id("User: an old remark about Zanzibar") not in keywords["short"].documents
+    assert len(keywords["long"]) == restarted.chroma.count("long")
+
+
+def test_sensitivity_backfill_runs_once_per_store(make_state_manager, monkeypatch):
+    from brain.core import state_manager
+    from brain.core.numpy_indexer import NumpyVectorDB
+
+    calls = []
+
+    class LegacyStore(NumpyVectorDB):
+        def backfill_sensitivity(self, memory_type="short"):
+            calls.append(memory_type)
+            return 0
+
+    monkeypatch.setattr(state_manager, "create_vector_store", lambda backend, **kwargs: LegacyStore(**kwargs))
+    make_state_manager()
+    assert calls == ["short", "long"]
+    make_state_manager()
+    assert calls == ["short", "long"]
@@ -0,0 +1,65 @@
+import json
+import os
+
+import pytest
+
+from brain.core.prompt_frame import DYNAMIC_FIELDS
+from brain.core.template_registry import CompiledTemplate, TemplateRegistry, compile_template
+
+TEMPLATE = "{judy_name} talks to {user_name}.\nMood: {mood}\n{recent_memories}\n{user_name}: {user_message}\n"
+
+
+def test_render_matches_str_format():
+    values = {"judy_name": "Judy", "user_name": "Stixx", "mood": 7, "recent_memories": "-", "user_message": "hi"}
+    assert CompiledTemplate(TEMPLATE).render(values) == TEMPLATE.format(**values)
+    with pytest.raises(KeyError):
+        CompiledTemplate(TEMPLATE).render({"judy_name": "Judy"})
+
+
+def test_format_specs_fall_back_to_str_format():
+    assert CompiledTemplate("{score:.2f} for {name!r}").format(score=0.5, name="Judy") == "0.50 for 'Judy'"
+    template = CompiledTemplate("{score:.2f} for {name}")
+    assert template.static_prefix(("name",), score=0.5) == "0.50 for "
+
+
+def test_static_prefix_stops_at_the_first_dynamic_field():
+    template = compile_template(TEMPLATE)
+    prefix = template.static_prefix(DYNAMIC_FIELDS, judy_name="Judy", user_name="Stixx")
+    assert prefix == "Judy talks to Stixx.\nMood: "
+    assert template.static_prefix(judy_name="Judy", user_name="Stixx") is prefix
+    assert compile_template(TEMPLATE) is template
+    assert template.digest != compile_template(TEMPLATE + " ").digest
+
+
+def test_registry_reloads_files_when_they_change(tmp_path):
+    frames = tmp_path / "prompt_frame.json"
+    profile = tmp_path / "core_profile.json"
+    registry = TemplateRegistry(frame_json=str(frames), core_profile_path=str(profile), check_interval=0)
+    assert registry.core_profile() == {}
+    assert registry.frame_template("default", default="{x}").source == "{x}"
+
+    frames.write_text(json.dumps({"default": {"template": "Hi {user_name}"}}))
+    profile.write_text(json.dumps({"name": "Judy"}))
+    assert registry.frame_template("default").render({"user_name": "Stixx"}) == "Hi Stixx"
+    assert registry.core_profile() == {"name": "Judy"}
+
+    profile.write_text(json.dumps({"name": "Judith"}))
+    stat = os.stat(profile)
+    os.utime(profile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert registry.core_profile() == {"name": "Judith"}
+
+    profile.write_text("{broken")
+    os.utime(profile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2_000_000))
+    assert registry.core_profile() == {"name": "Judith"}  # a bad edit keeps the last good version
+
+
+def test_personalities_come_from_prompt_frame():
+    from brain.core import prompt_frame
+
+    registry = TemplateRegistry(check_interval=0)
+    templates = registry.personalities()
+    assert set(prompt_frame.personalities) | {"current"} == set(templates)
+    assert registry.personality().source == prompt_frame.prompt_template
+    assert registry.dynamic_fields == DYNAMIC_FIELDS
+    missing = TemplateRegistry(frame_module="brain.core.no_such_frame", check_interval=0)
+    assert missing.personality(default="{mood}").source == "{mood}"
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from brain.core.vector_quantization import CompressedVectors, PCAReducer, ScalarQuantizer
+
+
+def unit_vectors(count, dim=32, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def recall(found, expected):
+    return sum(len(set(a) & set(e)) for a, e in zip(found.tolist(), expected.tolist())) / float(expected.size)
+
+
+@pytest.mark.parametrize("dtype, itemsize", [("float16", 2), ("int8", 1)])
+def test_quantized_codes_shrink_storage_and_keep_rankings(dtype, itemsize):
+    matrix = unit_vectors(500)
+    compressed = CompressedVectors(dtype=dtype)
+    compressed.rebuild(matrix)
+    assert compressed.codes.dtype.itemsize == itemsize
+    assert compressed.codes.nbytes == matrix.nbytes // 4 * itemsize
+
+    queries = matrix[:20]
+    exact = np.argsort(-(queries @ matrix.T), axis=1)[:, :5]
+    _, rows = compressed.search(queries, matrix, 5)
+    assert recall(rows, exact) == 1.0
+
+
+def test_int8_scales_use_the_full_code_range():
+    codes, scales = ScalarQuantizer("int8").encode(np.array([[0.5, -0.25, 0.0]], dtype=np.float32))
+    assert codes.tolist() == [[127, -64, 0]]
+    assert scales[0] == pytest.approx(0.5 / 127)
+
+
+def test_pca_preserves_query_rankings():
+    # Data that lives in an 8-dimensional subspace of 32 dimensions
+    basis = unit_vectors(8, seed=1)
+    matrix = np.random.default_rng(2).normal(size=(400, 8)).astype(np.float32) @ basis
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    pca = PCAReducer(8).fit(matrix)
+    query = matrix[:1]
+    assert np.argsort(-(pca.transform(matrix) @ pca.project_query(query)[0])).tolist() == \
+        np.argsort(-(matrix @ query[0])).tolist()
+
+    compressed = CompressedVectors(dtype="int8", pca_components=8)
+    compressed.rebuild(matrix)
+    assert compressed.codes.shape == (400, 8)
+    _, rows = compressed.search(matrix[:10], matrix, 1)
+    assert rows[:, 0].tolist() == list(range(10))
+
+
+def test_pca_refit_runs_in_the_background_and_serves_the_tail_exactly():
+    matrix = unit_vectors(400)
+    compressed = CompressedVectors(dtype="int8", pca_components=16)
+    # First build happens in the background; meanwhile every row is scanned exactly
+    _, rows = compressed.search(matrix[150:151], matrix[:200], 1, matrix_source=lambda: matrix[:200])
+    assert rows[0, 0] == 150
+    compressed._rebuild_thread.join(5)
+    assert compressed.fitted_rows == 200
+
+    # Doubled: old codes (plus the appended rows) answer until the refit lands
+    _, rows = compressed.search(matrix[350:351], matrix, 1, matrix_source=lambda: matrix)
+    assert rows[0, 0] == 350 and compressed.rows == 400
+    compressed._rebuild_thread.join(5)
+    assert compressed.fitted_rows == 400
+
+
+def test_reset_discards_a_rebuild_from_an_older_epoch():
+    matrix = unit_vectors(100)
+    compressed = CompressedVectors(dtype="int8")
+    epoch = compressed.epoch
+    compressed.reset()
+    assert not compressed.rebuild(matrix, epoch=epoch)
+    assert compressed.codes is None
+    assert compressed.rebuild(matrix, epoch=compressed.epoch) and compressed.rows == 100
+
+
+def test_collection_uses_compressed_scan_and_survives_vacuum(tmp_path):
+    from brain.core.numpy_indexer import MemmapCollection
+
+    vectors = unit_vectors(50)
+    collection = MemmapCollection(str(tmp_path), "long_term_memory", embedding_function=lambda texts: None,
+                                  compression={"dtype": "int8"})
+    collection.add([f"memory {i}" for i in range(50)], embeddings=vectors)
+    assert collection.query(query_embeddings=vectors[3:4], n_results=1)["documents"] == [["memory 3"]]
+    collection.delete([collection.ids[0]])
+    collection.vacuum()
+    assert collection.compressed.codes is None
+    assert collection.query(query_embeddings=vectors[3:4], n_results=1)["documents"] == [["memory 3"]]